@@ -0,0 +1,244 @@
+"""
+Découpage des fichiers en blocs définis par le contenu et magasin de blocs
+
+Les frontières de blocs dépendent uniquement des octets voisins: une
+insertion au début d'un fichier ne décale que les blocs qu'elle touche,
+les suivants restent identiques et n'ont pas à être renvoyés.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+
+# Dossier du magasin, dans le dossier de stockage du client
+STORE_DIR = '.chunks'
+
+# Tailles de bloc (la moyenne se situe autour de 320 KB)
+CDC_MIN_SIZE = 64 * 1024
+CDC_MAX_SIZE = 1024 * 1024
+
+# Une frontière est posée après un octet d'ancrage dont la fenêtre
+# précédente a un CRC32 nul sur les bits du masque (recherche en C)
+CDC_ANCHOR = b'\n'
+CDC_WINDOW = 48
+CDC_MASK = 0x3FF
+
+# En dessous, l'annonce des blocs coûte plus qu'elle ne rapporte
+DEDUP_MIN_SIZE = 4 * CDC_MIN_SIZE
+
+# Taille max du magasin avant éviction des blocs les moins récents
+STORE_LIMIT = 2 * 1024 * 1024 * 1024
+
+# Annonce d'un bloc: empreinte SHA-256 et longueur
+CHUNK_ENTRY = struct.Struct('!32sI')
+
+# Flux de blocs d'un fichier: chaque bloc est annoncé dès son découpage
+# (CHUNK_ANNOUNCE + CHUNK_ENTRY) et le destinataire répond aussitôt un octet
+# (CHUNK_NEEDED ou CHUNK_PRESENT). Les blocs demandés suivent dans l'ordre
+# des annonces (CHUNK_DATA + contenu), CHUNK_END clôt le fichier.
+CHUNK_ANNOUNCE = b'A'
+CHUNK_DATA = b'D'
+CHUNK_END = b'E'
+CHUNK_NEEDED = b'1'
+CHUNK_PRESENT = b'0'
+
+# Valeur de l'option chunks de l'en-tête d'un fichier envoyé en flux de blocs
+CHUNKS_STREAM = 'stream'
+
+# Octets de blocs annoncés dont l'expéditeur n'a pas encore lu la réponse
+DEDUP_WINDOW = 8 * CDC_MAX_SIZE
+
+READ_SIZE = 4 * CDC_MAX_SIZE
+
+
+def _find_cut(buffer: bytearray, final: bool) -> int:
+    """
+    Position de la prochaine frontière dans le tampon
+    
+    Args:
+        buffer: Octets restants à découper
+        final: Fin du fichier atteinte
+    
+    Returns:
+        Longueur du prochain bloc (0 s'il faut plus de données)
+    """
+    limit = min(len(buffer), CDC_MAX_SIZE)
+    if limit < CDC_MAX_SIZE and not final:
+        return 0
+    
+    position = CDC_MIN_SIZE
+    while position < limit:
+        i = buffer.find(CDC_ANCHOR, position, limit)
+        if i < 0:
+            break
+        if zlib.crc32(buffer[i - CDC_WINDOW:i + 1]) & CDC_MASK == 0:
+            return i + 1
+        position = i + 1
+    return limit
+
+
+def iter_chunk_data(f) -> Iterator[Tuple[int, bytes, bytes]]:
+    """
+    Découper un fichier ouvert au fil de sa lecture
+    
+    Le fichier n'est lu qu'une fois: chaque bloc est produit avec son
+    contenu, dès que sa frontière est trouvée.
+    
+    Args:
+        f: Fichier ouvert en lecture binaire
+    
+    Yields:
+        (offset, contenu, empreinte SHA-256)
+    """
+    offset = 0
+    buffer = bytearray()
+    final = False
+    
+    while buffer or not final:
+        if not final and len(buffer) < CDC_MAX_SIZE:
+            data = f.read(READ_SIZE)
+            if data:
+                buffer += data
+            else:
+                final = True
+            continue
+        
+        cut = _find_cut(buffer, final)
+        data = bytes(buffer[:cut])
+        yield offset, data, hashlib.sha256(data).digest()
+        del buffer[:cut]
+        offset += cut
+
+
+def iter_chunks(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Découper un fichier en blocs définis par le contenu
+    
+    Args:
+        path: Fichier à découper
+    
+    Yields:
+        (offset, longueur, empreinte SHA-256)
+    """
+    with open(path, 'rb', buffering=0) as f:
+        for offset, data, digest in iter_chunk_data(f):
+            yield offset, len(data), digest
+
+
+class ChunkStore:
+    """Blocs déjà reçus, indexés par leur empreinte"""
+    
+    def __init__(self, root: str, limit: int = STORE_LIMIT):
+        """
+        Ouvrir (ou créer) un magasin de blocs
+        
+        Args:
+            root: Dossier du magasin
+            limit: Taille max en octets
+        """
+        self.root = root
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.size = None  # Calculée au premier ajout
+        os.makedirs(root, exist_ok=True)
+    
+    def path(self, digest: bytes) -> str:
+        """Chemin du fichier d'un bloc"""
+        name = digest.hex()
+        return os.path.join(self.root, name[:2], name)
+    
+    def has(self, digest: bytes) -> bool:
+        """Vérifier si un bloc est présent"""
+        return os.path.exists(self.path(digest))
+    
+    def get(self, digest: bytes) -> Optional[bytes]:
+        """
+        Lire un bloc
+        
+        Args:
+            digest: Empreinte du bloc
+        
+        Returns:
+            Contenu du bloc, ou None s'il est absent ou corrompu
+        """
+        path = self.path(digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        
+        if hashlib.sha256(data).digest() != digest:
+            self._remove(path)
+            return None
+        return data
+    
+    def put(self, digest: bytes, data) -> bool:
+        """
+        Ajouter un bloc (écriture atomique)
+        
+        Args:
+            digest: Empreinte annoncée
+            data: Contenu du bloc
+        
+        Returns:
+            False si le contenu ne correspond pas à l'empreinte
+        """
+        if hashlib.sha256(data).digest() != digest:
+            return False
+        
+        path = self.path(digest)
+        if os.path.exists(path):
+            return True
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        with self.lock:
+            if self.size is None:
+                self.size = self._disk_usage()
+            else:
+                self.size += len(data)
+            if self.size > self.limit:
+                self._prune()
+        return True
+    
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(date de dernière utilisation, taille, chemin) de chaque bloc"""
+        entries = []
+        for bucket in os.scandir(self.root):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+    
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+    
+    def _prune(self):
+        """Supprimer les blocs les moins récemment utilisés (jusqu'à 90% de la limite)"""
+        entries = sorted(self._entries())
+        self.size = sum(size for _, size, _ in entries)
+        target = self.limit * 9 // 10
+        for _, size, path in entries:
+            if self.size <= target:
+                break
+            self._remove(path)
+            self.size -= size
+    
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
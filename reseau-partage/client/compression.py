@@ -0,0 +1,283 @@
+"""
+Compression adaptative des données transférées
+
+Les octets sont envoyés en trames d'au plus CHUNK_SIZE octets. Chaque
+bloc est d'abord échantillonné: s'il est déjà compressé (JPEG, MP4,
+archives...), son entropie est proche de 8 bits par octet et il part
+tel quel. Le niveau zlib dépend du débit du lien et de la charge CPU:
+sur un lien rapide ou pas encore mesuré, la compression est désactivée
+pour que le transfert ne soit jamais limité par le processeur. Si elle
+le devient en cours de route, une trame FRAME_PASSTHROUGH annonce que la
+suite du flux part brute (sendfile chez l'expéditeur, splice chez le
+destinataire).
+"""
+
+import math
+import os
+import socket
+import struct
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.protocol import CHUNK_SIZE
+
+
+# Codec annoncé dans l'en-tête (option compress)
+CODEC = 'zlib'
+
+# Trame: type, longueur du contenu
+FRAME = struct.Struct('!BI')
+FRAME_RAW = 0   # Octets tels quels
+FRAME_ZLIB = 1  # Octets compressés (CHUNK_SIZE octets max une fois décompressés)
+FRAME_PASSTHROUGH = 2  # Fin des trames: la suite du flux arrive brute (sans contenu)
+
+# En dessous, la compression ne vaut pas l'en-tête des trames
+COMPRESS_MIN_SIZE = 64 * 1024
+
+# Échantillon d'entropie: ENTROPY_SAMPLES morceaux répartis dans le bloc
+ENTROPY_SAMPLE = 4096
+ENTROPY_SAMPLES = 4
+
+# Au-delà (bits par octet), le bloc est considéré incompressible
+ENTROPY_LIMIT = 7.5
+
+# Un bloc compressé plus gros que cette fraction de l'original part tel quel
+MIN_GAIN = 0.9
+
+# Niveaux zlib et débit de compression estimé sur un cœur (octets/s), du plus fort au plus rapide
+LEVEL_RATES = ((6, 20 * 1024 * 1024), (3, 50 * 1024 * 1024), (1, 100 * 1024 * 1024))
+
+# La compression doit aller au moins LINK_MARGIN fois plus vite que le lien
+LINK_MARGIN = 2
+
+# Part du processeur libre en dessous de laquelle on ne compresse pas
+MIN_HEADROOM = 0.25
+
+# Si la compression occupe plus de cette part du temps écoulé, elle est abandonnée
+MAX_CPU_SHARE = 0.5
+CPU_CHECK_AFTER = 8 * CHUNK_SIZE
+
+
+def byte_entropy(data) -> float:
+    """
+    Entropie de Shannon d'un échantillon
+    
+    Args:
+        data: Octets à mesurer
+    
+    Returns:
+        Bits par octet (0 à 8)
+    """
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(bytes(data)).values())
+
+
+def sample_entropy(data) -> float:
+    """Entropie estimée d'un bloc à partir de quelques morceaux répartis"""
+    size = len(data)
+    if size <= ENTROPY_SAMPLE:
+        return byte_entropy(data)
+    
+    piece = ENTROPY_SAMPLE // ENTROPY_SAMPLES
+    step = (size - piece) // (ENTROPY_SAMPLES - 1)
+    sample = b''.join(bytes(data[i * step:i * step + piece]) for i in range(ENTROPY_SAMPLES))
+    return byte_entropy(sample)
+
+
+def cpu_headroom() -> float:
+    """Part du processeur disponible (1.0 si la charge n'est pas connue)"""
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):  # Windows
+        return 1.0
+    return max(0.0, 1.0 - load / (os.cpu_count() or 1))
+
+
+def choose_level(link_rate: Optional[float]) -> int:
+    """
+    Choisir le niveau de compression d'un transfert
+    
+    Args:
+        link_rate: Débit mesuré vers le destinataire (octets/s, None si inconnu)
+    
+    Returns:
+        Niveau zlib (0: pas de compression)
+    """
+    if not link_rate:
+        return 0  # Premier envoi vers ce PC: sendfile, le débit mesuré servira aux suivants
+    headroom = cpu_headroom()
+    if headroom < MIN_HEADROOM:
+        return 0
+    
+    for level, rate in LEVEL_RATES:
+        if rate * headroom >= LINK_MARGIN * link_rate:
+            return level
+    return 0
+
+
+class CompressionStage:
+    """Encodeur des trames d'un transfert (côté expéditeur)"""
+    
+    def __init__(self, level: int):
+        """
+        Initialiser l'encodeur
+        
+        Args:
+            level: Niveau zlib de départ
+        """
+        self.name = f"{CODEC}-{level}"
+        self.level = level
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.cpu_time = 0.0
+        self.start = time.monotonic()
+        self.passthrough = False  # FRAME_PASSTHROUGH envoyée: plus de trames
+    
+    @property
+    def ratio(self) -> float:
+        """Octets envoyés / octets du fichier"""
+        return self.wire_bytes / self.raw_bytes if self.raw_bytes else 1.0
+    
+    def end_frames(self) -> bytes:
+        """Trame annonçant que la suite du flux part brute"""
+        self.passthrough = True
+        self.wire_bytes += FRAME.size
+        return FRAME.pack(FRAME_PASSTHROUGH, 0)
+    
+    def passed(self, n: int):
+        """Compter `n` octets envoyés bruts après end_frames()"""
+        self.raw_bytes += n
+        self.wire_bytes += n
+    
+    def encode(self, data) -> bytes:
+        """
+        Construire la trame d'un bloc
+        
+        Args:
+            data: Bloc d'au plus CHUNK_SIZE octets
+        
+        Returns:
+            Trame à envoyer
+        """
+        frame = None
+        if self.level:
+            started = time.thread_time()
+            if sample_entropy(data) < ENTROPY_LIMIT:
+                packed = zlib.compress(data, self.level)
+                if len(packed) < MIN_GAIN * len(data):
+                    frame = FRAME.pack(FRAME_ZLIB, len(packed)) + packed
+            self.cpu_time += time.thread_time() - started
+        if frame is None:
+            frame = FRAME.pack(FRAME_RAW, len(data)) + data
+        
+        self.raw_bytes += len(data)
+        self.wire_bytes += len(frame)
+        self._check_cpu()
+        return frame
+    
+    def _check_cpu(self):
+        """Abandonner la compression si c'est elle qui limite le transfert"""
+        if self.level and self.raw_bytes >= CPU_CHECK_AFTER:
+            if self.cpu_time > MAX_CPU_SHARE * (time.monotonic() - self.start):
+                self.level = 0
+
+
+class FrameReader:
+    """Décodeur des trames d'un transfert (côté réception)"""
+    
+    def __init__(self, sock: socket.socket):
+        """
+        Initialiser le décodeur
+        
+        Args:
+            sock: Socket de l'expéditeur
+        """
+        self.sock = sock
+        self.buffer = b''
+        self.position = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.cpu_time = 0.0
+        self.passthrough = False  # FRAME_PASSTHROUGH reçue: la suite arrive brute
+    
+    @property
+    def ratio(self) -> float:
+        """Octets reçus / octets du fichier"""
+        return self.wire_bytes / self.raw_bytes if self.raw_bytes else 1.0
+    
+    @property
+    def raw(self) -> bool:
+        """Les prochains octets se lisent directement dans la socket"""
+        return self.passthrough and self.position == len(self.buffer)
+    
+    def passed(self, n: int):
+        """Compter `n` octets lus bruts dans la socket après FRAME_PASSTHROUGH"""
+        self.raw_bytes += n
+        self.wire_bytes += n
+    
+    def read(self, size: int) -> bytes:
+        """
+        Lire exactement `size` octets décompressés
+        
+        Raises:
+            ConnectionError: Connexion fermée avant la fin
+        """
+        parts = []
+        while size:
+            if self.raw:
+                data = self._recv_exact(size)
+                self.passed(size)
+                parts.append(data)
+                break
+            if self.position == len(self.buffer):
+                self._next_frame()
+            take = min(size, len(self.buffer) - self.position)
+            parts.append(self.buffer[self.position:self.position + take])
+            self.position += take
+            size -= take
+        return b''.join(parts)
+    
+    def _next_frame(self):
+        """Recevoir et décoder la trame suivante"""
+        kind, length = FRAME.unpack(self._recv_exact(FRAME.size))
+        if length > CHUNK_SIZE + 1024:
+            raise Exception(f"Trame trop grande: {length} octets")
+        payload = self._recv_exact(length)
+        
+        if kind == FRAME_ZLIB:
+            started = time.thread_time()
+            decoder = zlib.decompressobj()
+            data = decoder.decompress(payload, CHUNK_SIZE)
+            if decoder.unconsumed_tail or not decoder.eof:
+                raise Exception("Trame compressée invalide")
+            self.cpu_time += time.thread_time() - started
+        elif kind == FRAME_RAW:
+            data = payload
+        elif kind == FRAME_PASSTHROUGH:
+            self.passthrough = True
+            data = b''
+        else:
+            raise Exception(f"Type de trame inconnu: {kind}")
+        
+        self.buffer = data
+        self.position = 0
+        self.raw_bytes += len(data)
+        self.wire_bytes += FRAME.size + length
+    
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            n = self.sock.recv_into(view[received:])
+            if not n:
+                raise ConnectionError("Connexion fermée par l'expéditeur")
+            received += n
+        return bytes(data)
@@ -0,0 +1,258 @@
+"""
+Découverte des PC du réseau local
+
+Chaque client annonce périodiquement son nom, son port de réception et
+ses capacités par multicast UDP, et écoute les annonces des autres. Les
+PC entendus récemment forment une table en mémoire: trouver un PC ne
+demande plus d'aller-retour avec le serveur et fonctionne même s'il est
+lent ou arrêté. Un PC qui ne s'annonce plus disparaît de la table après
+PEER_TIMEOUT; un client qui s'arrête le signale aussitôt.
+"""
+
+import json
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.protocol import PROTOCOL_VERSION
+
+
+# Groupe multicast et port des annonces
+DISCOVERY_GROUP = '239.255.80.50'
+DISCOVERY_PORT = 5002
+
+# Intervalle entre deux annonces (secondes)
+BEACON_INTERVAL = 5.0
+
+# PC retiré de la table sans annonce pendant ce délai (secondes)
+PEER_TIMEOUT = 3 * BEACON_INTERVAL
+
+# Délai min entre deux annonces anticipées (réponses aux nouveaux PC)
+REPLY_INTERVAL = 1.0
+
+# Les annonces ne sortent pas du sous-réseau
+MULTICAST_TTL = 1
+
+# Début de chaque annonce (les autres datagrammes du groupe sont ignorés), taille max
+BEACON_PREFIX = b'RP2P'
+MAX_BEACON_SIZE = 1024
+
+# Types d'annonce
+BEACON_ANNOUNCE = 'announce'
+BEACON_QUERY = 'query'  # Demande aux PC présents de s'annoncer aussitôt
+BEACON_LEAVE = 'leave'
+
+
+@dataclass
+class DiscoveredPeer:
+    """PC entendu sur le réseau local"""
+    name: str
+    ip_address: str
+    port: int
+    capabilities: Dict = field(default_factory=dict)
+    instance: str = ''  # Identifiant du client (un redémarrage en change)
+    seen: float = 0.0  # time.monotonic() de la dernière annonce
+    last_seen: str = ''  # Horodatage ISO de la dernière annonce
+    
+    def to_dict(self) -> Dict:
+        """Infos au format du serveur (voir server.database.Database.get_peer)"""
+        return {
+            'name': self.name,
+            'ip_address': self.ip_address,
+            'port': self.port,
+            'status': 'online',
+            'last_seen': self.last_seen,
+            'capabilities': self.capabilities,
+        }
+
+
+class PeerDiscovery:
+    """Annonces multicast et table des PC du réseau local"""
+    
+    def __init__(self, peer_name: str, peer_port: int, capabilities: Dict = None,
+                 group: str = DISCOVERY_GROUP, port: int = DISCOVERY_PORT, interval: float = BEACON_INTERVAL):
+        """
+        Args:
+            peer_name: Nom de ce PC
+            peer_port: Port de réception des fichiers
+            capabilities: Capacités annoncées (défaut: version du protocole P2P)
+            group: Groupe multicast
+            port: Port UDP des annonces
+            interval: Secondes entre deux annonces
+        """
+        self.peer_name = peer_name
+        self.peer_port = peer_port
+        self.capabilities = capabilities if capabilities is not None else {'protocol': PROTOCOL_VERSION}
+        self.group = group
+        self.port = port
+        self.interval = interval
+        self.instance = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.peers: Dict[str, DiscoveredPeer] = {}
+        self.sock: Optional[socket.socket] = None
+        self.running = False
+        self._last_reply = 0.0
+    
+    def start(self) -> bool:
+        """
+        Rejoindre le groupe et démarrer les annonces (thread séparé)
+        
+        Returns:
+            False si le multicast n'est pas disponible
+        """
+        try:
+            self.sock = self._open_socket()
+        except OSError as e:
+            print(f"[!] Découverte locale indisponible: {e}")
+            return False
+        
+        self.running = True
+        self._send(BEACON_QUERY)
+        threading.Thread(target=self._run, daemon=True).start()
+        print(f"[OK] Découverte locale active ({self.group}:{self.port})")
+        return True
+    
+    def stop(self):
+        """Annoncer le départ et quitter le groupe"""
+        if not self.running:
+            return
+        self.running = False
+        self._send(BEACON_LEAVE)
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+    
+    def get_peers(self) -> List[Dict]:
+        """
+        PC entendus récemment (sauf celui-ci)
+        
+        Returns:
+            Infos des PC au format du serveur, triées par nom
+        """
+        now = time.monotonic()
+        with self.lock:
+            peers = [peer for peer in self.peers.values() if now - peer.seen <= PEER_TIMEOUT]
+        return [peer.to_dict() for peer in sorted(peers, key=lambda peer: peer.name)]
+    
+    def get_peer(self, name: str) -> Optional[Dict]:
+        """
+        Infos d'un PC entendu récemment
+        
+        Returns:
+            Infos au format du serveur, ou None s'il n'est pas dans la table
+        """
+        with self.lock:
+            peer = self.peers.get(name)
+        if peer is None or time.monotonic() - peer.seen > PEER_TIMEOUT:
+            return None
+        return peer.to_dict()
+    
+    def _open_socket(self) -> socket.socket:
+        """Socket UDP abonnée au groupe (partagée entre les clients d'une même machine)"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('', self.port))
+            membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton('0.0.0.0'))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    
+    def _beacon(self, kind: str) -> bytes:
+        """Annonce encodée"""
+        return BEACON_PREFIX + json.dumps({
+            'type': kind,
+            'name': self.peer_name,
+            'port': self.peer_port,
+            'instance': self.instance,
+            'capabilities': self.capabilities,
+        }).encode('utf-8')
+    
+    def _send(self, kind: str):
+        try:
+            self.sock.sendto(self._beacon(kind), (self.group, self.port))
+        except OSError:
+            pass
+    
+    def _run(self):
+        """Annoncer ce PC et écouter les autres (thread séparé)"""
+        next_beacon = time.monotonic()
+        while self.running:
+            now = time.monotonic()
+            if now >= next_beacon:
+                self._send(BEACON_ANNOUNCE)
+                next_beacon = now + self.interval
+                self._expire(now)
+            try:
+                ready, _, _ = select.select([self.sock], [], [], next_beacon - now)
+                if not ready:
+                    continue
+                data, address = self.sock.recvfrom(MAX_BEACON_SIZE)
+            except (OSError, ValueError):
+                return  # Socket fermée par stop()
+            
+            # Un nouveau PC (ou une demande) reçoit une annonce sans attendre la suivante
+            if self._handle(data, address[0]) and now - self._last_reply >= REPLY_INTERVAL:
+                self._last_reply = now
+                self._send(BEACON_ANNOUNCE)
+    
+    def _handle(self, data: bytes, ip: str) -> bool:
+        """
+        Mettre à jour la table d'après une annonce reçue
+        
+        Args:
+            data: Datagramme reçu
+            ip: Adresse d'où il vient (celle qui joint le PC depuis ce sous-réseau)
+        
+        Returns:
+            True si l'expéditeur attend une annonce de ce PC (nouveau PC ou demande)
+        """
+        if not data.startswith(BEACON_PREFIX):
+            return False
+        try:
+            beacon = json.loads(data[len(BEACON_PREFIX):].decode('utf-8'))
+            kind = beacon['type']
+            name = str(beacon['name'])
+            instance = str(beacon['instance'])
+            port = int(beacon['port'])
+            capabilities = beacon.get('capabilities') or {}
+        except (ValueError, KeyError, TypeError):
+            return False
+        if instance == self.instance:
+            return False
+        
+        with self.lock:
+            known = self.peers.get(name)
+            if kind == BEACON_LEAVE:
+                if known is not None and known.instance == instance:
+                    del self.peers[name]
+                return False
+            if (known is not None and known.instance != instance and known.ip_address != ip
+                    and time.monotonic() - known.seen <= PEER_TIMEOUT):
+                return False  # Nom déjà annoncé par un autre PC encore présent
+            self.peers[name] = DiscoveredPeer(name, ip, port, capabilities, instance, time.monotonic(),
+                                              datetime.now().isoformat())
+        return kind == BEACON_QUERY or known is None or known.instance != instance
+    
+    def _expire(self, now: float):
+        """Retirer les PC qui ne s'annoncent plus"""
+        with self.lock:
+            for name in [name for name, peer in self.peers.items() if now - peer.seen > PEER_TIMEOUT]:
+                del self.peers[name]
@@ -0,0 +1,164 @@
+"""
+Diffusion d'un fichier vers plusieurs destinataires avec une seule lecture disque
+"""
+
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.protocol import CHUNK_SIZE
+
+
+# Blocs en attente max pour un destinataire avant qu'il ne décroche
+FANOUT_WINDOW = 16
+
+# Envois simultanés par défaut
+FANOUT_PARALLEL = 8
+
+
+class FanOutSubscriber:
+    """Destinataire abonné aux blocs d'un FanOutReader"""
+    
+    def __init__(self, name: str):
+        """
+        Initialiser l'abonné
+        
+        Args:
+            name: Nom du destinataire
+        """
+        self.name = name
+        self.blocks = deque()   # (offset, données) en attente d'envoi
+        self.detached = False   # Trop lent: continue seul depuis le disque
+        self.closed = False     # Terminé ou en erreur
+
+
+class FanOutReader:
+    """
+    Lecteur partagé: chaque bloc est lu une fois et distribué à tous les abonnés
+    
+    Le lecteur avance au rythme du destinataire le plus rapide. Un abonné
+    dont la file dépasse `window` blocs décroche: il vide sa file puis lit
+    lui-même la suite du fichier, sans jamais bloquer les autres.
+    """
+    
+    def __init__(self, path: str, size: int, expected: int, window: int = FANOUT_WINDOW):
+        """
+        Initialiser le lecteur
+        
+        Args:
+            path: Fichier à diffuser
+            size: Taille du fichier
+            expected: Nombre de destinataires attendus avant de commencer
+            window: Blocs en attente max par destinataire
+        """
+        self.path = path
+        self.size = size
+        self.window = window
+        self.pending = expected
+        self.subscribers: List[FanOutSubscriber] = []
+        self.finished = False
+        self.blocks_read = 0
+        self.cond = threading.Condition()
+    
+    def start(self):
+        """Démarrer la lecture en arrière-plan"""
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+    
+    def attach(self, name: str) -> FanOutSubscriber:
+        """
+        Abonner un destinataire prêt à recevoir le fichier depuis le début
+        
+        Args:
+            name: Nom du destinataire
+        
+        Returns:
+            Abonné à passer à next_block / close
+        """
+        subscriber = FanOutSubscriber(name)
+        with self.cond:
+            self.subscribers.append(subscriber)
+            self.pending -= 1
+            self.cond.notify_all()
+        return subscriber
+    
+    def decline(self):
+        """Signaler qu'un destinataire attendu ne s'abonnera pas"""
+        with self.cond:
+            self.pending -= 1
+            self.cond.notify_all()
+    
+    def next_block(self, subscriber: FanOutSubscriber) -> Optional[Tuple[int, bytes]]:
+        """
+        Bloc suivant pour un abonné
+        
+        Args:
+            subscriber: Abonné
+        
+        Returns:
+            (offset, données), ou None si l'abonné doit continuer depuis le disque
+        """
+        with self.cond:
+            while not subscriber.blocks and not subscriber.detached and not self.finished:
+                self.cond.wait()
+            if subscriber.blocks:
+                block = subscriber.blocks.popleft()
+                self.cond.notify_all()
+                return block
+            return None
+    
+    def close(self, subscriber: FanOutSubscriber):
+        """
+        Désabonner un destinataire (terminé ou en erreur)
+        
+        Args:
+            subscriber: Abonné
+        """
+        with self.cond:
+            subscriber.closed = True
+            subscriber.blocks.clear()
+            self.cond.notify_all()
+    
+    def _active(self) -> List[FanOutSubscriber]:
+        return [s for s in self.subscribers if not s.closed and not s.detached]
+    
+    def _run(self):
+        """Boucle de lecture (thread séparé)"""
+        try:
+            with self.cond:
+                while self.pending > 0:
+                    self.cond.wait()
+            
+            with open(self.path, 'rb', buffering=0) as f:
+                offset = 0
+                while offset < self.size:
+                    data = f.read(min(CHUNK_SIZE, self.size - offset))
+                    if not data:
+                        break
+                    self.blocks_read += 1
+                    
+                    with self.cond:
+                        # Attendre qu'au moins un destinataire ait de la place
+                        while True:
+                            active = self._active()
+                            if not active or any(len(s.blocks) < self.window for s in active):
+                                break
+                            self.cond.wait()
+                        if not active:
+                            break
+                        
+                        for subscriber in active:
+                            if len(subscriber.blocks) < self.window:
+                                subscriber.blocks.append((offset, data))
+                            else:
+                                subscriber.detached = True
+                        self.cond.notify_all()
+                    offset += len(data)
+        finally:
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
@@ -0,0 +1,189 @@
+"""
+Cache persistant des checksums de fichiers
+
+Un checksum est réutilisé tant que le fichier garde la même identité
+(périphérique, inode) et les mêmes taille et date de modification (ns).
+Le cache n'est qu'une optimisation: s'il est illisible, les checksums
+sont simplement recalculés.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.hashing import file_checksum
+
+
+# Base du cache, dans le dossier de stockage du client
+HASH_CACHE_FILE = '.hashes.db'
+
+# Entrées max avant éviction des moins récemment utilisées
+HASH_CACHE_LIMIT = 10000
+
+
+class HashCache:
+    """Checksums déjà calculés, indexés par l'identité du fichier"""
+    
+    def __init__(self, db_path: str, limit: int = HASH_CACHE_LIMIT):
+        """
+        Ouvrir (ou créer) le cache
+        
+        Args:
+            db_path: Chemin du fichier SQLite
+            limit: Nombre max d'entrées
+        """
+        self.db_path = db_path
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.init_database()
+    
+    def get_connection(self):
+        """Obtenir une connexion à la base"""
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def init_database(self):
+        """Créer la table si elle n'existe pas"""
+        with self.lock:
+            self._create_table()
+    
+    def _create_table(self):
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hashes (
+                    device INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    checksum TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (device, inode, algorithm)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)")
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _repair(self, error: sqlite3.Error):
+        """Recréer la table après une erreur (base supprimée ou corrompue)"""
+        print(f"[!] Cache des checksums indisponible: {error}")
+        try:
+            self._create_table()
+        except sqlite3.Error:
+            pass
+    
+    @staticmethod
+    def _identity(filepath: str) -> Tuple[int, int, int, int]:
+        """(périphérique, inode, taille, date de modification en ns) d'un fichier"""
+        stat = os.stat(filepath)
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+    
+    def get(self, filepath: str, algorithm: str) -> Optional[str]:
+        """
+        Lire le checksum d'un fichier s'il n'a pas changé
+        
+        Args:
+            filepath: Chemin du fichier
+            algorithm: Algorithme du checksum
+        
+        Returns:
+            Checksum, ou None s'il est absent ou périmé
+        """
+        try:
+            device, inode, size, mtime_ns = self._identity(filepath)
+        except OSError:
+            return None
+        
+        with self.lock:
+            conn = self.get_connection()
+            try:
+                row = conn.execute("""
+                    SELECT checksum, size, mtime_ns FROM hashes
+                    WHERE device = ? AND inode = ? AND algorithm = ?
+                """, (device, inode, algorithm)).fetchone()
+                if not row:
+                    return None
+                
+                if (row[1], row[2]) != (size, mtime_ns):
+                    # Fichier modifié (ou inode réutilisé): entrée périmée
+                    conn.execute("DELETE FROM hashes WHERE device = ? AND inode = ? AND algorithm = ?",
+                                 (device, inode, algorithm))
+                    conn.commit()
+                    return None
+                
+                conn.execute("""
+                    UPDATE hashes SET last_used = ?
+                    WHERE device = ? AND inode = ? AND algorithm = ?
+                """, (time.time(), device, inode, algorithm))
+                conn.commit()
+                return row[0]
+            except sqlite3.Error as e:
+                self._repair(e)
+                return None
+            finally:
+                conn.close()
+    
+    def put(self, filepath: str, algorithm: str, checksum: str, identity: Tuple[int, int, int, int] = None):
+        """
+        Enregistrer le checksum d'un fichier
+        
+        Args:
+            filepath: Chemin du fichier
+            algorithm: Algorithme du checksum
+            checksum: Checksum calculé
+            identity: Identité relevée avant le calcul (défaut: état actuel du fichier)
+        """
+        try:
+            current = self._identity(filepath)
+        except OSError:
+            return
+        if identity is not None and identity != current:
+            return  # Modifié pendant le calcul
+        
+        with self.lock:
+            conn = self.get_connection()
+            try:
+                conn.execute("""
+                    INSERT OR REPLACE INTO hashes
+                    (device, inode, algorithm, size, mtime_ns, checksum, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (current[0], current[1], algorithm, current[2], current[3], checksum, time.time()))
+                
+                # Éviction des entrées les moins récemment utilisées
+                conn.execute("""
+                    DELETE FROM hashes WHERE rowid IN (
+                        SELECT rowid FROM hashes ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.limit,))
+                conn.commit()
+            except sqlite3.Error as e:
+                self._repair(e)
+            finally:
+                conn.close()
+    
+    def checksum(self, filepath: str, algorithm: str) -> str:
+        """
+        Checksum d'un fichier, calculé seulement s'il n'est pas en cache
+        
+        Args:
+            filepath: Chemin du fichier
+            algorithm: Algorithme (voir shared.hashing.file_checksum)
+        
+        Returns:
+            Checksum au format d'échange
+        """
+        cached = self.get(filepath, algorithm)
+        if cached:
+            return cached
+        
+        identity = self._identity(filepath)
+        checksum = file_checksum(filepath, algorithm)
+        self.put(filepath, algorithm, checksum, identity)
+        return checksum
@@ -0,0 +1,331 @@
+"""
+File d'attente persistante des envois
+
+La commande send ajoute un job et rend la main aussitôt: des threads
+exécutent les jobs dans l'ordre d'arrivée, sans temps mort entre deux
+envois. L'état des jobs est gardé dans une base SQLite: après un
+redémarrage du client, les jobs en attente ou interrompus reprennent
+(les fichiers partiellement reçus sont complétés, pas renvoyés).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+
+# Base des jobs, dans le dossier de stockage du client
+JOBS_FILE = '.jobs.db'
+
+# Jobs exécutés en même temps
+JOB_WORKERS = 2
+
+# États d'un job
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+# Jobs terminés affichés par la commande jobs
+JOBS_SHOWN = 20
+
+
+@dataclass
+class Job:
+    """Envoi d'un fichier ou dossier à un ou plusieurs PC"""
+    id: int
+    path: str
+    recipients: List[str]  # Noms des PC (* pour tous)
+    options: Dict  # Options de la commande send (streams, parallel, relay, priority)
+    status: str = JOB_QUEUED
+    file_id: Optional[int] = None  # ID sur le serveur, gardé pour les reprises
+    results: Dict[str, bool] = field(default_factory=dict)  # Succès par destinataire
+    error: str = ''
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobQueue:
+    """Jobs d'envoi persistants et threads qui les exécutent"""
+    
+    def __init__(self, db_path: str, runner: Callable[[Job, threading.Event], Dict[str, bool]],
+                 workers: int = JOB_WORKERS):
+        """
+        Ouvrir (ou créer) la file
+        
+        Args:
+            db_path: Chemin du fichier SQLite
+            runner: Fonction (job, annulation) qui exécute un job et renvoie le succès
+                    par destinataire; elle doit s'arrêter quand l'événement est levé
+            workers: Jobs exécutés en même temps
+        """
+        self.db_path = db_path
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.running = False
+        self.threads: List[threading.Thread] = []
+        self._cancel_events: Dict[int, threading.Event] = {}  # Jobs en cours
+        self.init_database()
+    
+    def get_connection(self):
+        """Obtenir une connexion à la base"""
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def init_database(self):
+        """Créer la table et remettre en file les jobs interrompus par un arrêt du client"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    recipients TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    file_id INTEGER,
+                    results TEXT NOT NULL DEFAULT '{}',
+                    error TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+            conn.execute("UPDATE jobs SET status = ? WHERE status = ?", (JOB_QUEUED, JOB_RUNNING))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        return Job(id=row[0], path=row[1], recipients=json.loads(row[2]), options=json.loads(row[3]),
+                   status=row[4], file_id=row[5], results=json.loads(row[6]), error=row[7],
+                   created_at=row[8], updated_at=row[9])
+    
+    def _save(self, conn, job: Job):
+        job.updated_at = time.time()
+        conn.execute("""
+            UPDATE jobs SET recipients = ?, status = ?, file_id = ?, results = ?, error = ?, updated_at = ?
+            WHERE id = ?
+        """, (json.dumps(job.recipients), job.status, job.file_id, json.dumps(job.results), job.error,
+              job.updated_at, job.id))
+    
+    def update(self, job: Job):
+        """Enregistrer l'avancement d'un job (file_id, résultats)"""
+        with self.lock:
+            conn = self.get_connection()
+            try:
+                self._save(conn, job)
+                conn.commit()
+            finally:
+                conn.close()
+    
+    # ========================================
+    # COMMANDES
+    # ========================================
+    
+    def submit(self, path: str, recipients: List[str], options: Dict) -> Job:
+        """
+        Ajouter un job en fin de file
+        
+        Args:
+            path: Fichier ou dossier à envoyer (chemin absolu)
+            recipients: Noms des PC (* pour tous)
+            options: Options de la commande send
+        
+        Returns:
+            Job créé
+        """
+        now = time.time()
+        with self.condition:
+            conn = self.get_connection()
+            try:
+                cursor = conn.execute("""
+                    INSERT INTO jobs (path, recipients, options, status, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (path, json.dumps(recipients), json.dumps(options), JOB_QUEUED, now, now))
+                conn.commit()
+                job_id = cursor.lastrowid
+            finally:
+                conn.close()
+            self.condition.notify()
+        return Job(id=job_id, path=path, recipients=recipients, options=options,
+                   created_at=now, updated_at=now)
+    
+    def get(self, job_id: int) -> Optional[Job]:
+        """Lire un job"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row_to_job(row) if row else None
+        finally:
+            conn.close()
+    
+    def list_jobs(self, finished: int = JOBS_SHOWN) -> List[Job]:
+        """
+        Jobs en attente et en cours, puis les derniers jobs terminés
+        
+        Args:
+            finished: Nombre de jobs terminés à inclure
+        
+        Returns:
+            Jobs par ordre d'arrivée
+        """
+        conn = self.get_connection()
+        try:
+            active = conn.execute("SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY id",
+                                  (JOB_QUEUED, JOB_RUNNING)).fetchall()
+            done = conn.execute("SELECT * FROM jobs WHERE status NOT IN (?, ?) ORDER BY id DESC LIMIT ?",
+                                (JOB_QUEUED, JOB_RUNNING, finished)).fetchall()
+        finally:
+            conn.close()
+        return sorted((self._row_to_job(row) for row in active + done), key=lambda job: job.id)
+    
+    def cancel(self, job_id: int) -> Optional[str]:
+        """
+        Annuler un job
+        
+        Un job en attente est annulé aussitôt; un job en cours s'arrête au
+        prochain bloc envoyé (les destinataires pourront reprendre avec retry).
+        
+        Returns:
+            Nouvel état du job, ou None s'il n'existe pas ou est déjà terminé
+        """
+        with self.lock:
+            event = self._cancel_events.get(job_id)
+            if event is not None:
+                event.set()
+                return JOB_RUNNING
+            
+            conn = self.get_connection()
+            try:
+                cursor = conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                                      (JOB_CANCELLED, time.time(), job_id, JOB_QUEUED))
+                conn.commit()
+            finally:
+                conn.close()
+            return JOB_CANCELLED if cursor.rowcount else None
+    
+    def retry(self, job_id: int) -> Optional[Job]:
+        """
+        Remettre en file un job en échec ou annulé
+        
+        Seuls les destinataires qui n'ont pas reçu le fichier sont repris.
+        
+        Returns:
+            Job remis en file, ou None s'il n'existe pas ou n'est pas terminé en échec
+        """
+        with self.condition:
+            job = self.get(job_id)
+            if job is None or job.status not in (JOB_FAILED, JOB_CANCELLED):
+                return None
+            
+            failed = [name for name, success in job.results.items() if not success]
+            if failed:
+                job.recipients = failed
+            job.results = {}
+            job.error = ''
+            job.status = JOB_QUEUED
+            
+            conn = self.get_connection()
+            try:
+                self._save(conn, job)
+                conn.commit()
+            finally:
+                conn.close()
+            self.condition.notify()
+        return job
+    
+    # ========================================
+    # EXÉCUTION
+    # ========================================
+    
+    def start(self):
+        """Démarrer les threads d'exécution"""
+        self.running = True
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+    
+    def stop(self):
+        """
+        Arrêter les threads
+        
+        Les jobs en cours gardent l'état running et reprendront au
+        prochain démarrage du client.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+    
+    def stats(self) -> Dict[str, int]:
+        """Nombre de jobs par état"""
+        conn = self.get_connection()
+        try:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            conn.close()
+    
+    def _claim(self) -> Optional[Job]:
+        """Prendre le plus ancien job en attente (appelée avec le verrou)"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                               (JOB_QUEUED,)).fetchone()
+            if row is None:
+                return None
+            job = self._row_to_job(row)
+            job.status = JOB_RUNNING
+            self._save(conn, job)
+            conn.commit()
+        finally:
+            conn.close()
+        self._cancel_events[job.id] = threading.Event()
+        return job
+    
+    def _worker(self):
+        """Exécuter les jobs les uns après les autres (thread séparé)"""
+        while True:
+            with self.condition:
+                job = None
+                while self.running:
+                    job = self._claim()
+                    if job is not None:
+                        break
+                    self.condition.wait()
+                if job is None:
+                    return
+                cancel = self._cancel_events[job.id]
+            
+            try:
+                job.results.update(self.runner(job, cancel))
+                ok = sum(1 for success in job.results.values() if success)
+                if cancel.is_set():
+                    job.status = JOB_CANCELLED
+                elif job.results and ok == len(job.results):
+                    job.status = JOB_DONE
+                else:
+                    job.status = JOB_FAILED
+                    job.error = job.error or f"{ok}/{len(job.results)} réussis"
+            except Exception as e:
+                job.status = JOB_CANCELLED if cancel.is_set() else JOB_FAILED
+                job.error = str(e)
+            
+            with self.lock:
+                del self._cancel_events[job.id]
+                if not self.running and job.status != JOB_DONE:
+                    continue  # Arrêt du client: le job reprendra au prochain démarrage
+                conn = self.get_connection()
+                try:
+                    self._save(conn, job)
+                    conn.commit()
+                finally:
+                    conn.close()
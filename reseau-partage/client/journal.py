@@ -0,0 +1,156 @@
+"""
+Journal des plages reçues pour la reprise des transferts
+"""
+
+import json
+import os
+import threading
+from typing import List, Tuple
+
+
+# Suffixes des fichiers en cours de réception
+PART_SUFFIX = '.part'
+JOURNAL_SUFFIX = '.journal'
+
+
+def format_ranges(ranges: List[Tuple[int, int]]) -> str:
+    """
+    Encoder une liste de plages pour le protocole
+    
+    Args:
+        ranges: Liste de (offset, longueur)
+    
+    Returns:
+        Chaîne "offset:longueur,offset:longueur"
+    """
+    return ','.join(f"{offset}:{length}" for offset, length in ranges)
+
+
+def parse_ranges(text: str) -> List[Tuple[int, int]]:
+    """
+    Décoder une liste de plages reçue du protocole
+    
+    Args:
+        text: Chaîne produite par format_ranges
+    
+    Returns:
+        Liste de (offset, longueur)
+    """
+    ranges = []
+    for item in text.split(','):
+        if item:
+            offset, _, length = item.partition(':')
+            ranges.append((int(offset), int(length)))
+    return ranges
+
+
+class TransferJournal:
+    """Plages d'octets écrites et synchronisées sur disque d'un fichier .part"""
+    
+    def __init__(self, part_path: str, key: str, size: int):
+        """
+        Initialiser un journal vide
+        
+        Args:
+            part_path: Chemin du fichier partiel
+            key: Identifiant de la version du fichier envoyé
+            size: Taille finale attendue
+        """
+        self.part_path = part_path
+        self.path = part_path + JOURNAL_SUFFIX
+        self.key = key
+        self.size = size
+        self.ranges: List[Tuple[int, int]] = []  # (début, fin) triées et fusionnées
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def open(cls, part_path: str, key: str, size: int) -> 'TransferJournal':
+        """
+        Charger le journal d'un fichier partiel
+        
+        Le journal est ignoré s'il décrit une autre version du fichier
+        (clé ou taille différente) ou si le fichier partiel a disparu.
+        
+        Args:
+            part_path: Chemin du fichier partiel
+            key: Identifiant de la version du fichier envoyé
+            size: Taille finale attendue
+        
+        Returns:
+            Journal (vide si rien à reprendre)
+        """
+        journal = cls(part_path, key, size)
+        
+        try:
+            with open(journal.path, 'r') as f:
+                data = json.load(f)
+            if data.get('key') == key and data.get('size') == size and os.path.exists(part_path):
+                for start, end in data.get('ranges', []):
+                    journal.add(start, end)
+        except (OSError, ValueError):
+            pass
+        
+        return journal
+    
+    def add(self, start: int, end: int):
+        """
+        Marquer une plage [start, end) comme reçue
+        
+        Args:
+            start: Début de la plage
+            end: Fin de la plage (exclue)
+        """
+        if end <= start:
+            return
+        
+        with self.lock:
+            merged = []
+            for r_start, r_end in self.ranges:
+                if r_end < start or r_start > end:
+                    merged.append((r_start, r_end))
+                else:
+                    start = min(start, r_start)
+                    end = max(end, r_end)
+            merged.append((start, end))
+            self.ranges = sorted(merged)
+    
+    def completed(self) -> int:
+        """Nombre d'octets déjà reçus"""
+        with self.lock:
+            return sum(end - start for start, end in self.ranges)
+    
+    def missing(self) -> List[Tuple[int, int]]:
+        """
+        Plages restant à recevoir
+        
+        Returns:
+            Liste de (offset, longueur)
+        """
+        with self.lock:
+            missing = []
+            position = 0
+            for start, end in self.ranges:
+                if start > position:
+                    missing.append((position, start - position))
+                position = max(position, end)
+            if position < self.size:
+                missing.append((position, self.size - position))
+            return missing
+    
+    def save(self):
+        """Écrire le journal sur disque (remplacement atomique)"""
+        with self.lock:
+            data = {'key': self.key, 'size': self.size, 'ranges': self.ranges}
+        
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+    
+    def remove(self):
+        """Supprimer le journal (transfert terminé)"""
+        for path in (self.path, self.path + '.tmp'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -7,21 +7,35 @@ import argparse
 import os
 import sys
 import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
 
 # Ajouter le dossier parent au path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from client.network import NetworkClient
+from client.discovery import PeerDiscovery
+from client.compression import CODEC
 from client.transfer import FileTransfer
+from client.receiver import RECEIVE_BACKLOG, MAX_ACTIVE_RECEIVES
+from client.writer import FSYNC_CHECKPOINT, FSYNC_POLICIES, CACHE_AUTO, CACHE_POLICIES
+from client.jobs import JOBS_FILE, JOB_WORKERS, JOB_CANCELLED, JOB_RUNNING, Job, JobQueue
 from client.ui import CLI
 from client.notifications import NotificationManager
-from shared.utils import calculate_checksum, format_size
+from shared.utils import format_size, parse_size
+from shared.hashing import HASH_ALGORITHMS, DEFAULT_ALGORITHM
+from shared.protocol import PROTOCOL_VERSION
 
 
 class P2PClient:
     """Client P2P principal"""
     
-    def __init__(self, peer_name: str, server_url: str = "http://localhost:5000", port: int = 5001):
+    def __init__(self, peer_name: str, server_url: str = "http://localhost:5000", port: int = 5001,
+                 zero_copy: bool = True, dedup: bool = False, hash_algorithm: str = DEFAULT_ALGORITHM,
+                 compress: bool = True, max_receives: int = MAX_ACTIVE_RECEIVES, backlog: int = RECEIVE_BACKLOG,
+                 rate_limit: int = 0, job_workers: int = JOB_WORKERS, fsync: str = FSYNC_CHECKPOINT,
+                 cache: str = CACHE_AUTO, headless: bool = False, discovery: bool = True):
         """
         Initialiser le client
         
@@ -29,24 +43,63 @@ class P2PClient:
             peer_name: Nom de ce PC
             server_url: URL du serveur central
             port: Port pour recevoir les fichiers
+            zero_copy: Utiliser sendfile/splice pour les transferts
+            dedup: Ne transmettre que les blocs absents chez le destinataire (utile pour renvoyer
+                   des fichiers modifiés)
+            hash_algorithm: Algorithme des checksums enregistrés (blake2b, sha256, md5)
+            compress: Compresser les blocs compressibles sur les liens lents
+            max_receives: Réceptions traitées en parallèle (les suivantes attendent)
+            backlog: File d'attente du noyau pour les connexions entrantes
+            rate_limit: Débit montant max en octets/s (0: illimité, modifiable avec 'limit')
+            job_workers: Envois (jobs) exécutés en même temps
+            fsync: Synchronisation disque des fichiers reçus (none, checkpoint, full)
+            cache: Cache des fichiers reçus (keep, drop, auto: retirés du cache s'ils sont gros)
+            headless: Ne pas afficher la progression des transferts (commande 'progress')
+            discovery: Annoncer ce PC et découvrir les autres sur le réseau local (multicast)
         """
         self.peer_name = peer_name
         self.server_url = server_url
         self.port = port
+        self.hash_algorithm = hash_algorithm
         
         # Composants
-        self.network = NetworkClient(server_url, peer_name, port)
+        self.discovery = None
+        if discovery:
+            capabilities = {'protocol': PROTOCOL_VERSION, 'compress': CODEC if compress else None}
+            self.discovery = PeerDiscovery(peer_name, port, capabilities)
+        self.network = NetworkClient(server_url, peer_name, port, self.discovery)
         self.notifications = NotificationManager(enabled=True)
         
         # Dossier de stockage
         storage_dir = os.path.join(os.path.dirname(__file__), '..', 'storage', peer_name)
-        self.transfer = FileTransfer(storage_dir, port, on_receive_callback=self._on_file_received)
+        self.transfer = FileTransfer(storage_dir, port, on_receive_callback=self._on_file_received,
+                                     zero_copy=zero_copy, dedup=dedup,
+                                     checksum_lookup=self._registered_checksum,
+                                     peer_lookup=self.network.get_peer_info, compress=compress,
+                                     backlog=backlog, max_active=max_receives, rate_limit=rate_limit,
+                                     fsync=fsync, cache=cache, headless=headless)
+        
+        # File persistante des envois (exécutés en arrière-plan)
+        self.jobs = JobQueue(os.path.join(storage_dir, JOBS_FILE), self._run_send_job, workers=job_workers)
         
         self.ui = CLI(peer_name)
         
         # État
         self.running = False
     
+    def _registered_checksum(self, file_id: int):
+        """
+        Checksum enregistré par l'expéditeur d'un fichier en cours de réception
+        
+        Args:
+            file_id: ID du fichier sur le serveur
+        
+        Returns:
+            Checksum ou None
+        """
+        file_info = self.network.get_file_info(file_id)
+        return file_info['checksum'] if file_info else None
+    
     def _on_file_received(self, filename: str, sender_ip: str, is_folder: bool):
         """
         Callback appelé lors de la réception d'un fichier/dossier
@@ -56,17 +109,24 @@ class P2PClient:
             sender_ip: IP de l'expéditeur
             is_folder: True si c'est un dossier
         """
-        # Essayer de trouver le nom du PC expéditeur
-        peers = self.network.get_peers()
-        sender_name = sender_ip
-        for peer in peers:
-            if peer['ip_address'] == sender_ip:
-                sender_name = peer['name']
-                break
+        # Essayer de trouver le nom du PC expéditeur (annuaire en cache)
+        peer = self.network.get_peer_by_ip(sender_ip)
+        sender_name = peer['name'] if peer else sender_ip
         
         # Envoyer la notification
         self.notifications.notify_file_received(filename, sender_name, is_folder)
     
+    def _on_peer_change(self, event: str, peer: dict):
+        """
+        Callback appelé quand le serveur signale un changement de présence
+        
+        Args:
+            event: online, offline
+            peer: Infos du PC
+        """
+        if event == 'online':
+            self.notifications.notify_peer_connected(peer['name'])
+    
     def start(self) -> bool:
         """
         Démarrer le client
@@ -76,16 +136,30 @@ class P2PClient:
         """
         self.ui.show_banner()
         
+        # Annonces sur le réseau local (avant le serveur: les PC voisins restent joignables sans lui)
+        local = self.discovery is not None and self.discovery.start()
+        
         # S'enregistrer sur le serveur
         if not self.network.register():
             print("\n[!] Impossible de se connecter au serveur.")
             print("   Vérifiez que le serveur est démarré:")
             print(f"   python server/main.py\n")
-            return False
+            if not local:
+                return False
+            print("[!] Démarrage sans serveur: seuls les PC du réseau local sont visibles\n")
+        
+        # Annuaire en cache, mis à jour par le serveur
+        self.network.start_updates(self._on_peer_change)
         
         # Démarrer le serveur de réception
         self.transfer.start_receiver()
         
+        # Reprendre les envois laissés en file au dernier arrêt
+        queued = self.jobs.stats().get('queued', 0)
+        self.jobs.start()
+        if queued:
+            print(f"[OK] {queued} envoi(s) en file repris")
+        
         print(f"\n[OK] Client prêt ! Tapez 'help' pour voir les commandes.\n")
         
         self.running = True
@@ -96,8 +170,14 @@ class P2PClient:
         self.running = False
         print("\n\nArret du client...")
         
+        # Les envois en cours reprendront au prochain démarrage
+        self.jobs.stop()
+        
         # Se déconnecter
+        self.network.stop_updates()
         self.network.unregister()
+        if self.discovery is not None:
+            self.discovery.stop()
         
         # Arrêter le serveur de réception
         self.transfer.stop_receiver()
@@ -152,6 +232,30 @@ class P2PClient:
         elif cmd == 'status':
             self.cmd_server_status()
         
+        elif cmd == 'stats':
+            self.cmd_transfer_stats()
+        
+        elif cmd == 'progress':
+            self.cmd_progress()
+        
+        elif cmd == 'latency':
+            self.cmd_latency()
+        
+        elif cmd == 'jobs':
+            self.cmd_list_jobs()
+        
+        elif cmd == 'cancel':
+            self.cmd_cancel_job(command)
+        
+        elif cmd == 'retry':
+            self.cmd_retry_job(command)
+        
+        elif cmd == 'limit':
+            self.cmd_limit(command)
+        
+        elif cmd == 'qos':
+            self.cmd_qos()
+        
         elif cmd in ['quit', 'exit', 'q']:
             self.running = False
         
@@ -166,21 +270,36 @@ class P2PClient:
     
     def cmd_send_file(self, command: str):
         """
-        Envoyer un fichier ou dossier
+        Ajouter l'envoi d'un fichier ou dossier à la file (rend la main aussitôt)
         
         Args:
             command: Commande complète
         """
         # Parser la commande
-        filepath, recipients = self.ui.parse_send_command(command)
+        filepath, recipients, options = self.ui.parse_send_command(command)
         
         if not filepath or not recipients:
             return
         
-        # Vérifier que le chemin existe
+        job = self.jobs.submit(os.path.abspath(filepath), recipients, options)
+        print(f"[OK] Envoi ajouté à la file (job #{job.id}, 'jobs' pour suivre)")
+    
+    def _run_send_job(self, job: Job, cancel: threading.Event) -> Dict[str, bool]:
+        """
+        Exécuter un envoi de la file (thread de la JobQueue)
+        
+        Args:
+            job: Envoi à exécuter
+            cancel: Événement levé par la commande cancel
+        
+        Returns:
+            Succès par destinataire
+        """
+        filepath, recipients, options = job.path, job.recipients, job.options
+        
+        # Le chemin a pu disparaître depuis l'ajout à la file
         if not os.path.exists(filepath):
-            print(f"[X] Chemin non trouvé: {filepath}")
-            return
+            raise Exception(f"Chemin non trouvé: {filepath}")
         
         # Déterminer si c'est un fichier ou un dossier
         is_folder = os.path.isdir(filepath)
@@ -194,8 +313,7 @@ class P2PClient:
             recipients = [p['name'] for p in peers]
             
             if not recipients:
-                print(f"[X] Aucun PC en ligne pour recevoir le {item_type}")
-                return
+                raise Exception(f"Aucun PC en ligne pour recevoir le {item_type}")
             
             print(f"[INFO] Envoi public à {len(recipients)} PC")
         elif len(recipients) == 1:
@@ -203,21 +321,20 @@ class P2PClient:
         else:
             permission = 'shared'
         
-        # Vérifier que les PC existent
+        # Vérifier que les PC existent (un seul appel au serveur pour tous)
+        peers_info = self.network.get_peers_info(recipients)
         valid_recipients = []
-        for recipient in recipients:
-            peer_info = self.network.get_peer_info(recipient)
-            if peer_info:
-                valid_recipients.append(peer_info)
+        for recipient in dict.fromkeys(recipients):
+            if recipient in peers_info:
+                valid_recipients.append(peers_info[recipient])
             else:
                 print(f"[!] PC non trouvé ou hors ligne: {recipient}")
         
         if not valid_recipients:
-            print("[X] Aucun destinataire valide")
-            return
+            raise Exception("Aucun destinataire valide")
         
         # Calculer les infos
-        filename = os.path.basename(filepath)
+        filename = os.path.basename(os.path.normpath(filepath))
         
         if is_folder:
             # Calculer la taille totale du dossier
@@ -230,50 +347,48 @@ class P2PClient:
             checksum = "folder"  # Pas de checksum pour les dossiers
         else:
             filesize = os.path.getsize(filepath)
-            checksum = calculate_checksum(filepath)
+            checksum = self.transfer.hash_cache.checksum(filepath, self.hash_algorithm)
         
-        print(f"\nPreparation de l'envoi:")
+        print(f"\nPreparation de l'envoi (job #{job.id}):")
         print(f"  {'Dossier' if is_folder else 'Fichier'}: {filename}")
         print(f"  Taille: {format_size(filesize)}")
         print(f"  Destinataires: {', '.join([r['name'] for r in valid_recipients])}")
         print(f"  Permission: {permission}")
         
-        # Enregistrer sur le serveur
-        file_id = self.network.register_file(
-            filename=filename,
-            filesize=filesize,
-            checksum=checksum,
-            permission=permission,
-            recipients=[r['name'] for r in valid_recipients]
-        )
-        
+        # Enregistrer sur le serveur (une seule fois, les reprises gardent l'ID)
+        file_id = job.file_id
         if not file_id:
-            print(f"[X] Impossible d'enregistrer le {item_type} sur le serveur")
-            return
-        
-        print(f"[OK] {item_type.capitalize()} enregistré (ID: {file_id})")
-        
-        # Envoyer à chaque destinataire
-        success_count = 0
-        for recipient in valid_recipients:
-            print(f"\nEnvoi vers {recipient['name']}...")
+            file_id = self.network.register_file(
+                filename=filename,
+                filesize=filesize,
+                checksum=checksum,
+                permission=permission,
+                recipients=[r['name'] for r in valid_recipients]
+            )
             
-            if is_folder:
-                success = self.transfer.send_folder(
-                    folder_path=filepath,
-                    peer_ip=recipient['ip_address'],
-                    peer_port=recipient['port']
-                )
+            if file_id:
+                job.file_id = file_id
+                self.jobs.update(job)
+                print(f"[OK] {item_type.capitalize()} enregistré (ID: {file_id})")
+            elif self.discovery is not None and self.discovery.running:
+                # Le checksum part avec le fichier, le destinataire le vérifie quand même
+                print(f"[!] {item_type.capitalize()} non enregistré sur le serveur, envoi direct")
             else:
-                success = self.transfer.send_file(
-                    filepath=filepath,
-                    peer_ip=recipient['ip_address'],
-                    peer_port=recipient['port']
-                )
+                raise Exception(f"Impossible d'enregistrer le {item_type} sur le serveur")
+        
+        # Envoyer à tous les destinataires en parallèle
+        results = {}
+        transfers = []  # Journal envoyé au serveur en un appel à la fin du job
+        
+        def on_complete(recipient: dict, success):
+            results[recipient['name']] = bool(success)
             
-            # Logger le transfert
-            status = 'success' if success else 'failed'
-            self.network.log_transfer(file_id, recipient['name'], status)
+            # Logger le transfert (avec les octets réellement envoyés)
+            transfers.append({
+                'to_peer': recipient['name'],
+                'status': 'success' if success else 'failed',
+                'bytes_sent': getattr(success, 'transferred', None)
+            })
             
             # Notification de transfert
             self.notifications.notify_transfer_complete(
@@ -282,11 +397,105 @@ class P2PClient:
                 is_folder=is_folder,
                 success=success
             )
-            
-            if success:
-                success_count += 1
         
-        print(f"\n[OK] Transfert terminé: {success_count}/{len(valid_recipients)} réussis")
+        try:
+            if not is_folder and options['relay'] and len(valid_recipients) > 1:
+                # Les destinataires se relaient les blocs (chaîne ou arbre)
+                self.transfer.send_file_relay(
+                    filepath=filepath,
+                    recipients=valid_recipients,
+                    degree=options['relay'],
+                    on_complete=on_complete,
+                    file_id=file_id,
+                    priority=options['priority'],
+                    cancel=cancel
+                )
+            elif not is_folder and options['streams'] == 1 and len(valid_recipients) > 1:
+                # Une seule lecture du fichier pour tous les destinataires
+                self.transfer.send_file_fanout(
+                    filepath=filepath,
+                    recipients=valid_recipients,
+                    max_parallel=options['parallel'],
+                    on_complete=on_complete,
+                    file_id=file_id,
+                    priority=options['priority'],
+                    cancel=cancel
+                )
+            else:
+                def send_to(recipient: dict):
+                    if cancel.is_set():
+                        success = False
+                    elif is_folder:
+                        success = self.transfer.send_folder(
+                            folder_path=filepath,
+                            peer_ip=recipient['ip_address'],
+                            peer_port=recipient['port'],
+                            total_size=filesize,
+                            priority=options['priority'],
+                            cancel=cancel
+                        )
+                    else:
+                        success = self.transfer.send_file(
+                            filepath=filepath,
+                            peer_ip=recipient['ip_address'],
+                            peer_port=recipient['port'],
+                            streams=options['streams'],
+                            file_id=file_id,
+                            priority=options['priority'],
+                            cancel=cancel,
+                            checksum=checksum
+                        )
+                    on_complete(recipient, success)
+                
+                with ThreadPoolExecutor(max_workers=options['parallel']) as executor:
+                    list(executor.map(send_to, valid_recipients))
+        finally:
+            if file_id:
+                self.network.log_transfers(file_id, transfers)
+        
+        success_count = sum(1 for success in results.values() if success)
+        print(f"\n[OK] Job #{job.id} terminé: {success_count}/{len(valid_recipients)} réussis")
+        return results
+    
+    def cmd_list_jobs(self):
+        """Afficher la file des envois"""
+        self.ui.show_jobs(self.jobs.list_jobs())
+    
+    def cmd_cancel_job(self, command: str):
+        """
+        Annuler un envoi de la file
+        
+        Args:
+            command: Commande complète (cancel <id>)
+        """
+        job_id = self.ui.parse_job_id(command)
+        if job_id is None:
+            return
+        
+        status = self.jobs.cancel(job_id)
+        if status == JOB_RUNNING:
+            print(f"[OK] Job #{job_id}: arrêt demandé (au prochain bloc envoyé)")
+        elif status == JOB_CANCELLED:
+            print(f"[OK] Job #{job_id} annulé")
+        else:
+            print(f"[X] Job #{job_id} introuvable ou déjà terminé")
+    
+    def cmd_retry_job(self, command: str):
+        """
+        Remettre en file un envoi en échec ou annulé
+        
+        Args:
+            command: Commande complète (retry <id>)
+        """
+        job_id = self.ui.parse_job_id(command)
+        if job_id is None:
+            return
+        
+        job = self.jobs.retry(job_id)
+        if job:
+            print(f"[OK] Job #{job_id} remis en file ({', '.join(job.recipients)})")
+        else:
+            print(f"[X] Job #{job_id} introuvable, en cours ou déjà réussi")
     
     def cmd_list_received(self):
         """Lister les fichiers reçus"""
@@ -297,6 +506,51 @@ class P2PClient:
         """Afficher le statut du serveur"""
         status = self.network.server_status()
         self.ui.show_server_status(status)
+    
+    def cmd_transfer_stats(self):
+        """Afficher les statistiques des derniers transferts"""
+        stats = self.transfer.get_stats()
+        self.ui.show_transfer_stats(stats)
+    
+    def cmd_progress(self):
+        """Afficher la progression des transferts en cours"""
+        self.ui.show_progress(self.transfer.get_progress())
+    
+    def cmd_latency(self):
+        """Afficher la latence des appels au serveur par endpoint"""
+        self.ui.show_latency(self.network.get_latency_stats())
+    
+    def cmd_limit(self, command: str):
+        """
+        Changer une limite de débit (appliquée aussi aux envois en cours)
+        
+        Args:
+            command: Commande complète
+        """
+        peer_name, rate = self.ui.parse_limit_command(command)
+        if rate is None:
+            return
+        
+        shown = f"{format_size(rate)}/s" if rate else "illimité"
+        if peer_name is None:
+            self.transfer.shaper.set_limit(rate)
+            print(f"[OK] Débit montant global: {shown}")
+            return
+        
+        peer_info = self.network.get_peer_info(peer_name)
+        if not peer_info:
+            print(f"[X] PC non trouvé ou hors ligne: {peer_name}")
+            return
+        self.transfer.shaper.set_limit(rate, peer_info['ip_address'])
+        print(f"[OK] Débit vers {peer_name}: {shown}")
+    
+    def cmd_qos(self):
+        """Afficher les limites de débit et le débit mesuré par priorité"""
+        limits = self.transfer.shaper.limits()
+        names = {}
+        if limits['peers']:
+            names = {peer['ip_address']: peer['name'] for peer in self.network.get_peers()}
+        self.ui.show_qos(limits, self.transfer.shaper.stats(), names)
 
 
 def signal_handler(sig, frame):
@@ -305,6 +559,14 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
+def rate_limit_arg(text: str) -> int:
+    """Débit passé à --limit (octets/s)"""
+    rate = parse_size(text)
+    if rate is None:
+        raise argparse.ArgumentTypeError(f"débit invalide: {text}")
+    return rate
+
+
 def main():
     """Point d'entrée"""
     # Parser les arguments
@@ -312,6 +574,31 @@ def main():
     parser.add_argument('--name', required=True, help='Nom de ce PC (ex: PC1)')
     parser.add_argument('--server', default='http://localhost:5000', help='URL du serveur')
     parser.add_argument('--port', type=int, default=5001, help='Port de réception')
+    parser.add_argument('--no-zero-copy', action='store_true',
+                        help='Désactiver sendfile/splice (boucle de copie classique)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='Déduplication par blocs: ne transmettre que les blocs absents chez le destinataire '
+                             '(renvois de fichiers modifiés)')
+    parser.add_argument('--hash', choices=HASH_ALGORITHMS, default=DEFAULT_ALGORITHM,
+                        help='Algorithme des checksums (md5: checksum plat des anciens clients)')
+    parser.add_argument('--no-compress', action='store_true',
+                        help='Désactiver la compression adaptative des blocs')
+    parser.add_argument('--max-receives', type=int, default=MAX_ACTIVE_RECEIVES,
+                        help='Réceptions simultanées max (les suivantes sont mises en attente)')
+    parser.add_argument('--backlog', type=int, default=RECEIVE_BACKLOG,
+                        help="File d'attente du noyau pour les connexions entrantes")
+    parser.add_argument('--job-workers', type=int, default=JOB_WORKERS,
+                        help='Envois de la file exécutés en même temps')
+    parser.add_argument('--limit', type=rate_limit_arg, default=0,
+                        help="Débit montant max de tous les envois (ex: 5M, 500K; défaut: illimité)")
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC_CHECKPOINT,
+                        help='Synchronisation disque des réceptions (full: aussi avant de renommer le fichier)')
+    parser.add_argument('--cache', choices=CACHE_POLICIES, default=CACHE_AUTO,
+                        help='Cache des fichiers reçus (auto: les gros fichiers ne restent pas en cache)')
+    parser.add_argument('--headless', action='store_true',
+                        help="Ne pas afficher la progression (consultable avec la commande 'progress')")
+    parser.add_argument('--no-discovery', action='store_true',
+                        help='Ne pas annoncer ce PC ni découvrir les autres sur le réseau local (multicast)')
     
     args = parser.parse_args()
     
@@ -322,7 +609,19 @@ def main():
     client = P2PClient(
         peer_name=args.name,
         server_url=args.server,
-        port=args.port
+        port=args.port,
+        zero_copy=not args.no_zero_copy,
+        dedup=args.dedup,
+        hash_algorithm=args.hash,
+        compress=not args.no_compress,
+        max_receives=args.max_receives,
+        backlog=args.backlog,
+        rate_limit=args.limit,
+        job_workers=args.job_workers,
+        fsync=args.fsync,
+        cache=args.cache,
+        headless=args.headless,
+        discovery=not args.no_discovery
     )
     
     if client.start():
@@ -3,20 +3,85 @@ Communication réseau avec le serveur
 """
 
 import requests
-from typing import List, Dict, Optional
+from requests.adapters import HTTPAdapter
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Optional
 import sys
 import os
+import threading
+import time
 
 # Ajouter le dossier parent au path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from shared.utils import get_local_ip
+from client.discovery import PeerDiscovery
+
+
+# Annuaire en cache relu au-delà de cette durée sans mise à jour du serveur (secondes)
+PEER_CACHE_TTL = 60
+
+# Attente max d'une demande de changements au serveur (secondes)
+PEER_EVENTS_TIMEOUT = 25
+
+# Pause avant de redemander les changements après une erreur (secondes)
+PEER_EVENTS_RETRY = 5
+
+# Pause avant de relire l'annuaire quand le serveur n'a pas répondu (secondes)
+PEER_RELOAD_RETRY = 5
+
+# Connexions HTTP gardées ouvertes vers le serveur (appels simultanés des jobs et réceptions)
+HTTP_POOL_SIZE = 16
+
+# Nouvelles tentatives des appels sans effet de bord, pause avant la première (doublée ensuite)
+HTTP_RETRIES = 2
+HTTP_BACKOFF = 0.1
+
+# Réponses du serveur qui justifient une nouvelle tentative
+RETRY_STATUSES = {502, 503, 504}
+
+# Dernières latences gardées par endpoint (médiane, 95e centile)
+LATENCY_SAMPLES = 200
+
+# Opérations max par appel à /api/batch (voir server.config.BATCH_MAX_OPERATIONS)
+BATCH_MAX_OPERATIONS = 500
+
+
+@dataclass
+class EndpointStats:
+    """Latences des appels à un endpoint du serveur"""
+    calls: int = 0
+    errors: int = 0  # Erreurs réseau et réponses RETRY_STATUSES
+    retries: int = 0
+    total: float = 0.0  # Secondes cumulées
+    slowest: float = 0.0
+    samples: deque = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+    
+    def to_dict(self, endpoint: str) -> Dict:
+        """Mesures en millisecondes"""
+        samples = sorted(self.samples)
+        
+        def percentile(p: float) -> float:
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000 if samples else 0.0
+        
+        return {
+            'endpoint': endpoint,
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': self.total / self.calls * 1000 if self.calls else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': self.slowest * 1000,
+        }
 
 
 class NetworkClient:
     """Client pour communiquer avec le serveur central"""
     
-    def __init__(self, server_url: str, peer_name: str, peer_port: int = 5001):
+    def __init__(self, server_url: str, peer_name: str, peer_port: int = 5001,
+                 discovery: Optional[PeerDiscovery] = None):
         """
         Initialiser le client réseau
         
@@ -24,11 +89,103 @@ class NetworkClient:
             server_url: URL du serveur (ex: http://localhost:5000)
             peer_name: Nom de ce PC
             peer_port: Port pour recevoir les fichiers
+            discovery: Table des PC du réseau local, qui complète l'annuaire du serveur
         """
         self.server_url = server_url.rstrip('/')
         self.peer_name = peer_name
         self.peer_port = peer_port
         self.peer_ip = get_local_ip()
+        self.discovery = discovery
+        
+        # Annuaire des PC en ligne (par nom et par IP), tenu à jour par le serveur
+        self._peers: Dict[str, Dict] = {}
+        self._peers_by_ip: Dict[str, str] = {}
+        self._peers_synced: Optional[float] = None  # time.monotonic() de la dernière mise à jour
+        self._reload_failed: Optional[float] = None  # time.monotonic() du dernier échec de relecture
+        self._peers_lock = threading.Lock()
+        self._updates: Optional[threading.Thread] = None
+        self._generation = 0  # Incrémentée à chaque démarrage/arrêt: un seul thread de mises à jour actif
+        
+        # Session partagée: connexions gardées ouvertes (keep-alive) entre les appels
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Latences par endpoint
+        self._latency: Dict[str, EndpointStats] = {}
+        self._latency_lock = threading.Lock()
+        
+        # Faux si le serveur n'a pas /api/batch (appels un par un)
+        self._batch_supported = True
+    
+    def _request(self, method: str, path: str, endpoint: str = None, idempotent: bool = True,
+                 timeout: float = 5, record: bool = True, **kwargs) -> requests.Response:
+        """
+        Appeler le serveur sur la session partagée
+        
+        Un appel sans effet de bord est retenté HTTP_RETRIES fois (pause
+        croissante) après une erreur réseau ou une réponse RETRY_STATUSES;
+        les autres (enregistrement d'un fichier, journal) ne le sont pas
+        pour ne pas être appliqués deux fois.
+        
+        Args:
+            method: GET, POST
+            path: Chemin de l'API (ex: /api/peers/online)
+            endpoint: Nom des statistiques (défaut: path, ex: /api/peer/<name>)
+            idempotent: L'appel peut être répété sans risque
+            timeout: Attente max de la réponse en secondes
+            record: Compter l'appel dans les latences
+            **kwargs: Paramètres de requests (json, params)
+        
+        Returns:
+            Réponse du serveur (dernière tentative)
+        
+        Raises:
+            requests.exceptions.RequestException: Serveur injoignable
+        """
+        attempts = HTTP_RETRIES + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(HTTP_BACKOFF * 2 ** (attempt - 1))
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, f"{self.server_url}{path}", timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if record:
+                    self._record(endpoint or path, time.monotonic() - start, attempt, failed=True)
+                if attempt + 1 < attempts:
+                    continue
+                raise
+            
+            failed = response.status_code in RETRY_STATUSES
+            if record:
+                self._record(endpoint or path, time.monotonic() - start, attempt, failed)
+            if failed and attempt + 1 < attempts:
+                continue
+            return response
+    
+    def _record(self, endpoint: str, elapsed: float, attempt: int, failed: bool):
+        with self._latency_lock:
+            stats = self._latency.setdefault(endpoint, EndpointStats())
+            stats.calls += 1
+            stats.errors += failed
+            stats.retries += attempt > 0
+            stats.total += elapsed
+            stats.slowest = max(stats.slowest, elapsed)
+            stats.samples.append(elapsed)
+    
+    def get_latency_stats(self) -> List[Dict]:
+        """
+        Latence des appels au serveur par endpoint
+        
+        Returns:
+            {'endpoint', 'calls', 'errors', 'retries', 'avg_ms', 'p50_ms', 'p95_ms', 'max_ms'}
+            par endpoint, du plus appelé au moins appelé
+        """
+        with self._latency_lock:
+            stats = [stats.to_dict(endpoint) for endpoint, stats in self._latency.items()]
+        return sorted(stats, key=lambda stats: -stats['calls'])
     
     def register(self) -> bool:
         """
@@ -38,14 +195,13 @@ class NetworkClient:
             True si succès, False sinon
         """
         try:
-            response = requests.post(
-                f"{self.server_url}/api/register",
+            response = self._request(
+                'POST', '/api/register',
                 json={
                     'name': self.peer_name,
                     'ip': self.peer_ip,
                     'port': self.peer_port
-                },
-                timeout=5
+                }
             )
             
             if response.status_code == 200:
@@ -63,10 +219,9 @@ class NetworkClient:
     def unregister(self):
         """Se déconnecter du serveur"""
         try:
-            requests.post(
-                f"{self.server_url}/api/unregister",
-                json={'name': self.peer_name},
-                timeout=5
+            self._request(
+                'POST', '/api/unregister',
+                json={'name': self.peer_name}
             )
             print(f"✓ Déconnecté du serveur")
         except:
@@ -76,25 +231,218 @@ class NetworkClient:
         """
         Obtenir la liste des PC connectés
         
+        L'annuaire en cache, relu sur le serveur s'il date de plus de
+        PEER_CACHE_TTL (le cache périmé sert encore si le serveur ne répond
+        pas), complété par les PC découverts sur le réseau local.
+        
         Returns:
             Liste des PC avec leurs infos
         """
+        return [peer for _, peer in sorted(self._directory().items())]
+    
+    def get_peer_by_ip(self, ip: str) -> Optional[Dict]:
+        """
+        Trouver un PC d'après son adresse IP
+        
+        Args:
+            ip: Adresse IP
+        
+        Returns:
+            Infos du PC ou None
+        """
+        peers = self._directory(include_self=True)
+        with self._peers_lock:
+            name = self._peers_by_ip.get(ip)
+        if name in peers:
+            return peers[name]
+        for peer in peers.values():
+            if peer['ip_address'] == ip:
+                return peer
+        return None
+    
+    def start_updates(self, on_change: Callable[[str, Dict], None] = None):
+        """
+        Recevoir les changements de présence poussés par le serveur (thread séparé)
+        
+        Tant que les changements arrivent, l'annuaire en cache reste à
+        jour sans être relu.
+        
+        Args:
+            on_change: Fonction (événement, infos du PC) appelée quand un PC
+                       passe en ligne ('online') ou hors ligne ('offline')
+        """
+        with self._peers_lock:
+            if self._updates is not None:
+                return
+            self._generation += 1
+            self._updates = threading.Thread(target=self._poll_updates, args=(self._generation, on_change),
+                                             daemon=True)
+            self._updates.start()
+    
+    def stop_updates(self):
+        """Arrêter la réception des changements (au plus tard à la fin de la demande en cours)"""
+        with self._peers_lock:
+            self._generation += 1
+            self._updates = None
+    
+    def _directory(self, include_self: bool = False) -> Dict[str, Dict]:
+        """
+        Annuaire du serveur (en cache) complété par les PC découverts localement
+        
+        Un PC découvert n'est retenu que si le serveur ne connaît pas son
+        nom ou l'associe à la même adresse: une annonce ne peut pas
+        détourner le nom d'un PC enregistré.
+        
+        Args:
+            include_self: Garder ce PC dans l'annuaire
+        
+        Returns:
+            Infos par nom de PC
+        """
+        self._refresh_peers()
+        with self._peers_lock:
+            peers = {name: dict(peer) for name, peer in self._peers.items()}
+        if self.discovery is not None:
+            for peer in self.discovery.get_peers():
+                if self._trusted(peer):
+                    peers[peer['name']] = peer
+        if not include_self:
+            peers.pop(self.peer_name, None)
+        return peers
+    
+    def _trusted(self, peer: Dict) -> bool:
+        """Vrai si le serveur n'associe pas le nom d'un PC découvert à une autre adresse"""
+        with self._peers_lock:
+            known = self._peers.get(peer['name'])
+        return known is None or known['ip_address'] == peer['ip_address']
+    
+    def _discovered(self, peer_name: str) -> Optional[Dict]:
+        """Infos d'un PC découvert localement, si le serveur ne les contredit pas"""
+        if self.discovery is None:
+            return None
+        peer = self.discovery.get_peer(peer_name)
+        if peer is None:
+            return None
+        self._refresh_peers()
+        return peer if self._trusted(peer) else None
+    
+    def _refresh_peers(self):
+        """Relire l'annuaire s'il est périmé (pas avant PEER_RELOAD_RETRY après un échec)"""
+        if self._cache_fresh():
+            return
+        failed = self._reload_failed
+        if failed is not None and time.monotonic() - failed < PEER_RELOAD_RETRY:
+            return
+        self._reload_failed = None if self._reload_peers() else time.monotonic()
+    
+    def _cache_fresh(self) -> bool:
+        synced = self._peers_synced
+        return synced is not None and time.monotonic() - synced < PEER_CACHE_TTL
+    
+    def _reload_peers(self) -> bool:
+        """Relire tout l'annuaire sur le serveur (False si le serveur ne répond pas)"""
         try:
-            response = requests.get(
-                f"{self.server_url}/api/peers/online",
-                timeout=5
-            )
+            response = self._request('GET', '/api/peers/online')
+            if response.status_code != 200:
+                return False
+            self._set_peers(response.json()['peers'])
+            return True
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            return False
+    
+    def _set_peers(self, peers: List[Dict]):
+        """Remplacer l'annuaire en cache"""
+        with self._peers_lock:
+            self._peers = {peer['name']: peer for peer in peers}
+            self._peers_by_ip = {peer['ip_address']: peer['name'] for peer in peers}
+            self._peers_synced = time.monotonic()
+    
+    def _apply_change(self, event: str, peer: Dict) -> bool:
+        """
+        Appliquer un changement de présence à l'annuaire en cache
+        
+        Returns:
+            True si le PC a changé d'état (pas une simple mise à jour)
+        """
+        name = peer['name']
+        with self._peers_lock:
+            previous = self._peers.pop(name, None)
+            if previous is not None and self._peers_by_ip.get(previous['ip_address']) == name:
+                del self._peers_by_ip[previous['ip_address']]
+            if event == 'online':
+                self._peers[name] = peer
+                self._peers_by_ip[peer['ip_address']] = name
+                return previous is None
+            return previous is not None
+    
+    def _poll_updates(self, generation: int, on_change: Callable[[str, Dict], None] = None):
+        """
+        Demander les changements en boucle (long polling)
+        
+        Args:
+            generation: Génération de ce thread (il s'arrête dès qu'elle change)
+            on_change: Voir start_updates
+        """
+        version = epoch = None
+        while self._generation == generation:
+            try:
+                params = {'timeout': PEER_EVENTS_TIMEOUT}
+                if version is not None:
+                    params.update(since=version, epoch=epoch)
+                response = self._request(
+                    'GET', '/api/peers/events',
+                    params=params,
+                    timeout=PEER_EVENTS_TIMEOUT + 10,
+                    record=False
+                )
+                if response.status_code != 200:
+                    raise ValueError(response.status_code)
+                epoch, version, peers, changes = self._parse_events(response.json())
+            except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+                version = None  # Recharger tout l'annuaire une fois le serveur revenu
+                time.sleep(PEER_EVENTS_RETRY)
+                continue
             
-            if response.status_code == 200:
-                data = response.json()
-                # Filtrer pour ne pas s'inclure soi-même
-                peers = [p for p in data['peers'] if p['name'] != self.peer_name]
-                return peers
-            else:
-                return []
-                
-        except requests.exceptions.RequestException:
-            return []
+            if self._generation != generation:
+                return
+            if peers is not None:
+                self._set_peers(peers)
+                continue
+            
+            for event, peer in changes:
+                changed = self._apply_change(event, peer)
+                if changed and on_change and peer['name'] != self.peer_name:
+                    try:
+                        on_change(event, peer)
+                    except Exception:
+                        pass
+            with self._peers_lock:
+                self._peers_synced = time.monotonic()
+    
+    @staticmethod
+    def _parse_events(data: Dict):
+        """
+        Décoder une réponse de /api/peers/events
+        
+        Returns:
+            (époque, version, annuaire complet ou None, changements [(événement, infos du PC)])
+        
+        Raises:
+            ValueError, KeyError, TypeError: Réponse incomplète ou mal formée
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Réponse inattendue")
+        if data.get('reset'):
+            peers = list(data['peers'])
+            changes = []
+        else:
+            peers = None
+            changes = [(change['event'], change['peer']) for change in data['changes']]
+        
+        for peer in peers if peers is not None else [peer for _, peer in changes]:
+            if not isinstance(peer, dict) or not isinstance(peer.get('name'), str) or 'ip_address' not in peer:
+                raise ValueError("Infos de PC incomplètes")
+        return data['epoch'], data['version'], peers, changes
     
     def get_peer_info(self, peer_name: str) -> Optional[Dict]:
         """
@@ -106,11 +454,18 @@ class NetworkClient:
         Returns:
             Infos du PC ou None
         """
+        peer = self._discovered(peer_name)
+        if peer:
+            return peer
+        
+        if self._cache_fresh():
+            with self._peers_lock:
+                peer = self._peers.get(peer_name)
+            if peer:
+                return dict(peer)
+        
         try:
-            response = requests.get(
-                f"{self.server_url}/api/peer/{peer_name}",
-                timeout=5
-            )
+            response = self._request('GET', f"/api/peer/{peer_name}", endpoint='/api/peer/<name>')
             
             if response.status_code == 200:
                 return response.json()
@@ -120,6 +475,70 @@ class NetworkClient:
         except requests.exceptions.RequestException:
             return None
     
+    def get_peers_info(self, peer_names: List[str]) -> Dict[str, Dict]:
+        """
+        Obtenir les infos de plusieurs PC
+        
+        Les PC absents de la découverte locale et du cache sont demandés au
+        serveur en un seul appel (/api/batch).
+        
+        Args:
+            peer_names: Noms des PC
+        
+        Returns:
+            Infos par nom (les PC inconnus ou injoignables sont absents)
+        """
+        peers = {}
+        missing = []
+        for name in dict.fromkeys(peer_names):
+            peer = self._discovered(name)
+            if not peer and self._cache_fresh():
+                with self._peers_lock:
+                    peer = self._peers.get(name)
+                peer = dict(peer) if peer else None
+            if peer:
+                peers[name] = peer
+            else:
+                missing.append(name)
+        
+        if not missing:
+            return peers
+        
+        results = self.batch([{'op': 'peer', 'name': name} for name in missing])
+        if results is None:
+            if not self._batch_supported:
+                for name in missing:
+                    peer = self.get_peer_info(name)
+                    if peer:
+                        peers[name] = peer
+            return peers
+        
+        for name, result in zip(missing, results):
+            if result['status'] == 200:
+                peers[name] = result['body']
+        return peers
+    
+    def get_file_info(self, file_id: int) -> Optional[Dict]:
+        """
+        Obtenir les infos d'un fichier enregistré (dont son checksum)
+        
+        Args:
+            file_id: ID du fichier
+        
+        Returns:
+            Infos du fichier ou None
+        """
+        try:
+            response = self._request('GET', f"/api/file/{file_id}", endpoint='/api/file/<id>')
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return None
+        
+        except requests.exceptions.RequestException:
+            return None
+    
     def register_file(self, filename: str, filesize: int, checksum: str,
                      permission: str, recipients: List[str]) -> Optional[int]:
         """
@@ -136,8 +555,9 @@ class NetworkClient:
             ID du fichier ou None
         """
         try:
-            response = requests.post(
-                f"{self.server_url}/api/file/register",
+            response = self._request(
+                'POST', '/api/file/register',
+                idempotent=False,
                 json={
                     'filename': filename,
                     'filesize': filesize,
@@ -172,10 +592,10 @@ class NetworkClient:
             True si autorisé, False sinon
         """
         try:
-            response = requests.post(
-                f"{self.server_url}/api/file/{file_id}/check",
-                json={'peer_name': peer_name},
-                timeout=5
+            response = self._request(
+                'POST', f"/api/file/{file_id}/check",
+                endpoint='/api/file/<id>/check',
+                json={'peer_name': peer_name}
             )
             
             if response.status_code == 200:
@@ -187,7 +607,7 @@ class NetworkClient:
         except requests.exceptions.RequestException:
             return False
     
-    def log_transfer(self, file_id: int, to_peer: str, status: str):
+    def log_transfer(self, file_id: int, to_peer: str, status: str, bytes_sent: Optional[int] = None):
         """
         Enregistrer un transfert
         
@@ -195,21 +615,87 @@ class NetworkClient:
             file_id: ID du fichier
             to_peer: Destinataire
             status: Statut (success, failed)
+            bytes_sent: Octets réellement envoyés (déduplication, delta)
         """
         try:
-            requests.post(
-                f"{self.server_url}/api/transfer/log",
+            self._request(
+                'POST', '/api/transfer/log',
+                idempotent=False,
                 json={
                     'file_id': file_id,
                     'from_peer': self.peer_name,
                     'to_peer': to_peer,
-                    'status': status
-                },
-                timeout=5
+                    'status': status,
+                    'bytes_sent': bytes_sent
+                }
             )
         except:
             pass
     
+    def log_transfers(self, file_id: int, transfers: List[Dict]):
+        """
+        Enregistrer plusieurs transferts d'un fichier en un appel
+        
+        Args:
+            file_id: ID du fichier
+            transfers: {'to_peer', 'status', 'bytes_sent'} par destinataire
+        """
+        if not transfers:
+            return
+        
+        operations = [{
+            'op': 'log_transfer',
+            'file_id': file_id,
+            'from_peer': self.peer_name,
+            'to_peer': transfer['to_peer'],
+            'status': transfer['status'],
+            'bytes_sent': transfer.get('bytes_sent')
+        } for transfer in transfers]
+        
+        if self.batch(operations, idempotent=False) is None and not self._batch_supported:
+            for transfer in transfers:
+                self.log_transfer(file_id, transfer['to_peer'], transfer['status'], transfer.get('bytes_sent'))
+    
+    def batch(self, operations: List[Dict], idempotent: bool = True) -> Optional[List[Dict]]:
+        """
+        Exécuter plusieurs opérations sur le serveur (/api/batch)
+        
+        Chaque appel au serveur regroupe jusqu'à BATCH_MAX_OPERATIONS
+        opérations, exécutées dans une seule transaction.
+        
+        Args:
+            operations: {'op': 'peer' | 'register_file' | 'log_transfer' | 'check_permission', ...}
+            idempotent: Les opérations peuvent être répétées sans risque (retentatives)
+        
+        Returns:
+            {'status', 'body'} par opération dans l'ordre, ou None si le serveur
+            est injoignable ou n'a pas /api/batch
+        """
+        if not self._batch_supported:
+            return None
+        
+        results = []
+        try:
+            for start in range(0, len(operations), BATCH_MAX_OPERATIONS):
+                response = self._request(
+                    'POST', '/api/batch',
+                    idempotent=idempotent,
+                    json={'operations': operations[start:start + BATCH_MAX_OPERATIONS]},
+                    timeout=10
+                )
+                
+                if response.status_code == 404:
+                    # Serveur d'avant /api/batch
+                    self._batch_supported = False
+                    return None
+                if response.status_code != 200:
+                    return None
+                results.extend(response.json()['results'])
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            return None
+        
+        return results
+    
     def server_status(self) -> Optional[Dict]:
         """
         Obtenir le statut du serveur
@@ -218,10 +704,7 @@ class NetworkClient:
             Statut ou None
         """
         try:
-            response = requests.get(
-                f"{self.server_url}/api/status",
-                timeout=5
-            )
+            response = self._request('GET', '/api/status')
             
             if response.status_code == 200:
                 return response.json()
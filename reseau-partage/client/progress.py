@@ -0,0 +1,212 @@
+"""
+Progression des transferts
+
+Chaque transfert a un compteur d'octets que les threads de données
+incrémentent sans verrou (une case par thread, seule la case du thread
+courant est modifiée). Un seul thread relève tous les compteurs à
+intervalle fixe: il calcule le débit instantané, le débit moyen et le
+temps passé sans progresser, et affiche une ligne unique qui résume les
+transferts en cours. En mode silencieux (ou hors terminal), rien n'est
+affiché mais les mesures restent disponibles par snapshot().
+"""
+
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.utils import format_size
+
+
+# Intervalle entre deux relevés (secondes)
+REFRESH_INTERVAL = 0.5
+
+# Fenêtre du débit instantané (secondes)
+RATE_WINDOW = 2.0
+
+# Temps sans octet au-delà duquel un transfert est considéré bloqué (secondes)
+STALL_THRESHOLD = 1.0
+
+# Longueur max du nom affiché d'un transfert
+NAME_WIDTH = 20
+
+
+class Progress:
+    """Compteur d'un transfert (gestionnaire de contexte, remplace une barre tqdm)"""
+    
+    def __init__(self, monitor: 'ProgressMonitor', name: str, peer: str, direction: str,
+                 total: int = 0, initial: int = 0):
+        """
+        Args:
+            monitor: Relevé des compteurs
+            name: Nom du fichier ou dossier
+            peer: Adresse de l'autre PC
+            direction: send, receive
+            total: Octets attendus (0: inconnu)
+            initial: Octets déjà présents (reprise)
+        """
+        self.monitor = monitor
+        self.name = name
+        self.peer = peer
+        self.direction = direction
+        self.total = total or 0
+        self.initial = initial
+        self.start = time.monotonic()
+        self.last = self.start  # Dernier octet compté
+        self.finished: Optional[float] = None
+        self._cells: Dict[int, int] = {}  # Octets par thread
+        
+        # Mis à jour par le thread de relevé seulement
+        self.stalled = 0.0
+        self._samples = deque([(self.start, 0)])
+    
+    def __enter__(self) -> 'Progress':
+        return self
+    
+    def __exit__(self, *exc):
+        self.monitor._finish(self)
+    
+    def update(self, n: int):
+        """Compter `n` octets (sans verrou, appelable depuis plusieurs threads)"""
+        cells = self._cells
+        thread = threading.get_ident()
+        cells[thread] = cells.get(thread, 0) + n
+        self.last = time.monotonic()
+    
+    def skip(self, n: int):
+        """Compter `n` octets déjà présents chez l'autre PC (connus en cours de transfert)"""
+        self.initial += n
+    
+    @property
+    def moved(self) -> int:
+        """Octets comptés depuis le début du transfert"""
+        return sum(list(self._cells.values()))
+    
+    def sample(self, now: float, interval: float):
+        """Relever le compteur (thread de relevé)"""
+        self._samples.append((now, self.moved))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW:
+            self._samples.popleft()
+        if now - self.last >= STALL_THRESHOLD:
+            self.stalled += min(interval, now - self.last)
+    
+    def snapshot(self) -> Dict:
+        """
+        Mesures du transfert
+        
+        Returns:
+            {'name', 'peer', 'direction', 'total', 'bytes', 'percent', 'rate',
+            'average', 'stalled', 'elapsed', 'done'}; débits en octets/s
+        """
+        now = self.finished or time.monotonic()
+        moved = self.moved
+        elapsed = now - self.start
+        first_time, first_moved = self._samples[0]
+        window = now - first_time
+        done = self.initial + moved
+        return {
+            'name': self.name,
+            'peer': self.peer,
+            'direction': self.direction,
+            'total': self.total,
+            'bytes': done,
+            'percent': 100.0 * done / self.total if self.total else None,
+            'rate': (moved - first_moved) / window if window > 0 and self.finished is None else 0.0,
+            'average': moved / elapsed if elapsed > 0 else 0.0,
+            'stalled': self.stalled,
+            'elapsed': elapsed,
+            'done': self.finished is not None,
+        }
+
+
+class ProgressMonitor:
+    """Relevé périodique des compteurs et affichage combiné"""
+    
+    def __init__(self, headless: bool = False, interval: float = REFRESH_INTERVAL, stream=None):
+        """
+        Args:
+            headless: Ne rien afficher (les mesures restent disponibles)
+            interval: Secondes entre deux relevés
+            stream: Sortie de l'affichage (défaut: sys.stderr)
+        """
+        self.stream = stream or sys.stderr
+        self.headless = headless or not getattr(self.stream, 'isatty', lambda: False)()
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active: List[Progress] = []
+        self.thread: Optional[threading.Thread] = None
+        self._shown = 0  # Longueur de la ligne affichée
+    
+    def track(self, name: str, peer: str, direction: str, total: int = 0, initial: int = 0) -> Progress:
+        """
+        Déclarer un transfert (à utiliser avec `with`)
+        
+        Args:
+            name: Nom du fichier ou dossier
+            peer: Adresse de l'autre PC
+            direction: send, receive
+            total: Octets attendus (0: inconnu)
+            initial: Octets déjà présents (reprise)
+        """
+        progress = Progress(self, name, peer, direction, total, initial)
+        with self.lock:
+            self.active.append(progress)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return progress
+    
+    def snapshot(self) -> List[Dict]:
+        """Mesures des transferts en cours (voir Progress.snapshot)"""
+        with self.lock:
+            active = list(self.active)
+        return [progress.snapshot() for progress in active]
+    
+    def _finish(self, progress: Progress):
+        progress.finished = time.monotonic()
+        with self.lock:
+            if progress in self.active:
+                self.active.remove(progress)
+    
+    def _run(self):
+        """Relever les compteurs tant qu'il y a des transferts (thread séparé)"""
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self.lock:
+                active = list(self.active)
+                if not active:
+                    self.thread = None
+            for progress in active:
+                progress.sample(now, self.interval)
+            if not self.headless:
+                self._render(active)
+            if not active:
+                return
+    
+    def _render(self, active: List[Progress]):
+        """Réécrire la ligne de résumé (effacée quand plus rien n'est en cours)"""
+        parts = []
+        for progress in active:
+            stats = progress.snapshot()
+            arrow = '->' if stats['direction'] == 'send' else '<-'
+            done = f"{stats['percent']:.0f}%" if stats['percent'] is not None else format_size(stats['bytes'])
+            stalled = ' bloqué' if time.monotonic() - progress.last >= STALL_THRESHOLD else ''
+            parts.append(f"{stats['name'][:NAME_WIDTH]} {arrow} {stats['peer']} {done} "
+                         f"{format_size(stats['rate'])}/s{stalled}")
+        line = ''
+        if parts:
+            line = f"[{len(parts)}] " + ' | '.join(parts) if len(parts) > 1 else parts[0]
+        width = shutil.get_terminal_size().columns - 1
+        line = line[:width]
+        try:
+            self.stream.write('\r' + line.ljust(self._shown) + ('\r' if not line else ''))
+            self.stream.flush()
+        except (OSError, ValueError):
+            return
+        self._shown = len(line)
@@ -0,0 +1,308 @@
+"""
+Serveur de réception piloté par événements
+
+Un seul thread surveille le port d'écoute et les connexions qui n'ont
+pas encore envoyé leur en-tête (selectors). Les transferts sont confiés
+à au plus `max_active` threads, les suivants attendent dans une file.
+Quand la file est pleine, le port n'est plus lu: les nouvelles
+connexions restent dans la file du noyau (backlog) et les expéditeurs
+patientent sans envoyer de données.
+
+Une session persistante qui a terminé un transfert retourne à la boucle
+d'événements sans occuper de thread jusqu'à l'en-tête suivant.
+"""
+
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+
+# File d'attente du noyau pour les connexions pas encore acceptées
+RECEIVE_BACKLOG = 128
+
+# Transferts reçus en parallèle
+MAX_ACTIVE_RECEIVES = 8
+
+# Connexions acceptées en attente d'un thread (au-delà, le port n'est plus lu)
+MAX_QUEUED_RECEIVES = 64
+
+# Délai max entre l'acceptation d'une connexion et son en-tête (secondes)
+HEADER_TIMEOUT = 30
+
+# Octets lus (sans les consommer) pour classer une connexion
+PEEK_SIZE = 512
+
+# Inactivité max d'une session persistante (plus long que côté expéditeur)
+SESSION_IDLE_TIMEOUT = 60
+
+# Sessions inactives gardées au total
+MAX_IDLE_SESSIONS = 256
+
+
+class ReceiveServer:
+    """Acceptation des connexions et répartition sur un nombre borné de threads"""
+    
+    def __init__(self, port: int, handler: Callable[[socket.socket, Tuple], None],
+                 bypass: Callable[[bytes], bool] = None, backlog: int = RECEIVE_BACKLOG,
+                 max_active: int = MAX_ACTIVE_RECEIVES, max_queued: int = MAX_QUEUED_RECEIVES):
+        """
+        Initialiser le serveur
+        
+        Args:
+            port: Port d'écoute
+            handler: Fonction (socket, adresse) qui traite une connexion et renvoie
+                     True si elle peut attendre un autre transfert (session)
+            bypass: Fonction (début de l'en-tête) -> True si la connexion ne doit pas
+                    attendre de place (flux d'un transfert déjà en cours)
+            backlog: File d'attente du noyau (listen)
+            max_active: Transferts traités en parallèle
+            max_queued: Connexions acceptées en attente
+        """
+        self.port = port
+        self.handler = handler
+        self.bypass = bypass
+        self.backlog = backlog
+        self.max_active = max(1, max_active)
+        self.max_queued = max(1, max_queued)
+        self.running = False
+        
+        self.listener: Optional[socket.socket] = None
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.thread: Optional[threading.Thread] = None
+        self._accepting = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        
+        # Connexions dont l'en-tête n'est pas encore arrivé: (adresse, échéance, session)
+        self._headers: Dict[socket.socket, Tuple[Tuple, float, bool]] = {}
+        self._waiting = 0  # Nouvelles connexions parmi elles (les sessions ne comptent pas)
+        self._parked = []  # Sessions rendues par les threads, à surveiller
+        
+        # Connexions en attente d'un thread et connexions en cours
+        self.queue = deque()
+        self.active = 0
+        self._sockets = set()
+        self.lock = threading.Lock()
+    
+    def start(self):
+        """
+        Ouvrir le port et démarrer la boucle d'événements
+        
+        Raises:
+            OSError: Port indisponible
+        """
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.listener.bind(('0.0.0.0', self.port))
+            self.listener.listen(self.backlog)
+        except OSError:
+            self.listener.close()
+            raise
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self._wake_r, selectors.EVENT_READ)
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Fermer le port et interrompre les transferts en cours (sans attendre)"""
+        self.running = False
+        self._wake()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+    
+    def stats(self) -> Dict:
+        """Transferts en cours et connexions en attente"""
+        with self.lock:
+            return {'active': self.active, 'queued': len(self.queue), 'waiting_header': self._waiting,
+                    'idle_sessions': len(self._headers) - self._waiting}
+    
+    def _wake(self):
+        """Réveiller la boucle d'événements"""
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # Déjà réveillée (tampon plein) ou arrêtée
+    
+    # ========================================
+    # BOUCLE D'ÉVÉNEMENTS
+    # ========================================
+    
+    def _loop(self):
+        """Boucle d'événements (thread séparé)"""
+        try:
+            while self.running:
+                self._adopt_parked()
+                self._update_accepting()
+                for key, _ in self.selector.select(self._next_timeout()):
+                    if key.fileobj is self._wake_r:
+                        self._drain_wake()
+                    elif key.fileobj is self.listener:
+                        self._accept()
+                    else:
+                        self._on_header(key.fileobj)
+                self._expire_headers()
+        except Exception as e:
+            if self.running:
+                print(f"[X] Erreur serveur réception: {e}")
+        finally:
+            self.running = False
+            self._close_all()
+    
+    def _update_accepting(self):
+        """Lire le port seulement s'il reste de la place dans la file"""
+        with self.lock:
+            room = len(self.queue) + self._waiting < self.max_queued
+        if room and not self._accepting:
+            self.selector.register(self.listener, selectors.EVENT_READ)
+        elif not room and self._accepting:
+            self.selector.unregister(self.listener)
+        self._accepting = room
+    
+    def _next_timeout(self) -> Optional[float]:
+        """Attente jusqu'à la prochaine échéance d'en-tête (None: pas d'échéance)"""
+        if not self._headers:
+            return None
+        deadline = min(deadline for _, deadline, _ in self._headers.values())
+        return max(0.0, deadline - time.monotonic())
+    
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def _accept(self):
+        """Accepter les connexions prêtes, dans la limite de la file"""
+        while len(self.queue) + self._waiting < self.max_queued:
+            try:
+                sock, address = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"[!] Connexion refusée: {e}")
+                return
+            sock.setblocking(True)
+            self._headers[sock] = (address, time.monotonic() + HEADER_TIMEOUT, False)
+            self._waiting += 1
+            self.selector.register(sock, selectors.EVENT_READ)
+    
+    def _adopt_parked(self):
+        """Surveiller les sessions rendues par les threads"""
+        with self.lock:
+            parked, self._parked = self._parked, []
+        for sock, address in parked:
+            if len(self._headers) - self._waiting >= MAX_IDLE_SESSIONS:
+                sock.close()
+                continue
+            self._headers[sock] = (address, time.monotonic() + SESSION_IDLE_TIMEOUT, True)
+            self.selector.register(sock, selectors.EVENT_READ)
+    
+    def _on_header(self, sock: socket.socket):
+        """Premiers octets arrivés: répartir la connexion"""
+        self.selector.unregister(sock)
+        address, _, session = self._headers.pop(sock)
+        if not session:
+            self._waiting -= 1
+        try:
+            peek = sock.recv(PEEK_SIZE, socket.MSG_PEEK)
+        except OSError:
+            peek = b''
+        if not peek:
+            sock.close()  # Fermée avant d'envoyer quoi que ce soit
+            return
+        self._dispatch(sock, address, bool(self.bypass and self.bypass(peek)))
+    
+    def _expire_headers(self):
+        """Fermer les connexions restées muettes"""
+        now = time.monotonic()
+        for sock, (address, deadline, session) in list(self._headers.items()):
+            if deadline <= now:
+                self.selector.unregister(sock)
+                del self._headers[sock]
+                sock.close()
+                if not session:
+                    self._waiting -= 1
+                    print(f"[!] Connexion sans en-tête fermée: {address[0]}")
+    
+    def _dispatch(self, sock: socket.socket, address, bypass: bool):
+        """
+        Lancer le traitement d'une connexion ou la mettre en file
+        
+        Args:
+            sock: Connexion
+            address: Adresse de l'expéditeur
+            bypass: Ne pas compter la connexion dans la limite
+        """
+        with self.lock:
+            if not bypass:
+                if self.active >= self.max_active:
+                    self.queue.append((sock, address))
+                    return
+                self.active += 1
+        threading.Thread(target=self._worker, args=(sock, address, not bypass), daemon=True).start()
+    
+    def _worker(self, sock: socket.socket, address, counted: bool):
+        """Traiter une connexion puis celles de la file (thread séparé)"""
+        while sock is not None:
+            with self.lock:
+                self._sockets.add(sock)
+            keep = False
+            try:
+                keep = self.handler(sock, address)
+            except Exception as e:
+                print(f"\n[X] Erreur réception: {e}")
+            finally:
+                with self.lock:
+                    self._sockets.discard(sock)
+                    if keep and self.running:
+                        self._parked.append((sock, address))
+                    else:
+                        keep = False
+                if keep:
+                    self._wake()
+                else:
+                    sock.close()
+            
+            if not counted:
+                return
+            with self.lock:
+                if self.queue and self.running:
+                    sock, address = self.queue.popleft()
+                else:
+                    self.active -= 1
+                    sock = None
+            self._wake()  # De la place s'est libérée dans la file
+    
+    def _close_all(self):
+        """Fermer le port, les connexions en attente et interrompre les transferts"""
+        if self.listener:
+            self.listener.close()
+        for sock in self._headers:
+            sock.close()
+        self._headers.clear()
+        self._waiting = 0
+        if self.selector:
+            self.selector.close()
+        
+        with self.lock:
+            pending = list(self.queue) + self._parked
+            self.queue.clear()
+            self._parked = []
+            active = list(self._sockets)
+        for sock, _ in pending:
+            sock.close()
+        for sock in active:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,129 @@
+"""
+Sessions persistantes vers les autres PC
+
+Une connexion qui a terminé proprement un transfert est gardée ouverte
+et réutilisée pour l'envoi suivant vers le même PC (ip, port): plus de
+poignée de main TCP ni de démarrage lent entre deux fichiers. Plusieurs
+envois simultanés vers un même PC utilisent chacun leur session.
+"""
+
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Tuple
+
+
+# Inactivité max d'une session côté expéditeur (le destinataire la garde plus longtemps)
+SESSION_IDLE_TIMEOUT = 30
+
+# Sessions inactives gardées par PC
+SESSIONS_PER_PEER = 4
+
+
+class SessionPool:
+    """Connexions inactives réutilisables, par (ip, port)"""
+    
+    def __init__(self, on_connect: Callable[[socket.socket], None] = None,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT, per_peer: int = SESSIONS_PER_PEER):
+        """
+        Initialiser le pool
+        
+        Args:
+            on_connect: Réglage appliqué à chaque nouvelle connexion
+            idle_timeout: Secondes d'inactivité avant fermeture
+            per_peer: Sessions inactives gardées par PC
+        """
+        self.on_connect = on_connect
+        self.idle_timeout = idle_timeout
+        self.per_peer = per_peer
+        self.idle: Dict[Tuple[str, int], deque] = {}  # (ip, port) -> (socket, date de retour)
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+    
+    def acquire(self, ip: str, port: int) -> Tuple[socket.socket, bool]:
+        """
+        Obtenir une connexion vers un PC
+        
+        Args:
+            ip: IP du destinataire
+            port: Port du destinataire
+        
+        Returns:
+            (socket, True si c'est une session réutilisée)
+        """
+        key = (ip, port)
+        while True:
+            with self.lock:
+                sessions = self.idle.get(key)
+                if not sessions:
+                    break
+                sock, released = sessions.pop()  # La plus récente
+            if time.monotonic() - released < self.idle_timeout and self._healthy(sock):
+                with self.lock:
+                    self.reused += 1
+                return sock, True
+            sock.close()
+        
+        sock = socket.create_connection(key)
+        if self.on_connect:
+            self.on_connect(sock)
+        with self.lock:
+            self.opened += 1
+        return sock, False
+    
+    def release(self, ip: str, port: int, sock: socket.socket, reusable: bool):
+        """
+        Rendre une connexion après un transfert
+        
+        Args:
+            ip: IP du destinataire
+            port: Port du destinataire
+            sock: Connexion obtenue par acquire
+            reusable: Le transfert s'est terminé proprement
+        """
+        if reusable:
+            with self.lock:
+                sessions = self.idle.setdefault((ip, port), deque())
+                sessions.append((sock, time.monotonic()))
+                if len(sessions) <= self.per_peer:
+                    return
+                sock, _ = sessions.popleft()  # Trop de sessions: fermer la plus ancienne
+        sock.close()
+    
+    def discard(self, ip: str, port: int):
+        """Fermer les sessions inactives vers un PC (redémarré, injoignable...)"""
+        with self.lock:
+            sessions = self.idle.pop((ip, port), ())
+        for sock, _ in sessions:
+            sock.close()
+    
+    def close_all(self):
+        """Fermer toutes les sessions inactives"""
+        with self.lock:
+            sessions = [sock for items in self.idle.values() for sock, _ in items]
+            self.idle.clear()
+        for sock in sessions:
+            sock.close()
+    
+    def stats(self) -> Dict:
+        """Connexions ouvertes, réutilisées et inactives"""
+        with self.lock:
+            return {'opened': self.opened, 'reused': self.reused,
+                    'idle': sum(len(items) for items in self.idle.values())}
+    
+    @staticmethod
+    def _healthy(sock: socket.socket) -> bool:
+        """
+        Vérifier qu'une session inactive est toujours utilisable
+        
+        Une session inactive ne doit rien avoir à lire: des données ou une
+        fin de connexion signifient que le destinataire l'a fermée.
+        """
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
@@ -0,0 +1,278 @@
+"""
+Limitation de débit et priorités des envois
+
+Chaque envoi appartient à une classe de priorité (interactive, normal,
+bulk) et passe par un seau à jetons global puis par celui de son PC
+destinataire. Les jetons sont réservés bloc par bloc, dans l'ordre des
+demandes: les envois simultanés se partagent le débit à parts égales.
+Tant qu'un envoi interactif est en cours, les envois bulk s'arrêtent
+entre deux blocs et lui laissent la bande passante. C'est aussi entre
+deux blocs qu'un envoi annulé s'arrête.
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.protocol import CHUNK_SIZE
+
+
+# Classes de priorité, de la plus urgente à la moins urgente
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_BULK = 'bulk'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK)
+
+# Classe par défaut selon la taille envoyée
+INTERACTIVE_MAX_SIZE = 8 * 1024 * 1024
+BULK_MIN_SIZE = 256 * 1024 * 1024
+
+# Rafale autorisée après une pause (secondes de débit, au moins un bloc)
+BURST_SECONDS = 0.25
+
+# Pause max d'un envoi bulk entre deux blocs (il avance ensuite d'un bloc)
+PREEMPT_MAX_PAUSE = 10
+
+# Intervalle de vérification de l'annulation pendant une pause (secondes)
+CANCEL_CHECK_INTERVAL = 0.1
+
+
+class TransferCancelled(Exception):
+    """Envoi annulé par l'utilisateur (pas de reprise automatique)"""
+    pass
+
+
+def classify(size: int) -> str:
+    """
+    Classe de priorité par défaut d'un envoi
+    
+    Args:
+        size: Octets à envoyer
+    
+    Returns:
+        interactive (petits envois), bulk (gros envois) ou normal
+    """
+    if size <= INTERACTIVE_MAX_SIZE:
+        return PRIORITY_INTERACTIVE
+    if size >= BULK_MIN_SIZE:
+        return PRIORITY_BULK
+    return PRIORITY_NORMAL
+
+
+class TokenBucket:
+    """Seau à jetons (un jeton par octet), protégé par le verrou du TrafficShaper"""
+    
+    def __init__(self, rate: float):
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+    
+    def set_rate(self, rate: float):
+        """Changer le débit (octets/s) sans perdre les réservations en cours"""
+        self.rate = max(0.0, rate)
+        self.burst = max(CHUNK_SIZE, self.rate * BURST_SECONDS)
+        self.tokens = min(self.tokens, self.burst)
+    
+    def reserve(self, n: int) -> float:
+        """
+        Réserver `n` jetons
+        
+        Le seau peut passer en négatif: les demandes suivantes attendent
+        que cette dette soit remboursée, dans l'ordre d'arrivée.
+        
+        Returns:
+            Secondes à attendre avant d'utiliser les jetons
+        """
+        now = time.monotonic()
+        if not self.rate:
+            self.updated = now
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= n
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Flow:
+    """Envoi en cours, vu par le TrafficShaper (gestionnaire de contexte)"""
+    
+    def __init__(self, shaper: 'TrafficShaper', peer: Optional[str], priority: str,
+                 cancel: threading.Event = None):
+        """
+        Args:
+            shaper: Ordonnanceur des envois
+            peer: Adresse du destinataire (None: limite globale seulement)
+            priority: Classe de priorité
+            cancel: Événement levé pour annuler l'envoi
+        """
+        self.shaper = shaper
+        self.peer = peer
+        self.priority = priority
+        self.cancel = cancel
+    
+    def __enter__(self) -> 'Flow':
+        self.shaper._open(self.priority)
+        return self
+    
+    def __exit__(self, *exc):
+        self.shaper._close(self.priority)
+    
+    def check(self):
+        """
+        Raises:
+            TransferCancelled: L'envoi a été annulé
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            raise TransferCancelled("envoi annulé")
+    
+    def throttle(self, n: int):
+        """
+        Compter `n` octets envoyés et attendre si la limite est dépassée
+        
+        Appelée après chaque bloc: un envoi bulk s'arrête ici tant qu'un
+        envoi interactif est en cours. Une annulation interrompt l'attente.
+        
+        Raises:
+            TransferCancelled: L'envoi a été annulé
+        """
+        self.check()
+        waited = 0.0
+        if self.priority == PRIORITY_BULK:
+            waited += self.shaper._yield_to_interactive(self.cancel)
+        delay = self.shaper._reserve(self.peer, n)
+        if delay > 0:
+            if self.cancel is not None:
+                self.cancel.wait(delay)
+            else:
+                time.sleep(delay)
+            waited += delay
+        self.shaper._account(self.priority, n, waited)
+        self.check()
+
+
+class TrafficShaper:
+    """Limites de débit (globale et par PC) et mesures par classe de priorité"""
+    
+    def __init__(self, rate: float = 0):
+        """
+        Initialiser l'ordonnanceur
+        
+        Args:
+            rate: Débit montant max en octets/s (0: illimité)
+        """
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.global_bucket = TokenBucket(rate)
+        self.peer_buckets: Dict[str, TokenBucket] = {}
+        
+        # Mesures par classe: envois en cours, octets, temps d'activité, temps d'attente
+        self.active = {priority: 0 for priority in PRIORITIES}
+        self.bytes = {priority: 0 for priority in PRIORITIES}
+        self.busy = {priority: 0.0 for priority in PRIORITIES}
+        self.waited = {priority: 0.0 for priority in PRIORITIES}
+        self._busy_since: Dict[str, float] = {}
+    
+    def flow(self, peer: Optional[str], priority: str, cancel: threading.Event = None) -> Flow:
+        """
+        Déclarer un envoi (à utiliser avec `with`)
+        
+        Args:
+            peer: Adresse du destinataire (None: limite globale seulement)
+            priority: Classe de priorité (voir PRIORITIES)
+            cancel: Événement levé pour annuler l'envoi
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Priorité inconnue: {priority}")
+        return Flow(self, peer, priority, cancel)
+    
+    def set_limit(self, rate: float, peer: str = None):
+        """
+        Changer une limite pendant les envois
+        
+        Args:
+            rate: Débit max en octets/s (0: illimité)
+            peer: Adresse d'un PC (None: limite globale)
+        """
+        with self.lock:
+            if peer is None:
+                self.global_bucket.set_rate(rate)
+            elif rate:
+                bucket = self.peer_buckets.get(peer)
+                if bucket is None:
+                    self.peer_buckets[peer] = TokenBucket(rate)
+                else:
+                    bucket.set_rate(rate)
+            else:
+                self.peer_buckets.pop(peer, None)
+    
+    def limits(self) -> Dict:
+        """Limites actuelles: {'global': débit, 'peers': {adresse: débit}} (0: illimité)"""
+        with self.lock:
+            return {'global': self.global_bucket.rate,
+                    'peers': {peer: bucket.rate for peer, bucket in self.peer_buckets.items()}}
+    
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Mesures par classe de priorité
+        
+        Returns:
+            {classe: {'active', 'bytes', 'busy', 'waited', 'throughput'}}; le
+            débit est calculé sur le temps où la classe avait un envoi en cours
+        """
+        now = time.monotonic()
+        with self.lock:
+            stats = {}
+            for priority in PRIORITIES:
+                busy = self.busy[priority]
+                if priority in self._busy_since:
+                    busy += now - self._busy_since[priority]
+                stats[priority] = {'active': self.active[priority], 'bytes': self.bytes[priority],
+                                   'busy': busy, 'waited': self.waited[priority],
+                                   'throughput': self.bytes[priority] / busy if busy > 0 else 0.0}
+            return stats
+    
+    def _open(self, priority: str):
+        with self.lock:
+            if not self.active[priority]:
+                self._busy_since[priority] = time.monotonic()
+            self.active[priority] += 1
+    
+    def _close(self, priority: str):
+        with self.condition:
+            self.active[priority] -= 1
+            if not self.active[priority]:
+                self.busy[priority] += time.monotonic() - self._busy_since.pop(priority)
+                if priority == PRIORITY_INTERACTIVE:
+                    self.condition.notify_all()
+    
+    def _yield_to_interactive(self, cancel: threading.Event = None) -> float:
+        """Attendre la fin des envois interactifs (PREEMPT_MAX_PAUSE au plus, moins si l'envoi est annulé)"""
+        with self.condition:
+            if not self.active[PRIORITY_INTERACTIVE]:
+                return 0.0
+            start = time.monotonic()
+            deadline = start + PREEMPT_MAX_PAUSE
+            while self.active[PRIORITY_INTERACTIVE] and not (cancel is not None and cancel.is_set()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(min(remaining, CANCEL_CHECK_INTERVAL) if cancel is not None else remaining)
+            return time.monotonic() - start
+    
+    def _reserve(self, peer: Optional[str], n: int) -> float:
+        """Réserver `n` octets dans le seau global et celui du PC"""
+        with self.lock:
+            delay = self.global_bucket.reserve(n)
+            bucket = self.peer_buckets.get(peer)
+            if bucket is not None:
+                delay = max(delay, bucket.reserve(n))
+            return delay
+    
+    def _account(self, priority: str, n: int, waited: float):
+        with self.lock:
+            self.bytes[priority] += n
+            self.waited[priority] += waited
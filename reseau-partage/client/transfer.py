@@ -4,165 +4,2039 @@ Gestion des transferts de fichiers P2P
 
 import socket
 import os
+import errno
+import hashlib
 import threading
+import time
+import uuid
+import select
+import queue
 import zipfile
-import tempfile
-from typing import Dict
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
 import sys
-from tqdm import tqdm
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from shared.utils import calculate_checksum, format_size
-from shared.protocol import BUFFER_SIZE, CHUNK_SIZE
+from client.chunks import (STORE_DIR, DEDUP_MIN_SIZE, DEDUP_WINDOW, CDC_MAX_SIZE, CHUNK_ENTRY, CHUNK_ANNOUNCE,
+                           CHUNK_DATA, CHUNK_END, CHUNK_NEEDED, CHUNK_PRESENT, CHUNKS_STREAM, ChunkStore, iter_chunks,
+                           iter_chunk_data)
+from client.compression import CODEC, COMPRESS_MIN_SIZE, CompressionStage, FrameReader, choose_level
+from client.fanout import FanOutReader, FANOUT_PARALLEL
+from client.hashcache import HASH_CACHE_FILE, HashCache
+from client.journal import PART_SUFFIX, JOURNAL_SUFFIX, TransferJournal, format_ranges, parse_ranges
+from client.progress import Progress, ProgressMonitor
+from client.receiver import RECEIVE_BACKLOG, MAX_ACTIVE_RECEIVES, MAX_QUEUED_RECEIVES, ReceiveServer
+from client.sessions import SessionPool
+from client.shaping import PRIORITY_NORMAL, Flow, TrafficShaper, TransferCancelled, classify
+from client.tuning import LINKS_FILE, LinkProbe, LinkTuner, corked, set_nodelay
+from client.writer import (WRITE_BEHIND_BUFFERS, WRITE_BEHIND_MIN_SIZE, FSYNC_NONE, FSYNC_CHECKPOINT, FSYNC_FULL,
+                           FSYNC_POLICIES, CACHE_DROP, CACHE_AUTO, CACHE_POLICIES, DROP_CACHE_MIN_SIZE, DiskWriter,
+                           write_at, reserve_space)
+from shared.utils import format_size
+from shared.hashing import RangeLeafHasher, checksum_hasher, chunk_count, chunk_hashes, parse_checksum
+from shared.protocol import (BUFFER_SIZE, CHUNK_SIZE, MAX_STREAMS, MIN_MULTI_STREAM_SIZE, MAX_HEADER_SIZE,
+                             TRANSFER_RETRIES, RETRY_DELAY, RELAY_DEGREE,
+                             TRANSFER_FILE, TRANSFER_FOLDER, TRANSFER_MULTI, TRANSFER_RANGE, TRANSFER_TREE,
+                             TREE_ENTRY, ENTRY_DIR, ENTRY_FILE, ENTRY_CHUNKS, ENTRY_END,
+                             encode_transfer_header, parse_transfer_header, encode_tree_entry,
+                             PROTOCOL_VERSION, P2P_MAGIC, P2P_FRAME, P2P_OFFSET, P2P_TRANSFER, P2P_DATA, P2P_ACK,
+                             P2P_ERROR, P2P_DONE, P2P_COMPRESSED, CAP_SESSION, CAP_COMPRESS,
+                             ERROR_BUSY, ERROR_CORRUPT, ERROR_VERSION, VersionMismatch, TransferFrame, encode_frame, parse_frame_header,
+                             encode_data_header, encode_ack, decode_ack, encode_error, decode_error)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Erreurs indiquant que le noyau ne supporte pas sendfile/splice pour ces descripteurs
+ZERO_COPY_ERRNOS = {errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP, errno.EXDEV}
+
+# Nombre de transferts conservés dans l'historique des statistiques
+HISTORY_SIZE = 100
+
+# Octets reçus entre deux synchronisations du journal de reprise
+JOURNAL_INTERVAL = 64 * CHUNK_SIZE
+
+# Attente de la fin d'un en-tête sans saut de ligne (anciens clients)
+LEGACY_HEADER_TIMEOUT = 0.5
+
+# Octets envoyés juste après l'annonce v2, sans attendre l'ACK du destinataire
+PIPELINE_WINDOW = 8 * CHUNK_SIZE
+
+# Attente de la fin de la fenêtre d'un envoi v2 refusé (secondes)
+REJECT_DRAIN_TIMEOUT = 5
+
+# Blocs en attente d'envoi par voisin d'une diffusion relayée
+RELAY_QUEUE_BLOCKS = 16
+
+# Attente max d'une place dans la file d'un voisin avant de l'abandonner (secondes)
+RELAY_STALL_TIMEOUT = 10
+
+# Détection des connexions mortes (secondes)
+KEEPALIVE_IDLE = 15
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 4
+
+
+# Réponse finale d'un destinataire dont le checksum ne correspond pas
+CHECKSUM_MISMATCH = b'CORRUPT'
+
+
+class ChecksumMismatch(Exception):
+    """Le fichier reçu ne correspond pas au checksum enregistré sur le serveur"""
+
+
+class TransferInterrupted(Exception):
+    """Transfert interrompu qui peut être repris"""
+
+
+class LegacyPeer(Exception):
+    """Le destinataire a répondu en v1 ou refusé la version du protocole"""
+
+
+class NoReply(TransferInterrupted):
+    """Connexion fermée sans réponse à l'annonce v2 (coupure ou destinataire v1)"""
+
+
+def enable_keepalive(sock: socket.socket):
+    """
+    Activer le keepalive TCP pour détecter rapidement une connexion coupée
+    
+    Args:
+        sock: Socket connectée
+    """
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (('TCP_KEEPIDLE', KEEPALIVE_IDLE),
+                          ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL),
+                          ('TCP_KEEPCNT', KEEPALIVE_COUNT),
+                          ('TCP_USER_TIMEOUT', (KEEPALIVE_IDLE + KEEPALIVE_INTERVAL * KEEPALIVE_COUNT) * 1000)):
+        if hasattr(socket, option):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+            except OSError:
+                pass
+
+
+def resume_key(filepath: str) -> str:
+    """
+    Identifiant de version d'un fichier pour la reprise
+    
+    Args:
+        filepath: Chemin du fichier
+    
+    Returns:
+        Empreinte du nom, de la taille et de la date de modification
+    """
+    stat = os.stat(filepath)
+    raw = f"{os.path.basename(filepath)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def walk_tree(root: str, prefix: str = ''):
+    """
+    Parcourir un dossier pour l'envoi en flux
+    
+    Args:
+        root: Dossier à parcourir
+        prefix: Chemin relatif de `root` (séparateur '/')
+    
+    Yields:
+        (ENTRY_DIR, chemin relatif, None, 0) ou (ENTRY_FILE, chemin relatif, chemin, taille)
+    """
+    with os.scandir(root) as entries:
+        entries = sorted(entries, key=lambda e: e.name)
+    
+    for entry in entries:
+        rel_path = f"{prefix}{entry.name}"
+        if entry.is_dir(follow_symlinks=False):
+            yield ENTRY_DIR, rel_path, None, 0
+            yield from walk_tree(entry.path, rel_path + '/')
+        elif entry.is_file():
+            yield ENTRY_FILE, rel_path, entry.path, entry.stat().st_size
+
+
+def safe_join(root: str, rel_path: str) -> str:
+    """
+    Résoudre un chemin relatif reçu sans sortir du dossier racine
+    
+    Args:
+        root: Dossier de destination
+        rel_path: Chemin relatif (séparateur '/')
+    
+    Returns:
+        Chemin local
+    """
+    parts = [part for part in rel_path.split('/') if part not in ('', '.')]
+    if not parts or any(part == '..' or '\\' in part or ':' in part for part in parts):
+        raise Exception(f"Chemin refusé: {rel_path}")
+    return os.path.join(root, *parts)
+
+
+def relay_groups(peers: List, degree: int) -> List[List]:
+    """
+    Répartir des pairs en sous-arbres de diffusion relayée
+    
+    Le premier pair de chaque groupe reçoit directement les données et
+    relaie vers le reste de son groupe (degree=1: chaîne).
+    
+    Args:
+        peers: Pairs à servir
+        degree: Nombre de voisins directs
+    
+    Returns:
+        Groupes contigus de tailles équilibrées
+    """
+    count = min(max(1, degree), len(peers))
+    groups = []
+    start = 0
+    for i in range(count):
+        end = start + (len(peers) - start) // (count - i)
+        groups.append(peers[start:end])
+        start = end
+    return groups
+
+
+def format_relay_peers(peers: List[Dict]) -> str:
+    """Encoder des pairs ({'name', 'ip_address', 'port'}) pour l'en-tête de relais"""
+    return ','.join(f"{p['name']}@{p['ip_address']}:{p['port']}" for p in peers)
+
+
+def parse_relay_peers(text: str) -> List[Dict]:
+    """Décoder la liste de pairs d'un en-tête de relais"""
+    peers = []
+    for item in text.split(','):
+        if item:
+            name, _, address = item.rpartition('@')
+            ip, _, port = address.rpartition(':')
+            peers.append({'name': name, 'ip_address': ip, 'port': int(port)})
+    return peers
+
+
+def format_relay_status(statuses: Dict[str, bool]) -> str:
+    """Encoder les statuts d'un sous-arbre (nom=ok|failed)"""
+    return ','.join(f"{name}={'ok' if ok else 'failed'}" for name, ok in statuses.items())
+
+
+def parse_relay_status(text: str) -> Dict[str, bool]:
+    """Décoder les statuts d'un sous-arbre"""
+    statuses = {}
+    for item in text.split(','):
+        if item:
+            name, _, status = item.rpartition('=')
+            statuses[name] = status == 'ok'
+    return statuses
+
+
+class RelayChild:
+    """
+    Voisin direct d'une diffusion relayée et le sous-arbre qu'il dessert
+    
+    Les blocs passent par une file bornée vidée par un thread d'envoi: un
+    voisin lent ne ralentit pas les autres. Un voisin dont la file reste
+    pleine plus de RELAY_STALL_TIMEOUT est abandonné.
+    """
+    
+    def __init__(self, peer: Dict, subtree: List[Dict]):
+        self.peer = peer
+        self.subtree = subtree
+        self.skipped: List[str] = []  # Voisins injoignables remplacés par le suivant
+        self.sock = None
+        self.alive = False
+        self.queue = queue.Queue(RELAY_QUEUE_BLOCKS)
+        self.writer: Optional[threading.Thread] = None
+    
+    def names(self) -> List[str]:
+        """Noms du voisin, de tout son sous-arbre et des voisins ignorés"""
+        return self.skipped + [self.peer['name']] + [p['name'] for p in self.subtree]
+    
+    def start(self):
+        """Démarrer l'envoi des blocs mis en file (thread séparé)"""
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+    
+    def send(self, data: bytes) -> bool:
+        """
+        Mettre un bloc en file
+        
+        Returns:
+            False si le voisin est abandonné (injoignable ou trop lent)
+        """
+        if not self.alive:
+            return False
+        try:
+            self.queue.put(data, timeout=RELAY_STALL_TIMEOUT)
+        except queue.Full:
+            self.abort(f"trop lent (file pleine depuis {RELAY_STALL_TIMEOUT}s)")
+        return self.alive
+    
+    def finish(self) -> bool:
+        """
+        Attendre l'envoi des blocs en file
+        
+        Returns:
+            True si le voisin a reçu tous les blocs
+        """
+        if self.writer is None:
+            return False
+        if self.send(None):
+            self.writer.join()
+        return self.alive
+    
+    def abort(self, reason: str = None):
+        """Abandonner le voisin (fermeture de la connexion, le thread d'envoi s'arrête)"""
+        if self.alive and reason:
+            print(f"\n[!] Relais vers {self.peer['name']} interrompu: {reason}")
+        self.alive = False
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)  # Débloque un envoi en cours
+            except OSError:
+                pass
+            self.sock.close()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass  # Le thread d'envoi voit alive=False au bloc suivant
+    
+    def _write(self):
+        while True:
+            data = self.queue.get()
+            if data is None or not self.alive:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                self.abort(e)
+                return
+
+
+@dataclass
+class TransferResult:
+    """Résultat d'un transfert (vrai si le transfert a réussi)"""
+    name: str
+    peer: str
+    direction: str  # send, receive
+    size: int = 0
+    transferred: int = 0
+    method: str = ''  # sendfile, copy, splice, recv_into
+    streams: int = 1
+    elapsed: float = 0.0
+    success: bool = False
+    compression: str = ''  # Codec et niveau de départ (zlib-1...), vide si non compressé
+    ratio: float = 1.0  # Octets sur le réseau / octets du fichier
+    cpu_time: float = 0.0  # Secondes de (dé)compression
+    priority: str = ''  # Classe de priorité (envois)
+    
+    def __bool__(self) -> bool:
+        return self.success
+    
+    @property
+    def throughput(self) -> float:
+        """Débit moyen en octets/seconde"""
+        return self.transferred / self.elapsed if self.elapsed > 0 else 0.0
+    
+    @property
+    def link_rate(self) -> float:
+        """Débit moyen sur le réseau (après compression) en octets/seconde"""
+        return self.throughput * self.ratio
+    
+    def add_compression(self, codec) -> 'TransferResult':
+        """Reporter les mesures d'un CompressionStage ou d'un FrameReader"""
+        if codec is not None:
+            self.compression = getattr(codec, 'name', CODEC)
+            self.ratio = codec.ratio
+            self.cpu_time = codec.cpu_time
+        return self
+    
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data['throughput'] = self.throughput
+        return data
+
+
+@dataclass
+class MultiStreamReceive:
+    """État côté réception d'un transfert multi-flux"""
+    part_path: str
+    journal: TransferJournal
+    remaining: int
+    pbar: Progress
+    received: int = 0
+    failed: bool = False
+    method: str = ''
+    algorithm: str = ''  # Algorithme de l'arbre de Merkle à vérifier
+    leaves: Dict[int, bytes] = None  # Feuilles calculées au vol par les flux
+    
+    def __post_init__(self):
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+
+def ranges_after(ranges: List[Tuple[int, int]], start: int) -> List[Tuple[int, int]]:
+    """
+    Parties des plages situées après `start`
+    
+    Args:
+        ranges: Plages (offset, longueur) croissantes
+        start: Position à partir de laquelle garder les octets
+    """
+    return [(max(offset, start), offset + length - max(offset, start))
+            for offset, length in ranges if offset + length > start]
+
+
+def split_ranges(filesize: int, streams: int, ranges: List[Tuple[int, int]] = None) -> List[Tuple[int, int]]:
+    """
+    Découper des plages (offset, longueur) en morceaux alignés sur CHUNK_SIZE
+    
+    Args:
+        filesize: Taille du fichier
+        streams: Nombre de morceaux souhaités
+        ranges: Plages à découper (tout le fichier par défaut)
+        
+    Returns:
+        Liste de plages couvrant les plages demandées
+    """
+    if ranges is None:
+        ranges = [(0, filesize)]
+    total = sum(length for _, length in ranges)
+    chunks = max(1, -(-total // CHUNK_SIZE))
+    streams = max(1, min(streams, chunks))
+    per_stream = -(-chunks // streams) * CHUNK_SIZE
+    
+    pieces = []
+    for offset, length in ranges:
+        end = offset + length
+        while offset < end:
+            piece = min(per_stream, end - offset)
+            pieces.append((offset, piece))
+            offset += piece
+    return pieces
 
 
 class FileTransfer:
     """Gestionnaire de transferts de fichiers"""
     
-    def __init__(self, storage_dir: str, port: int = 5001, on_receive_callback=None):
+    def __init__(self, storage_dir: str, port: int = 5001, on_receive_callback=None,
+                 zero_copy: bool = True, max_streams: int = MAX_STREAMS, dedup: bool = False,
+                 checksum_lookup=None, peer_lookup=None, compress: bool = True, backlog: int = RECEIVE_BACKLOG,
+                 max_active: int = MAX_ACTIVE_RECEIVES, max_queued: int = MAX_QUEUED_RECEIVES,
+                 rate_limit: float = 0, write_behind: int = WRITE_BEHIND_BUFFERS,
+                 fsync: str = FSYNC_CHECKPOINT, cache: str = CACHE_AUTO, headless: bool = False):
+        """
+        Initialiser le gestionnaire
+        
+        Args:
+            storage_dir: Dossier de stockage des fichiers reçus
+            port: Port pour recevoir les fichiers
+            on_receive_callback: Fonction à appeler lors de la réception (filename, sender_ip, is_folder)
+            zero_copy: Utiliser sendfile/splice quand le système le permet
+            max_streams: Nombre max de flux acceptés pour un même fichier
+            dedup: Annoncer les blocs avant l'envoi pour ne transmettre que les manquants (renvois de
+                   fichiers modifiés; les autres envois gardent sendfile, la reprise et le protocole v2)
+            checksum_lookup: Fonction (file_id) -> checksum enregistré, pour vérifier les fichiers reçus
+            peer_lookup: Fonction (nom) -> infos du PC dans l'annuaire, pour ne relayer que vers des PC connus
+            compress: Compresser les blocs compressibles quand le lien est plus lent que le processeur
+            backlog: File d'attente du noyau pour les connexions entrantes
+            max_active: Réceptions traitées en parallèle
+            max_queued: Connexions acceptées en attente d'une réception libre
+            rate_limit: Débit montant max de tous les envois en octets/s (0: illimité)
+            write_behind: Buffers en attente d'écriture par réception (0: écriture sur le thread réseau)
+            fsync: Synchronisation disque des réceptions (voir writer.FSYNC_POLICIES)
+            cache: Cache des fichiers reçus (voir writer.CACHE_POLICIES)
+            headless: Ne pas afficher la progression (mesures disponibles par get_progress)
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Politique fsync inconnue: {fsync}")
+        if cache not in CACHE_POLICIES:
+            raise ValueError(f"Politique de cache inconnue: {cache}")
+        self.storage_dir = storage_dir
+        self.port = port
+        self.receiver = ReceiveServer(port, self._handle_connection, self._bypasses_queue,
+                                      backlog, max_active, max_queued)
+        self.running = False
+        self.on_receive_callback = on_receive_callback
+        self.zero_copy = zero_copy
+        self.max_streams = max(1, max_streams)
+        self.dedup = dedup
+        self.checksum_lookup = checksum_lookup
+        self.peer_lookup = peer_lookup
+        self.compress = compress
+        self.write_behind = max(0, write_behind)
+        self.fsync = fsync
+        self.cache = cache
+        
+        # Transferts multi-flux en cours de réception (par identifiant)
+        self._multi_receives: Dict[str, MultiStreamReceive] = {}
+        self._multi_lock = threading.Lock()
+        
+        # Fichiers .part en cours d'écriture
+        self._active_parts = set()
+        self._parts_lock = threading.Lock()
+        
+        # PC qui ne comprennent que le protocole v1 (adresse, port)
+        self._legacy_peers = set()
+        
+        # Statistiques des derniers transferts
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._history_lock = threading.Lock()
+        
+        # Progression des transferts en cours
+        self.progress = ProgressMonitor(headless)
+        
+        # Buffers de réception réutilisables (un par thread)
+        self._local = threading.local()
+        
+        # Créer le dossier de stockage
+        os.makedirs(storage_dir, exist_ok=True)
+        
+        # Blocs des fichiers reçus (déduplication entre fichiers)
+        self.chunk_store = ChunkStore(os.path.join(storage_dir, STORE_DIR))
+        
+        # Checksums déjà calculés (envois) ou vérifiés (réceptions)
+        self.hash_cache = HashCache(os.path.join(storage_dir, HASH_CACHE_FILE))
+        
+        # Connexions gardées ouvertes entre deux envois vers un même PC
+        self.sessions = SessionPool(on_connect=enable_keepalive)
+        
+        # Limites de débit et priorités des envois
+        self.shaper = TrafficShaper(rate_limit)
+        
+        # Taille des blocs et tampons d'envoi mesurés par PC
+        self.tuner = LinkTuner(os.path.join(storage_dir, LINKS_FILE))
+    
+    def get_stats(self) -> List[Dict]:
+        """
+        Obtenir les statistiques des derniers transferts
+        
+        Returns:
+            Liste des transferts (du plus ancien au plus récent)
+        """
+        with self._history_lock:
+            return [result.to_dict() for result in self.history]
+    
+    def get_progress(self) -> List[Dict]:
+        """
+        Obtenir la progression des transferts en cours
+        
+        Returns:
+            Un dictionnaire par transfert: octets, débits instantané et moyen,
+            temps bloqué (voir progress.Progress.snapshot)
+        """
+        return self.progress.snapshot()
+    
+    def _record(self, result: TransferResult) -> TransferResult:
+        """Ajouter un transfert à l'historique"""
+        with self._history_lock:
+            self.history.append(result)
+        return result
+    
+    def _get_buffer(self, size: int = CHUNK_SIZE) -> memoryview:
+        """Buffer de `size` octets réutilisé par le thread courant (agrandi si besoin)"""
+        view = getattr(self._local, 'buffer', None)
+        if view is None or len(view) < size:
+            view = memoryview(bytearray(max(size, CHUNK_SIZE)))
+            self._local.buffer = view
+        return view[:size]
+    
+    # ========================================
+    # CHEMINS DE DONNÉES (zero-copy + repli)
+    # ========================================
+    
+    def _send_range(self, sock: socket.socket, f, offset: int, count: int, pbar=None,
+                    stage: CompressionStage = None, flow: Flow = None, link: LinkProbe = None) -> str:
+        """
+        Envoyer `count` octets d'un fichier à partir de `offset`
+        
+        Utilise os.sendfile (noyau -> socket sans copie) et se replie sur
+        la boucle lecture/sendall si le système ne le permet pas. Avec un
+        étage de compression, les blocs sont envoyés en trames (jusqu'à ce
+        que l'étage abandonne la compression). Avec un
+        flux (TrafficShaper), chaque bloc envoyé est décompté des limites.
+        Avec une mesure du lien (LinkTuner), la taille des blocs suit ses
+        réglages.
+        
+        Returns:
+            Méthode utilisée ('sendfile', 'copy' ou le codec)
+        """
+        if stage is not None and not stage.passthrough:
+            return self._send_frames(sock, f, offset, count, pbar, stage, flow, link)
+        if stage is not None:
+            stage.passed(count)
+        
+        if self.zero_copy and hasattr(os, 'sendfile') and sock.gettimeout() is None:
+            sent = self._sendfile_range(sock, f, offset, count, pbar, flow, link)
+            if sent == count:
+                return 'sendfile'
+            offset += sent
+            count -= sent
+        
+        f.seek(offset)
+        sent = 0
+        while sent < count:
+            buffer = self._get_buffer(link.chunk_size if link is not None else CHUNK_SIZE)
+            n = f.readinto(buffer[:min(len(buffer), count - sent)])
+            if not n:
+                raise Exception("Fichier tronqué pendant l'envoi")
+            sock.sendall(buffer[:n])
+            sent += n
+            if pbar is not None:
+                pbar.update(n)
+            if flow is not None:
+                flow.throttle(n)
+            if link is not None:
+                link.sent(n)
+        return 'copy'
+    
+    def _send_frames(self, sock: socket.socket, f, offset: int, count: int, pbar,
+                     stage: CompressionStage, flow: Flow = None, link: LinkProbe = None) -> str:
+        """
+        Envoyer une plage en trames (compressées si le bloc s'y prête)
+        
+        Une trame ne dépasse pas CHUNK_SIZE octets décompressés (limite du
+        destinataire), même si le lien permettrait de plus gros blocs. Si
+        l'étage abandonne la compression (processeur saturé), la suite du
+        flux part brute par _send_range.
+        
+        Returns:
+            Méthode utilisée (codec, ou celle de _send_range après l'abandon)
+        """
+        f.seek(offset)
+        sent = 0
+        while sent < count:
+            if not stage.level:
+                sock.sendall(stage.end_frames())
+                return self._send_range(sock, f, offset + sent, count - sent, pbar, stage, flow, link)
+            buffer = self._get_buffer(min(link.chunk_size, CHUNK_SIZE) if link is not None else CHUNK_SIZE)
+            n = f.readinto(buffer[:min(len(buffer), count - sent)])
+            if not n:
+                raise Exception("Fichier tronqué pendant l'envoi")
+            frame = stage.encode(buffer[:n])
+            sock.sendall(frame)
+            sent += n
+            if pbar is not None:
+                pbar.update(n)
+            if flow is not None:
+                flow.throttle(len(frame))  # Octets sur le réseau
+            if link is not None:
+                link.sent(len(frame))
+        return CODEC
+    
+    def _sendfile_range(self, sock: socket.socket, f, offset: int, count: int, pbar=None,
+                        flow: Flow = None, link: LinkProbe = None) -> int:
+        """
+        Boucle os.sendfile
+        
+        Returns:
+            Nombre d'octets envoyés avant la fin ou l'abandon du zero-copy
+        """
+        sock_fd = sock.fileno()
+        file_fd = f.fileno()
+        sent = 0
+        while sent < count:
+            block = link.chunk_size if link is not None else CHUNK_SIZE
+            try:
+                n = os.sendfile(sock_fd, file_fd, offset + sent, min(block, count - sent))
+            except OSError as e:
+                if e.errno in ZERO_COPY_ERRNOS:
+                    return sent
+                raise
+            if n == 0:
+                raise Exception("Fichier tronqué pendant l'envoi")
+            sent += n
+            if pbar is not None:
+                pbar.update(n)
+            if flow is not None:
+                flow.throttle(n)
+            if link is not None:
+                link.sent(n)
+        return sent
+    
+    def _recv_range(self, sock: socket.socket, f, offset: int, count: int, pbar=None,
+                    digest=None, reader: FrameReader = None) -> Tuple[int, str]:
+        """
+        Recevoir `count` octets et les écrire dans `f` à partir de `offset`
+        
+        Utilise os.splice (socket -> pipe -> fichier dans le noyau) et se
+        replie sur recv_into avec un buffer réutilisable. Si `digest` est
+        fourni, les octets passent par le buffer pour être hachés au vol.
+        Avec `reader`, les octets arrivent en trames à décompresser, puis
+        bruts si l'expéditeur abandonne la compression.
+        
+        Returns:
+            (octets reçus, méthode utilisée ('splice', 'recv_into' ou le codec))
+        """
+        received = 0
+        with self._disk_writer(f, count) as writer:
+            if reader is not None:
+                while received < count and not reader.raw:
+                    try:
+                        data = reader.read(min(CHUNK_SIZE, count - received))
+                    except ConnectionError:
+                        break
+                    if digest is not None:
+                        digest.update(data)
+                    writer.write(data, offset + received)
+                    received += len(data)
+                    if pbar is not None:
+                        pbar.update(len(data))
+                if received == count or not reader.raw:
+                    return received, CODEC
+                reader.passed(count - received)  # La suite arrive brute
+            
+            if self.zero_copy and hasattr(os, 'splice') and sock.gettimeout() is None and digest is None:
+                n, finished = self._splice_range(sock, f, offset + received, count - received, pbar)
+                received += n
+                if finished:
+                    return received, 'splice'
+            
+            while received < count:
+                buffer = writer.buffer()
+                n = sock.recv_into(buffer, min(len(buffer), count - received))
+                if not n:
+                    writer.release(buffer)
+                    break
+                if digest is not None:
+                    digest.update(buffer[:n])
+                writer.write(buffer[:n], offset + received, buffer)
+                received += n
+                if pbar is not None:
+                    pbar.update(n)
+            return received, 'recv_into'
+    
+    def _splice_range(self, sock: socket.socket, f, offset: int, count: int, pbar=None) -> Tuple[int, bool]:
+        """
+        Boucle os.splice via un pipe intermédiaire
+        
+        Returns:
+            (octets reçus, True si terminé ou fin de connexion / False pour se replier)
+        """
+        pipe_r, pipe_w = os.pipe()
+        try:
+            if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+                try:
+                    fcntl.fcntl(pipe_w, fcntl.F_SETPIPE_SZ, CHUNK_SIZE)
+                except OSError:
+                    pass  # Taille par défaut du pipe
+            
+            sock_fd = sock.fileno()
+            file_fd = f.fileno()
+            received = 0
+            while received < count:
+                try:
+                    n = os.splice(sock_fd, pipe_w, min(CHUNK_SIZE, count - received))
+                except OSError as e:
+                    if e.errno in ZERO_COPY_ERRNOS:
+                        return received, False
+                    raise
+                if n == 0:
+                    return received, True  # Connexion fermée
+                
+                pending = n
+                while pending:
+                    try:
+                        written = os.splice(pipe_r, file_fd, pending,
+                                            offset_dst=offset + received)
+                    except OSError as e:
+                        if e.errno not in ZERO_COPY_ERRNOS:
+                            raise
+                        # Vider le pipe à la main avant de se replier
+                        while pending:
+                            data = os.read(pipe_r, pending)
+                            write_at(f, data, offset + received)
+                            received += len(data)
+                            pending -= len(data)
+                        if pbar is not None:
+                            pbar.update(n)
+                        return received, False
+                    received += written
+                    pending -= written
+                if pbar is not None:
+                    pbar.update(n)
+            return received, True
+        finally:
+            os.close(pipe_r)
+            os.close(pipe_w)
+    
+    def _disk_writer(self, f, count: int) -> DiskWriter:
+        """
+        Écritures d'une plage de `count` octets reçue dans `f`
+        
+        Les grandes plages passent par un thread d'écriture; les pages des
+        gros fichiers sont retirées du cache selon la politique choisie.
+        """
+        drop = self.cache == CACHE_DROP or (self.cache == CACHE_AUTO and
+                                            os.fstat(f.fileno()).st_size >= DROP_CACHE_MIN_SIZE)
+        buffers = self.write_behind if count >= WRITE_BEHIND_MIN_SIZE else 0
+        return DiskWriter(f, buffers, drop, scratch=None if buffers else self._get_buffer())
+    
+    def _finalize(self, part_path: str, filepath: str):
+        """
+        Remplacer le fichier final par le .part terminé (renommage atomique)
+        
+        Avec la politique FSYNC_FULL, le contenu puis le renommage sont
+        synchronisés sur disque.
+        """
+        if self.fsync == FSYNC_FULL:
+            fd = os.open(part_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.replace(part_path, filepath)
+        if self.fsync == FSYNC_FULL and hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(os.path.dirname(filepath) or '.', os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass  # Système de fichiers sans synchronisation des dossiers
+            finally:
+                os.close(fd)
+    
+    def start_receiver(self):
+        """Démarrer le serveur de réception en arrière-plan"""
+        try:
+            self.receiver.start()
+        except OSError as e:
+            print(f"[X] Erreur serveur réception: {e}")
+            return
+        self.port = self.receiver.port
+        self.running = True
+        print(f"[OK] Serveur de réception démarré sur le port {self.port} "
+              f"({self.receiver.max_active} réceptions simultanées)")
+    
+    def stop_receiver(self):
+        """Arrêter le serveur de réception (les réceptions en cours sont interrompues)"""
+        self.running = False
+        self.receiver.stop()
+        self.sessions.close_all()
+    
+    def _handle_connection(self, client_socket: socket.socket, address) -> bool:
+        """Traiter une connexion confiée par le serveur de réception (True: session à garder)"""
+        enable_keepalive(client_socket)
+        return self._handle_receive(client_socket, address)
+    
+    @staticmethod
+    def _bypasses_queue(peek: bytes) -> bool:
+        """
+        Vrai pour les flux de données d'un transfert multi-flux
+        
+        Leur connexion de contrôle occupe déjà une place: les mettre en
+        file pourrait la bloquer indéfiniment.
+        
+        Args:
+            peek: Début de l'en-tête reçu
+        """
+        if peek.startswith(P2P_MAGIC):
+            return False
+        fields = peek.split(b'\n', 1)[0].split(b'|')
+        return len(fields) > 2 and fields[2] == TRANSFER_RANGE.encode('utf-8')
+    
+    def _handle_receive(self, client_socket: socket.socket, address) -> bool:
+        """
+        Gérer la réception d'un fichier ou dossier
+        
+        Args:
+            client_socket: Socket du client
+            address: Adresse du client
+        
+        Returns:
+            True si la connexion est une session qui peut recevoir un autre transfert
+            (l'appelant ferme la connexion sinon)
+        """
+        try:
+            # Trames binaires (v2) ou en-tête texte terminé par un saut de ligne (v1)
+            if client_socket.recv(len(P2P_MAGIC), socket.MSG_PEEK | socket.MSG_WAITALL) == P2P_MAGIC:
+                return self._handle_framed(client_socket, address)
+            
+            # Recevoir les métadonnées (première ligne)
+            header = parse_transfer_header(self._recv_header(client_socket))
+            filename = os.path.basename(header['filename'])
+            filesize = header['filesize']
+            options = header['options']
+            is_folder = header['kind'] == TRANSFER_FOLDER
+            session = options.get('session') == '1'
+            
+            if options.get('chunks', CHUNKS_STREAM) != CHUNKS_STREAM:
+                raise Exception("Format d'annonce des blocs non supporté")
+            if header['kind'] == TRANSFER_MULTI:
+                self._handle_multi(client_socket, address, filename, filesize, options)
+                return False
+            if header['kind'] == TRANSFER_RANGE:
+                self._handle_range(client_socket, options)
+                return False
+            if header['kind'] == TRANSFER_TREE:
+                return self._handle_tree(client_socket, address, filename, filesize, options) and session
+            if 'chunks' in options:
+                return self._handle_chunked(client_socket, address, filename, filesize, options) and session
+            if 'relay' in options:
+                self._handle_relay(client_socket, address, filename, filesize, options)
+                return False
+            
+            # Le fichier est écrit dans un .part puis renommé une fois complet
+            filepath = os.path.join(self.storage_dir, filename)
+            part_path = filepath + PART_SUFFIX
+            if not self._claim_part(part_path):
+                client_socket.send(b'BUSY')
+                return False
+            
+            try:
+                # Checksum enregistré par l'expéditeur, vérifié au fil de la réception
+                expected_checksum = self._registered_checksum(options)
+                digest = checksum_hasher(expected_checksum) if expected_checksum else None
+                reader = self._frame_reader(client_socket, options)
+                
+                # Reprise: plages manquantes d'après le journal du .part
+                resume = options.get('resume')
+                journal = TransferJournal.open(part_path, resume, filesize) if resume else None
+                ranges = journal.missing() if journal else [(0, filesize)]
+                expected = sum(length for _, length in ranges)
+                
+                # Envoyer ACK (avec les plages attendues en cas de reprise)
+                if journal:
+                    client_socket.send(f"OK|{format_ranges(ranges)}".encode('utf-8'))
+                else:
+                    client_socket.send(b'OK')
+                
+                # Recevoir le fichier
+                result = TransferResult(name=filename, peer=address[0], direction='receive', size=filesize)
+                
+                if is_folder:
+                    print(f"\nReception dossier: {filename.replace('.zip', '')} de {address[0]}")
+                else:
+                    print(f"\nReception: {filename} de {address[0]}")
+                if expected < filesize:
+                    print(f"  Reprise: {format_size(filesize - expected)} déjà reçus")
+                
+                # Progression (ligne commune à tous les transferts)
+                start = time.monotonic()
+                with self._open_part(part_path, filesize, preallocate=True) as f:
+                    with self.progress.track(filename, address[0], 'receive', filesize,
+                                             filesize - expected) as pbar:
+                        received, result.method = self._receive_ranges(client_socket, f, ranges, journal,
+                                                                       pbar, digest, reader=reader)
+                    if received == expected:
+                        f.truncate(filesize)
+                        if digest is not None:
+                            self._hash_file(f, digest, ranges[-1][0] + ranges[-1][1] if ranges else 0, filesize)
+                result.elapsed = time.monotonic() - start
+                result.transferred = received
+                result.add_compression(reader)
+                
+                if received < expected:
+                    self._record(result)
+                    if not journal:
+                        os.remove(part_path)
+                    raise Exception(f"Connexion interrompue ({format_size(filesize - expected + received)}"
+                                    f"/{format_size(filesize)})")
+                
+                if not self._verify_checksum(digest, expected_checksum, part_path, journal):
+                    self._record(result)
+                    client_socket.sendall(CHECKSUM_MISMATCH)
+                    return False
+                
+                self._finalize(part_path, filepath)
+                self._remember_checksum(filepath, expected_checksum)
+                if journal:
+                    journal.remove()
+                    client_socket.sendall(b'DONE')
+            finally:
+                self._release_part(part_path)
+            
+            result.success = True
+            self._record(result)
+            
+            # Si c'est un dossier, décompresser
+            if is_folder:
+                print(f"Decompression...")
+                folder_name = filename.replace('.zip', '')
+                extract_path = os.path.join(self.storage_dir, folder_name)
+                
+                with zipfile.ZipFile(filepath, 'r') as zip_ref:
+                    zip_ref.extractall(extract_path)
+                
+                # Supprimer le zip
+                os.remove(filepath)
+                print(f"[OK] Dossier reçu: {extract_path}")
+            else:
+                print(f"[OK] Fichier reçu: {filepath}")
+            
+            # Appeler le callback de notification
+            if self.on_receive_callback:
+                display_name = filename.replace('.zip', '') if is_folder else filename
+                self.on_receive_callback(display_name, address[0], is_folder)
+            
+            # La confirmation DONE n'est envoyée qu'avec un journal de reprise
+            return session and journal is not None
+        
+        except Exception as e:
+            print(f"\n[X] Erreur réception: {e}")
+            return False
+    
+    def _handle_framed(self, sock: socket.socket, address) -> bool:
+        """
+        Recevoir un fichier annoncé en trames v2
+        
+        L'expéditeur envoie les premiers octets (fenêtre de l'annonce) sans
+        attendre l'ACK: ils sont reçus d'abord, puis les plages manquantes
+        au-delà de la fenêtre. Le checksum est celui enregistré sur le
+        serveur pour le file_id annoncé (celui de l'annonce à défaut).
+        
+        Args:
+            sock: Socket de l'expéditeur (en-tête encore non lu)
+            address: Adresse de l'expéditeur
+        
+        Returns:
+            True si la connexion est une session qui peut recevoir un autre transfert
+        """
+        try:
+            frame_type, _, payload = self._recv_frame(sock)
+        except VersionMismatch as e:
+            sock.sendall(encode_error(ERROR_VERSION, str(e)))
+            raise
+        if frame_type != P2P_TRANSFER:
+            raise Exception(f"Trame inattendue: {frame_type}")
+        announce = TransferFrame.decode(payload)
+        filename = os.path.basename(announce.filename)
+        filesize = announce.filesize
+        window = min(announce.window, filesize)
+        
+        filepath = os.path.join(self.storage_dir, filename)
+        part_path = filepath + PART_SUFFIX
+        if not self._claim_part(part_path):
+            self._reject_framed(sock, ERROR_BUSY, "réception précédente encore en cours", window)
+            return False
+        
+        try:
+            expected_checksum = self._announced_checksum(announce)
+            digest = checksum_hasher(expected_checksum) if expected_checksum else None
+            reader = FrameReader(sock) if announce.caps & CAP_COMPRESS else None
+            
+            # Reprise: plages manquantes d'après le journal du .part
+            journal = TransferJournal.open(part_path, announce.resume, filesize) if announce.resume else None
+            missing = journal.missing() if journal else [(0, filesize)]
+            sock.sendall(encode_ack(missing))
+            
+            # La fenêtre arrive en premier, déjà présente ou non
+            ranges = ([(0, window)] if window else []) + ranges_after(missing, window)
+            expected = sum(length for _, length in ranges)
+            
+            result = TransferResult(name=filename, peer=address[0], direction='receive', size=filesize)
+            print(f"\nReception: {filename} de {address[0]}")
+            if sum(length for _, length in missing) < filesize:
+                print(f"  Reprise: {format_size(filesize - sum(length for _, length in missing))} déjà reçus")
+            
+            start = time.monotonic()
+            with self._open_part(part_path, filesize, preallocate=True) as f:
+                with self.progress.track(filename, address[0], 'receive', filesize, filesize - expected) as pbar:
+                    received, result.method = self._receive_ranges(sock, f, ranges, journal, pbar, digest,
+                                                                   reader=reader, framed=True)
+                if received == expected:
+                    f.truncate(filesize)
+                    if digest is not None:
+                        self._hash_file(f, digest, ranges[-1][0] + ranges[-1][1] if ranges else 0, filesize)
+            result.elapsed = time.monotonic() - start
+            result.transferred = received
+            result.add_compression(reader)
+            
+            if received < expected:
+                self._record(result)
+                if not journal:
+                    os.remove(part_path)
+                raise Exception(f"Connexion interrompue ({format_size(filesize - expected + received)}"
+                                f"/{format_size(filesize)})")
+            
+            if not self._verify_checksum(digest, expected_checksum, part_path, journal):
+                self._record(result)
+                sock.sendall(encode_error(ERROR_CORRUPT, "checksum invalide"))
+                return False
+            
+            self._finalize(part_path, filepath)
+            self._remember_checksum(filepath, expected_checksum)
+            if journal:
+                journal.remove()
+            sock.sendall(encode_frame(P2P_DONE))
+        finally:
+            self._release_part(part_path)
+        
+        result.success = True
+        self._record(result)
+        print(f"[OK] Fichier reçu: {filepath}")
+        
+        if self.on_receive_callback:
+            self.on_receive_callback(filename, address[0], False)
+        return bool(announce.caps & CAP_SESSION)
+    
+    def _announced_checksum(self, announce: TransferFrame) -> Optional[str]:
+        """
+        Checksum à vérifier pour un fichier annoncé en v2
+        
+        Celui enregistré sur le serveur dès que le fichier a un file_id: le
+        checksum de l'annonce ne sert que si le serveur n'en fournit pas.
+        """
+        registered = self._registered_checksum({'file_id': announce.file_id or None})
+        if registered or not announce.checksum:
+            return registered
+        try:
+            parse_checksum(announce.checksum)
+        except Exception:
+            return None
+        return announce.checksum
+    
+    def _reject_framed(self, sock: socket.socket, code: int, message: str, window: int):
+        """
+        Refuser un transfert v2
+        
+        La fenêtre déjà en route est lue et ignorée: fermer la connexion
+        avec des octets non lus la couperait (RST) avant que l'expéditeur
+        ait lu l'erreur.
+        """
+        sock.sendall(encode_error(code, message))
+        try:
+            sock.shutdown(socket.SHUT_WR)
+            sock.settimeout(REJECT_DRAIN_TIMEOUT)
+            self._recv_until_close(sock, window + P2P_FRAME.size + P2P_OFFSET.size)
+        except OSError:
+            pass
+    
+    def _handle_tree(self, sock: socket.socket, address, folder_name: str, total_size: int, options: Dict):
+        """
+        Recevoir un dossier envoyé en flux d'entrées
+        
+        Chaque fichier est écrit à sa place dès que ses octets arrivent,
+        sans archive intermédiaire. Pour les fichiers envoyés bloc par bloc
+        (ENTRY_CHUNKS), seuls les blocs absents du magasin sont transmis.
+        
+        Args:
+            sock: Socket de l'expéditeur
+            address: Adresse de l'expéditeur
+            folder_name: Nom du dossier
+            total_size: Taille totale annoncée (0 si inconnue)
+            options: Options de l'en-tête
+        
+        Returns:
+            True si le dossier a été reçu en entier
+        """
+        # Ni '.', '..' ou vide, ni dossier caché (magasin de blocs, bases du client)
+        if folder_name.startswith('.'):
+            raise Exception(f"Nom de dossier refusé: {folder_name!r}")
+        root = safe_join(self.storage_dir, folder_name)
+        os.makedirs(root, exist_ok=True)
+        
+        reader = self._frame_reader(sock, options)
+        sock.send(b'OK')
+        
+        print(f"\nReception dossier: {folder_name} de {address[0]}")
+        result = TransferResult(name=folder_name, peer=address[0], direction='receive', size=total_size)
+        files = 0
+        start = time.monotonic()
+        
+        try:
+            with self.progress.track(folder_name, address[0], 'receive', total_size) as pbar:
+                while True:
+                    entry_type, path_length, size = TREE_ENTRY.unpack(self._recv_exact(sock, TREE_ENTRY.size))
+                    if entry_type == ENTRY_END:
+                        break
+                    
+                    target = safe_join(root, self._recv_exact(sock, path_length).decode('utf-8'))
+                    if entry_type == ENTRY_DIR:
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    if entry_type not in (ENTRY_FILE, ENTRY_CHUNKS):
+                        raise Exception(f"Entrée de dossier inconnue: {entry_type!r}")
+                    
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    part_path = target + PART_SUFFIX
+                    with open(part_path, 'wb', buffering=0) as f:
+                        reserve_space(f, size)
+                        if entry_type == ENTRY_CHUNKS:
+                            try:
+                                received = self._recv_chunk_stream(sock, f, size, pbar, reader=reader)
+                            except Exception:
+                                f.close()
+                                os.remove(part_path)
+                                raise
+                            method = 'dedup'
+                        else:
+                            received, method = self._recv_range(sock, f, 0, size, pbar, reader=reader)
+                            if received < size:
+                                os.remove(part_path)
+                                raise Exception(f"Connexion interrompue pendant {target}")
+                    result.transferred += received
+                    
+                    self._finalize(part_path, target)
+                    result.method = result.method or method
+                    files += 1
+        finally:
+            result.elapsed = time.monotonic() - start
+            result.add_compression(reader)
+            self._record(result)
+        
+        result.success = True
+        sock.sendall(b'DONE')
+        print(f"[OK] Dossier reçu: {root} ({files} fichiers)")
+        
+        if self.on_receive_callback:
+            self.on_receive_callback(folder_name, address[0], True)
+        return True
+    
+    def _handle_chunked(self, sock: socket.socket, address, filename: str, filesize: int, options: Dict):
+        """
+        Recevoir un fichier annoncé bloc par bloc
+        
+        Seuls les blocs absents du magasin et de la version précédente du
+        fichier (mode delta) sont demandés à l'expéditeur, les autres sont
+        recopiés localement. Les blocs reçus sont ajoutés au magasin au fur
+        et à mesure: après une coupure, la reprise ne redemande que ceux
+        qui manquent encore.
+        
+        Args:
+            sock: Socket de l'expéditeur
+            address: Adresse de l'expéditeur
+            filename: Nom du fichier
+            filesize: Taille du fichier
+            options: Options de l'en-tête
+        
+        Returns:
+            True si le fichier a été reçu et vérifié
+        """
+        filepath = os.path.join(self.storage_dir, filename)
+        part_path = filepath + PART_SUFFIX
+        
+        if not self._claim_part(part_path):
+            sock.send(b'BUSY')
+            return False
+        
+        try:
+            # Signatures de la version déjà présente (mode delta)
+            basis = self._previous_chunks(filepath)
+            sock.sendall(b'OK')
+            print(f"\nReception: {filename} de {address[0]}")
+            
+            result = TransferResult(name=filename, peer=address[0], direction='receive', size=filesize,
+                                    method='delta' if basis else 'dedup')
+            expected_checksum = self._registered_checksum(options)
+            digest = checksum_hasher(expected_checksum) if expected_checksum else None
+            reader = self._frame_reader(sock, options)
+            start = time.monotonic()
+            try:
+                with open(part_path, 'wb', buffering=0) as f, \
+                        (open(filepath, 'rb', buffering=0) if basis else nullcontext()) as previous:
+                    reserve_space(f, filesize)
+                    with self.progress.track(filename, address[0], 'receive', filesize) as pbar:
+                        result.transferred = self._recv_chunk_stream(sock, f, filesize, pbar, basis, previous,
+                                                                     digest, reader)
+            except Exception:
+                os.remove(part_path)
+                raise
+            finally:
+                result.elapsed = time.monotonic() - start
+                result.add_compression(reader)
+            if result.transferred < filesize:
+                print(f"  {'Delta' if basis else 'Déduplication'}: "
+                      f"{format_size(filesize - result.transferred)} déjà présents localement")
+            
+            if not self._verify_checksum(digest, expected_checksum, part_path):
+                self._record(result)
+                sock.sendall(CHECKSUM_MISMATCH)
+                return False
+            
+            self._finalize(part_path, filepath)
+            self._remember_checksum(filepath, expected_checksum)
+            sock.sendall(b'DONE')
+        finally:
+            self._release_part(part_path)
+        
+        result.success = True
+        self._record(result)
+        print(f"[OK] Fichier reçu: {filepath}")
+        
+        if self.on_receive_callback:
+            self.on_receive_callback(filename, address[0], False)
+        return True
+    
+    def _previous_chunks(self, filepath: str) -> Dict[bytes, int]:
+        """
+        Signatures des blocs de la version d'un fichier déjà reçue
+        
+        Args:
+            filepath: Chemin du fichier dans le dossier de stockage
+        
+        Returns:
+            {empreinte: offset} (vide si aucune version exploitable)
+        """
+        if not os.path.isfile(filepath) or os.path.getsize(filepath) < DEDUP_MIN_SIZE:
+            return {}
+        
+        print(f"\nCalcul des signatures de {os.path.basename(filepath)} (version précédente)")
+        basis = {}
+        for offset, _, digest in iter_chunks(filepath):
+            basis.setdefault(digest, offset)
+        return basis
+    
+    def _recv_chunk_stream(self, sock: socket.socket, f, size: int, pbar=None, basis: Dict[bytes, int] = None,
+                           previous=None, file_hash=None, reader: FrameReader = None) -> int:
+        """
+        Reconstituer un fichier à partir des blocs annoncés au fil de l'envoi
+        
+        Chaque annonce reçoit aussitôt sa réponse: un bloc n'est demandé
+        qu'à sa première occurrence, s'il est absent du magasin et de la
+        version précédente du fichier. Les blocs sont écrits dans l'ordre
+        des annonces dès que ceux qui les précèdent sont disponibles. Un
+        bloc trouvé dans le magasin est lu dès son annonce: un nettoyage du
+        magasin pendant la réception ne peut plus le faire disparaître.
+        
+        Args:
+            sock: Socket de l'expéditeur
+            f: Fichier de destination
+            size: Taille annoncée du fichier
+            pbar: Barre de progression
+            basis: Blocs de la version précédente ({empreinte: offset})
+            previous: Version précédente ouverte en lecture
+            file_hash: Hash du fichier entier, mis à jour au vol
+            reader: Décodeur des trames si l'expéditeur compresse
+        
+        Returns:
+            Octets de blocs reçus par le réseau
+        """
+        set_nodelay(sock)  # Une réponse par annonce, sans attendre
+        basis = basis or {}
+        pending = deque()    # [empreinte, longueur, contenu] dans l'ordre des annonces
+        requested = deque()  # Blocs demandés dont le contenu n'est pas encore arrivé
+        unwritten = {}       # Empreinte -> bloc en attente d'écriture (partagé par ses répétitions)
+        announced = 0
+        received = 0
+        ended = False
+        
+        while not ended or pending:
+            tag = self._recv_exact(sock, 1)
+            if tag == CHUNK_ANNOUNCE and not ended:
+                digest, length = CHUNK_ENTRY.unpack(self._recv_exact(sock, CHUNK_ENTRY.size))
+                announced += length
+                if length > CDC_MAX_SIZE or announced > size:
+                    raise Exception("Blocs incohérents avec la taille du fichier")
+                chunk = unwritten.get(digest)
+                needed = False
+                if chunk is None and digest in basis:
+                    chunk = [digest, length, None]
+                elif chunk is None:
+                    chunk = unwritten[digest] = [digest, length, self.chunk_store.get(digest)]
+                    needed = chunk[2] is None
+                if chunk[1] != length or (chunk[2] is not None and len(chunk[2]) != length):
+                    raise Exception("Blocs incohérents avec la taille du fichier")
+                if needed:
+                    requested.append(chunk)
+                sock.sendall(CHUNK_NEEDED if needed else CHUNK_PRESENT)
+                pending.append(chunk)
+            elif tag == CHUNK_DATA and requested:
+                chunk = requested.popleft()
+                data = reader.read(chunk[1]) if reader else self._recv_exact(sock, chunk[1])
+                if not self.chunk_store.put(chunk[0], data):
+                    raise Exception("Bloc corrompu pendant le transfert")
+                chunk[2] = data
+                received += len(data)
+            elif tag == CHUNK_END and not ended:
+                if announced != size:
+                    raise Exception("Blocs incohérents avec la taille du fichier")
+                ended = True
+            else:
+                raise Exception(f"Message de bloc inattendu: {tag!r}")
+            
+            # Écrire les blocs de tête, jusqu'au premier demandé pas encore arrivé
+            while pending and not (requested and pending[0] is requested[0]):
+                chunk = pending.popleft()
+                digest, length, data = chunk
+                if unwritten.get(digest) is chunk:
+                    del unwritten[digest]
+                if data is None:
+                    # Référence à un bloc de la version précédente
+                    previous.seek(basis[digest])
+                    data = previous.read(length)
+                    if hashlib.sha256(data).digest() != digest:
+                        raise Exception("Version précédente modifiée pendant le transfert")
+                f.write(data)
+                if file_hash is not None:
+                    file_hash.update(data)
+                if pbar is not None:
+                    pbar.update(length)
+        return received
+    
+    def _handle_relay(self, sock: socket.socket, address, filename: str, filesize: int, options: Dict):
+        """
+        Recevoir un fichier tout en le relayant vers la suite de l'arbre
+        
+        Chaque bloc reçu est écrit localement puis transmis aux voisins
+        directs. Le statut de tout le sous-arbre remonte avec le DONE final.
+        
+        Args:
+            sock: Socket de l'amont
+            address: Adresse de l'amont
+            filename: Nom du fichier
+            filesize: Taille du fichier
+            options: Options de l'en-tête (relay, degree)
+        """
+        filepath = os.path.join(self.storage_dir, filename)
+        part_path = filepath + PART_SUFFIX
+        degree = int(options.get('degree', RELAY_DEGREE))
+        peers, rejected = self._registered_relay_peers(parse_relay_peers(options['relay']))
+        children = self._open_relay_children(filename, filesize, peers, degree, options.get('file_id'))
+        try:
+            self._relay_file(sock, address, filename, filesize, options, filepath, part_path, children, rejected)
+        finally:
+            self._close_relay_children(children)
+    
+    def _relay_file(self, sock: socket.socket, address, filename: str, filesize: int, options: Dict,
+                    filepath: str, part_path: str, children: List[RelayChild], rejected: List[str]):
+        """Recevoir, écrire et relayer le fichier (voir _handle_relay)"""
+        expected_checksum = self._registered_checksum(options)
+        digest = checksum_hasher(expected_checksum) if expected_checksum else None
+        sock.sendall(b'OK')
+        
+        forwarding = sum(len(child.names()) for child in children)
+        print(f"\nReception: {filename} de {address[0]} (relais vers {forwarding} PC)")
+        result = TransferResult(name=filename, peer=address[0], direction='receive',
+                                size=filesize, method='relay')
+        received = 0
+        start = time.monotonic()
+        
+        try:
+            with open(part_path, 'wb', buffering=0) as f:
+                reserve_space(f, filesize)
+                with self.progress.track(filename, address[0], 'receive', filesize) as pbar, \
+                        self._disk_writer(f, filesize) as writer:
+                    while received < filesize:
+                        buffer = writer.buffer()
+                        n = sock.recv_into(buffer, min(len(buffer), filesize - received))
+                        if not n:
+                            writer.release(buffer)
+                            break
+                        self._forward(children, buffer[:n])
+                        if digest is not None:
+                            digest.update(buffer[:n])
+                        writer.write(buffer[:n], received, buffer)
+                        received += n
+                        pbar.update(n)
+        finally:
+            result.elapsed = time.monotonic() - start
+            result.transferred = received
+        
+        if received < filesize:
+            os.remove(part_path)
+            self._record(result)
+            raise Exception(f"Connexion interrompue ({format_size(received)}/{format_size(filesize)})")
+        
+        # Les voisins vérifient leur copie eux-mêmes: un écart local ne les arrête pas
+        if not self._verify_checksum(digest, expected_checksum, part_path):
+            self._record(result)
+            statuses = self._collect_relay_status(children)
+            statuses.update(dict.fromkeys(rejected, False))
+            sock.sendall(CHECKSUM_MISMATCH + f"|{format_relay_status(statuses)}".encode('utf-8'))
+            return
+        
+        self._finalize(part_path, filepath)
+        self._remember_checksum(filepath, expected_checksum)
+        result.success = True
+        self._record(result)
+        
+        # Remonter le statut du sous-arbre
+        statuses = self._collect_relay_status(children)
+        statuses.update(dict.fromkeys(rejected, False))
+        sock.sendall(f"DONE|{format_relay_status(statuses)}".encode('utf-8'))
+        print(f"[OK] Fichier reçu: {filepath}")
+        
+        if self.on_receive_callback:
+            self.on_receive_callback(filename, address[0], False)
+    
+    def _registered_relay_peers(self, peers: List[Dict]) -> Tuple[List[Dict], List[str]]:
+        """
+        Garder les pairs d'un en-tête de relais présents dans l'annuaire
+        
+        L'en-tête vient de l'amont: un pair inconnu de l'annuaire, ou à une
+        autre adresse que celle enregistrée, n'est pas contacté (sans
+        annuaire, aucun pair ne l'est).
+        
+        Args:
+            peers: Pairs annoncés par l'amont
+        
+        Returns:
+            (pairs retenus, noms des pairs refusés)
+        """
+        accepted = []
+        rejected = []
+        for peer in peers:
+            try:
+                known = self.peer_lookup(peer['name']) if self.peer_lookup else None
+            except Exception:
+                known = None
+            if known and known.get('ip_address') == peer['ip_address'] and known.get('port') == peer['port']:
+                accepted.append(peer)
+            else:
+                rejected.append(peer['name'])
+        if rejected:
+            print(f"[!] Relais refusé vers des PC absents de l'annuaire: {', '.join(rejected)}")
+        return accepted, rejected
+    
+    def _open_relay_children(self, filename: str, filesize: int, peers: List[Dict],
+                             degree: int, file_id=None) -> List[RelayChild]:
+        """
+        Ouvrir les connexions vers les voisins directs d'une diffusion relayée
+        
+        Args:
+            filename: Nom du fichier
+            filesize: Taille du fichier
+            peers: Pairs restant à servir
+            degree: Nombre de voisins directs
+        
+        Returns:
+            Voisins (alive=False si injoignables)
+        """
+        children = []
+        for group in relay_groups(peers, degree) if peers else []:
+            child = RelayChild(group[0], group[1:])
+            children.append(child)
+            
+            # Un voisin injoignable est remplacé par le suivant de son groupe
+            while not child.alive:
+                try:
+                    child.sock = socket.create_connection((child.peer['ip_address'], child.peer['port']))
+                    enable_keepalive(child.sock)
+                    child.sock.sendall(encode_transfer_header(filename, filesize, TRANSFER_FILE, degree=degree,
+                                                              relay=format_relay_peers(child.subtree),
+                                                              file_id=file_id))
+                    if child.sock.recv(BUFFER_SIZE) != b'OK':
+                        raise Exception("ACK non reçu")
+                    child.alive = True
+                    child.start()
+                except Exception as e:
+                    print(f"[!] Relais vers {child.peer['name']} impossible: {e}")
+                    if child.sock:
+                        child.sock.close()
+                    if not child.subtree:
+                        break
+                    child.skipped.append(child.peer['name'])
+                    child.peer = child.subtree.pop(0)
+        return children
+    
+    @staticmethod
+    def _forward(children: List[RelayChild], data):
+        """Mettre un bloc en file pour les voisins encore joignables (copié une fois pour tous)"""
+        block = None
+        for child in children:
+            if child.alive:
+                if block is None:
+                    block = bytes(data)
+                child.send(block)
+    
+    @staticmethod
+    def _close_relay_children(children: List[RelayChild]):
+        """Abandonner la diffusion vers les voisins restants (transfert incomplet ou terminé)"""
+        for child in children:
+            child.abort()
+    
+    def _collect_relay_status(self, children: List[RelayChild]) -> Dict[str, bool]:
+        """
+        Attendre la fin de chaque sous-arbre et rassembler les statuts
+        
+        Returns:
+            Succès par nom de PC
+        """
+        statuses = {}
+        for child in children:
+            reply = b''
+            if child.finish():
+                try:
+                    reply = self._recv_until_close(child.sock)
+                except OSError:
+                    pass
+                finally:
+                    child.sock.close()
+            
+            status, _, details = reply.decode('utf-8', 'replace').partition('|')
+            if status in ('DONE', CHECKSUM_MISMATCH.decode()):
+                statuses[child.peer['name']] = status == 'DONE'
+                statuses.update(parse_relay_status(details))
+            for name in child.names():
+                statuses.setdefault(name, False)
+        return statuses
+    
+    @staticmethod
+    def _recv_until_close(sock: socket.socket, limit: int = MAX_HEADER_SIZE) -> bytes:
+        """Recevoir une réponse jusqu'à la fermeture de la connexion"""
+        data = bytearray()
+        while len(data) < limit:
+            chunk = sock.recv(BUFFER_SIZE)
+            if not chunk:
+                break
+            data += chunk
+        return bytes(data)
+    
+    @staticmethod
+    def _recv_header(sock: socket.socket) -> bytes:
+        """
+        Recevoir un en-tête de transfert terminé par un saut de ligne
+        
+        Les octets qui suivent le saut de ligne (blocs, contenu) restent
+        dans la socket. Un en-tête sans saut de ligne (anciens clients) est
+        accepté tel quel s'il n'est suivi de rien pendant LEGACY_HEADER_TIMEOUT.
+        
+        Args:
+            sock: Socket de l'expéditeur
+        
+        Returns:
+            En-tête brut
+        """
+        data = b''
+        try:
+            while len(data) <= MAX_HEADER_SIZE:
+                try:
+                    chunk = sock.recv(BUFFER_SIZE, socket.MSG_PEEK)
+                except socket.timeout:
+                    break
+                if not chunk:
+                    break
+                
+                end = chunk.find(b'\n')
+                if end >= 0:
+                    return data + FileTransfer._recv_exact(sock, end + 1)
+                data += FileTransfer._recv_exact(sock, len(chunk))
+                sock.settimeout(LEGACY_HEADER_TIMEOUT)
+            else:
+                raise Exception("En-tête trop long")
+        finally:
+            sock.settimeout(None)
+        
+        if not data:
+            raise ConnectionError("Connexion fermée avant l'en-tête")
+        return data
+    
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        """
+        Recevoir exactement `size` octets
+        
+        Args:
+            sock: Socket source
+            size: Nombre d'octets
+        
+        Returns:
+            Données reçues
+        """
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            n = sock.recv_into(view[received:], size - received)
+            if not n:
+                raise ConnectionError("Connexion fermée par l'expéditeur")
+            received += n
+        return bytes(data)
+    
+    @staticmethod
+    def _recv_frame(sock: socket.socket, limit: int = MAX_HEADER_SIZE) -> Tuple[int, int, memoryview]:
+        """
+        Recevoir une trame v2 complète (hors données)
+        
+        Args:
+            sock: Socket source
+            limit: Taille max du contenu
+        
+        Returns:
+            (type, drapeaux, contenu)
+        
+        Raises:
+            ValueError: Pas une trame v2
+        """
+        frame_type, flags, length = parse_frame_header(FileTransfer._recv_exact(sock, P2P_FRAME.size))
+        if length > limit:
+            raise ValueError(f"Trame trop grande: {length} octets")
+        payload = memoryview(bytearray(length))
+        received = 0
+        while received < length:
+            n = sock.recv_into(payload[received:], length - received)
+            if not n:
+                raise ConnectionError("Connexion fermée par l'expéditeur")
+            received += n
+        return frame_type, flags, payload
+    
+    @staticmethod
+    def _recv_data_frame(sock: socket.socket, offset: int, count: int, compressed: bool):
+        """
+        Recevoir l'en-tête de la trame de données d'une plage attendue
+        
+        Les octets de la plage restent dans la socket.
+        
+        Raises:
+            Exception: Trame d'erreur ou plage différente de celle attendue
+        """
+        frame_type, flags, length = parse_frame_header(FileTransfer._recv_exact(sock, P2P_FRAME.size))
+        if frame_type == P2P_ERROR:
+            _, message = decode_error(FileTransfer._recv_exact(sock, min(length, MAX_HEADER_SIZE)))
+            raise Exception(f"Envoi interrompu: {message}")
+        if frame_type != P2P_DATA or length != P2P_OFFSET.size + count:
+            raise Exception(f"Trame inattendue: {frame_type} ({length} octets)")
+        if bool(flags & P2P_COMPRESSED) != compressed:
+            raise Exception("Compression différente de celle annoncée")
+        if P2P_OFFSET.unpack(FileTransfer._recv_exact(sock, P2P_OFFSET.size))[0] != offset:
+            raise Exception("Plage inattendue")
+    
+    def _claim_part(self, part_path: str) -> bool:
+        """Réserver un fichier .part (False s'il est déjà en cours de réception)"""
+        with self._parts_lock:
+            if part_path in self._active_parts:
+                return False
+            self._active_parts.add(part_path)
+            return True
+    
+    def _release_part(self, part_path: str):
+        """Libérer un fichier .part"""
+        with self._parts_lock:
+            self._active_parts.discard(part_path)
+    
+    @staticmethod
+    def _open_part(part_path: str, filesize: int, preallocate: bool = False):
+        """
+        Ouvrir un fichier partiel sans perdre son contenu
+        
+        Args:
+            part_path: Chemin du fichier .part
+            filesize: Taille finale
+            preallocate: Réserver tout l'espace disque dès l'ouverture
+        
+        Returns:
+            Fichier binaire non bufferisé, ouvert en lecture/écriture
+        """
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        f = open(fd, 'r+b', buffering=0)
+        
+        if preallocate:
+            try:
+                reserve_space(f, filesize)
+            except OSError:
+                f.close()
+                raise
+        return f
+    
+    def _receive_ranges(self, sock: socket.socket, f, ranges: List[Tuple[int, int]],
+                        journal: TransferJournal = None, pbar=None, digest=None,
+                        hashed: int = 0, reader: FrameReader = None, framed: bool = False) -> Tuple[int, str]:
+        """
+        Recevoir une suite de plages en mettant à jour le journal
+        
+        Le journal est synchronisé tous les JOURNAL_INTERVAL octets et à la
+        fin (ou à l'interruption) de la réception.
+        
+        Args:
+            sock: Socket de données
+            f: Fichier .part
+            ranges: Plages (offset, longueur) à recevoir, dans l'ordre d'envoi
+            journal: Journal de reprise (optionnel)
+            pbar: Barre de progression
+            digest: Hash du fichier entier, mis à jour au vol (plages croissantes;
+                    les octets déjà présents entre deux plages sont relus du disque)
+            hashed: Position à partir de laquelle `digest` attend des octets
+            reader: Décodeur des trames si l'expéditeur compresse
+            framed: Chaque plage arrive dans une trame de données v2
+        
+        Returns:
+            (octets reçus, méthode utilisée)
+        """
+        received = 0
+        method = ''
+        try:
+            for offset, length in ranges:
+                if framed:
+                    self._recv_data_frame(sock, offset, length, reader is not None)
+                if digest is not None:
+                    self._hash_file(f, digest, hashed, offset)
+                    hashed = offset + length
+                done = 0
+                while done < length:
+                    segment = min(JOURNAL_INTERVAL, length - done)
+                    n, method = self._recv_range(sock, f, offset + done, segment, pbar, digest, reader)
+                    if journal:
+                        journal.add(offset + done, offset + done + n)
+                    done += n
+                    received += n
+                    if n < segment:
+                        return received, method
+                    if journal and done < length:
+                        self._checkpoint(f, journal)
+        finally:
+            if journal:
+                self._checkpoint(f, journal)
+        return received, method
+    
+    @staticmethod
+    def _hash_file(f, digest, start: int, end: int):
+        """Ajouter au hash les octets [start, end) déjà présents dans le fichier"""
+        f.seek(start)
+        while start < end:
+            data = f.read(min(CHUNK_SIZE, end - start))
+            if not data:
+                break
+            digest.update(data)
+            start += len(data)
+    
+    @staticmethod
+    def _frame_reader(sock: socket.socket, options: Dict) -> Optional[FrameReader]:
+        """
+        Décodeur des trames si l'expéditeur annonce une compression
+        
+        Args:
+            sock: Socket de l'expéditeur
+            options: Options de l'en-tête (compress=codec)
+        
+        Returns:
+            FrameReader, ou None si les octets arrivent bruts
+        """
+        codec = options.get('compress')
+        if not codec:
+            return None
+        if codec != CODEC:
+            raise Exception(f"Compression non supportée: {codec}")
+        return FrameReader(sock)
+    
+    def _registered_checksum(self, options: Dict) -> Optional[str]:
+        """
+        Checksum enregistré sur le serveur pour le fichier annoncé
+        
+        Args:
+            options: Options de l'en-tête (file_id)
+        
+        Returns:
+            Checksum (voir shared.hashing), ou None si le transfert ne peut pas être vérifié
+        """
+        file_id = options.get('file_id')
+        if not file_id or not self.checksum_lookup:
+            return None
+        try:
+            checksum = self.checksum_lookup(int(file_id))
+            if not checksum or checksum == 'folder':
+                return None
+            parse_checksum(checksum)
+        except Exception:
+            return None
+        return checksum
+    
+    def _verify_checksum(self, digest, expected: Optional[str], part_path: str,
+                         journal: TransferJournal = None) -> bool:
+        """
+        Comparer le checksum calculé pendant la réception avec celui enregistré
+        
+        En cas d'écart, le fichier partiel et son journal sont supprimés et
+        le .part est libéré avant la réponse (l'expéditeur peut renvoyer aussitôt).
+        
+        Args:
+            digest: Hash calculé au fil de la réception
+            expected: Checksum enregistré (None: pas de vérification)
+            part_path: Fichier .part reçu
+            journal: Journal de reprise
+        
+        Returns:
+            False si le fichier reçu est corrompu
+        """
+        if expected is None:
+            return True
+        
+        checksum = digest.hexdigest()
+        if checksum != parse_checksum(expected)[1]:
+            os.remove(part_path)
+            if journal:
+                journal.remove()
+            self._release_part(part_path)
+            print(f"\n[X] Checksum invalide: {checksum} au lieu de {expected}")
+            return False
+        
+        print(f"  Checksum vérifié: {checksum}")
+        return True
+    
+    def _remember_checksum(self, filepath: str, checksum: Optional[str]):
         """
-        Initialiser le gestionnaire
+        Garder en cache le checksum vérifié d'un fichier reçu
+        
+        Un renvoi ou un partage du fichier n'aura pas à le recalculer.
         
         Args:
-            storage_dir: Dossier de stockage des fichiers reçus
-            port: Port pour recevoir les fichiers
-            on_receive_callback: Fonction à appeler lors de la réception (filename, sender_ip, is_folder)
+            filepath: Fichier reçu (après renommage du .part)
+            checksum: Checksum enregistré (None: fichier non vérifié)
         """
-        self.storage_dir = storage_dir
-        self.port = port
-        self.server_socket = None
-        self.running = False
-        self.on_receive_callback = on_receive_callback
-        
-        # Créer le dossier de stockage
-        os.makedirs(storage_dir, exist_ok=True)
-    
-    def start_receiver(self):
-        """Démarrer le serveur de réception en arrière-plan"""
-        self.running = True
-        thread = threading.Thread(target=self._receive_loop, daemon=True)
-        thread.start()
-        print(f"[OK] Serveur de réception démarré sur le port {self.port}")
-    
-    def stop_receiver(self):
-        """Arrêter le serveur de réception"""
-        self.running = False
-        if self.server_socket:
-            self.server_socket.close()
+        if checksum:
+            self.hash_cache.put(filepath, parse_checksum(checksum)[0], checksum)
     
-    def _receive_loop(self):
-        """Boucle de réception (thread séparé)"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        
-        try:
-            self.server_socket.bind(('0.0.0.0', self.port))
-            self.server_socket.listen(5)
-            self.server_socket.settimeout(1.0)  # Timeout pour vérifier self.running
-            
-            while self.running:
-                try:
-                    client_socket, address = self.server_socket.accept()
-                    # Traiter dans un thread séparé
-                    thread = threading.Thread(
-                        target=self._handle_receive,
-                        args=(client_socket, address),
-                        daemon=True
-                    )
-                    thread.start()
-                except socket.timeout:
-                    continue
-                except:
-                    break
-                    
-        except Exception as e:
-            print(f"[X] Erreur serveur réception: {e}")
-        finally:
-            if self.server_socket:
-                self.server_socket.close()
+    def _checkpoint(self, f, journal: TransferJournal):
+        """Synchroniser les données sur disque (sauf politique FSYNC_NONE) puis enregistrer le journal"""
+        if self.fsync != FSYNC_NONE:
+            os.fsync(f.fileno())
+        journal.save()
     
-    def _handle_receive(self, client_socket: socket.socket, address):
+    def _handle_multi(self, control: socket.socket, address, filename: str, filesize: int, options: Dict):
         """
-        Gérer la réception d'un fichier ou dossier
+        Négocier puis superviser un transfert multi-flux
+        
+        La connexion de contrôle reste ouverte jusqu'à la réception de
+        toutes les plages, puis reçoit le statut final (DONE ou FAIL).
         
         Args:
-            client_socket: Socket du client
-            address: Adresse du client
+            control: Socket de contrôle
+            address: Adresse de l'expéditeur
+            filename: Nom du fichier
+            filesize: Taille totale
+            options: Options de l'en-tête (streams, tid, resume)
         """
+        tid = options['tid']
+        streams = max(1, min(int(options.get('streams', 1)), self.max_streams))
+        filepath = os.path.join(self.storage_dir, filename)
+        part_path = filepath + PART_SUFFIX
+        if not self._claim_part(part_path):
+            control.sendall(b'BUSY')
+            return
+        
         try:
-            # Recevoir les métadonnées (première ligne)
-            metadata = client_socket.recv(BUFFER_SIZE).decode('utf-8')
-            parts = metadata.split('|')
-            filename = parts[0]
-            filesize = int(parts[1])
-            is_folder = parts[2] == 'folder' if len(parts) > 2 else False
+            journal = TransferJournal(part_path, options.get('resume'), filesize)
+            if options.get('resume'):
+                journal = TransferJournal.open(part_path, options['resume'], filesize)
+            ranges = journal.missing()
+            expected = sum(length for _, length in ranges)
+            expected_checksum = self._registered_checksum(options)
             
-            # Envoyer ACK
-            client_socket.send(b'OK')
-            
-            # Recevoir le fichier
-            filepath = os.path.join(self.storage_dir, filename)
-            received = 0
+            # Préallouer le fichier pour que chaque flux écrive à sa position
+            self._open_part(part_path, filesize, preallocate=True).close()
             
-            if is_folder:
-                print(f"\nReception dossier: {filename.replace('.zip', '')} de {address[0]}")
-            else:
-                print(f"\nReception: {filename} de {address[0]}")
+            print(f"\nReception: {filename} de {address[0]} ({streams} flux)")
+            if expected < filesize:
+                print(f"  Reprise: {format_size(filesize - expected)} déjà reçus")
+            result = TransferResult(name=filename, peer=address[0], direction='receive',
+                                    size=filesize, streams=streams)
+            start = time.monotonic()
             
-            # Barre de progression avec tqdm
-            with open(filepath, 'wb') as f:
-                with tqdm(total=filesize, unit='B', unit_scale=True, unit_divisor=1024, 
-                         desc=filename[:30], ncols=80) as pbar:
-                    while received < filesize:
-                        chunk = client_socket.recv(min(CHUNK_SIZE, filesize - received))
-                        if not chunk:
+            with self.progress.track(filename, address[0], 'receive', filesize, filesize - expected) as pbar:
+                state = MultiStreamReceive(part_path, journal, expected, pbar)
+                if expected_checksum:
+                    algorithm, _, merkle = parse_checksum(expected_checksum)
+                    if merkle:
+                        state.algorithm, state.leaves = algorithm, {}
+                with self._multi_lock:
+                    self._multi_receives[tid] = state
+                try:
+                    control.sendall(f"OK|{streams}|{format_ranges(ranges)}".encode('utf-8'))
+                    
+                    # Attendre toutes les plages (ou l'abandon de l'expéditeur)
+                    while expected and not state.done.wait(1.0):
+                        readable, _, _ = select.select([control], [], [], 0)
+                        if readable and not control.recv(1, socket.MSG_PEEK):
+                            state.failed = True
                             break
-                        f.write(chunk)
-                        received += len(chunk)
-                        pbar.update(len(chunk))
+                finally:
+                    with self._multi_lock:
+                        self._multi_receives.pop(tid, None)
             
-            # Si c'est un dossier, décompresser
-            if is_folder:
-                print(f"Decompression...")
-                folder_name = filename.replace('.zip', '')
-                extract_path = os.path.join(self.storage_dir, folder_name)
-                
-                with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                    zip_ref.extractall(extract_path)
-                
-                # Supprimer le zip
-                os.remove(filepath)
-                print(f"[OK] Dossier reçu: {extract_path}")
-            else:
-                print(f"[OK] Fichier reçu: {filepath}")
+            result.elapsed = time.monotonic() - start
+            result.transferred = state.received
+            result.method = state.method
+            result.success = not state.failed and state.remaining == 0
+            self._record(result)
             
-            # Vérifier le checksum
-            if not is_folder:
-                checksum = calculate_checksum(filepath)
-                print(f"  Checksum: {checksum}")
+            if not result:
+                control.sendall(b'FAIL')
+                raise Exception(f"Transfert multi-flux incomplet "
+                                f"({format_size(filesize - state.remaining)}/{format_size(filesize)})")
             
-            # Appeler le callback de notification
-            if self.on_receive_callback:
-                display_name = filename.replace('.zip', '') if is_folder else filename
-                self.on_receive_callback(display_name, address[0], is_folder)
+            with self._open_part(part_path, filesize) as f:
+                f.truncate(filesize)
             
-        except Exception as e:
-            print(f"\n[X] Erreur réception: {e}")
+            # Plages reçues dans le désordre: chaque flux a haché les blocs entiers de sa plage,
+            # seuls les blocs à cheval sur deux plages (ou déjà reçus) sont relus
+            if expected_checksum:
+                digest = checksum_hasher(expected_checksum)
+                if state.leaves is not None:
+                    missing = [i for i in range(chunk_count(filesize)) if i not in state.leaves]
+                    state.leaves.update(chunk_hashes(part_path, state.algorithm, indexes=missing))
+                    digest.leaves = state.leaves
+                else:
+                    with open(part_path, 'rb') as f:
+                        self._hash_file(f, digest, 0, filesize)
+                if not self._verify_checksum(digest, expected_checksum, part_path, journal):
+                    result.success = False
+                    control.sendall(CHECKSUM_MISMATCH)
+                    return
+            
+            self._finalize(part_path, filepath)
+            self._remember_checksum(filepath, expected_checksum)
+            journal.remove()
+        finally:
+            self._release_part(part_path)
+        
+        control.sendall(b'DONE')
+        print(f"[OK] Fichier reçu: {filepath}")
+        
+        if self.on_receive_callback:
+            self.on_receive_callback(filename, address[0], False)
+    
+    def _handle_range(self, sock: socket.socket, options: Dict):
+        """
+        Recevoir une plage d'un transfert multi-flux
+        
+        Args:
+            sock: Socket du flux
+            options: Options de l'en-tête (tid, offset, length)
+        """
+        with self._multi_lock:
+            state = self._multi_receives.get(options.get('tid'))
+        if state is None:
+            sock.sendall(b'ERR')
+            raise Exception("Plage reçue pour un transfert inconnu")
+        
+        offset = int(options['offset'])
+        length = int(options['length'])
+        received = 0
+        method = ''
+        
+        # Feuilles de Merkle des blocs entièrement contenus dans la plage
+        hasher = None
+        if state.leaves is not None:
+            hasher = RangeLeafHasher(state.leaves, offset, state.journal.size, state.algorithm)
+        try:
+            sock.sendall(b'OK')
+            with self._open_part(state.part_path, state.journal.size) as f:
+                received, method = self._receive_ranges(sock, f, [(offset, length)],
+                                                        state.journal, state.pbar, hasher, offset)
         finally:
-            client_socket.close()
+            with state.lock:
+                state.received += received
+                state.remaining -= received
+                state.method = state.method or method
+                if received < length:
+                    state.failed = True
+                if state.failed or state.remaining <= 0:
+                    state.done.set()
     
-    def send_file(self, filepath: str, peer_ip: str, peer_port: int) -> bool:
+    def send_file(self, filepath: str, peer_ip: str, peer_port: int, streams: int = 1,
+                  retries: int = TRANSFER_RETRIES, file_id: int = None, priority: str = None,
+                  cancel: threading.Event = None, checksum: str = None) -> TransferResult:
         """
         Envoyer un fichier à un PC
         
+        En cas de coupure, l'envoi reprend automatiquement là où le
+        destinataire s'est arrêté. Sur un seul flux, les blocs que le
+        destinataire possède déjà ne sont pas renvoyés (déduplication).
+        
         Args:
             filepath: Chemin du fichier à envoyer
             peer_ip: IP du destinataire
             peer_port: Port du destinataire
+            streams: Nombre de connexions parallèles souhaitées
+            retries: Nombre de reprises après une coupure
+            file_id: ID du fichier sur le serveur (le destinataire vérifie son checksum)
+            priority: Classe de priorité (défaut: d'après la taille, voir shaping.classify)
+            cancel: Événement levé pour annuler l'envoi (arrêt au bloc suivant)
+            checksum: Checksum du fichier, annoncé au destinataire (protocole v2)
             
         Returns:
-            True si succès, False sinon
+            Résultat du transfert (vrai si succès)
         """
         if not os.path.exists(filepath):
             print(f"[X] Fichier non trouvé: {filepath}")
@@ -170,121 +2044,807 @@ class FileTransfer:
         
         filename = os.path.basename(filepath)
         filesize = os.path.getsize(filepath)
+        key = resume_key(filepath)
+        multi = streams > 1 and filesize >= MIN_MULTI_STREAM_SIZE
+        legacy = False
+        error = None
+        
+        with self.shaper.flow(peer_ip, priority or classify(filesize), cancel) as flow:
+            for attempt in range(retries + 1):
+                try:
+                    flow.check()
+                    if multi:
+                        return self._send_multi(filepath, filename, filesize, peer_ip, peer_port, streams, key,
+                                                file_id, flow)
+                    if self.dedup and filesize >= DEDUP_MIN_SIZE:
+                        return self._send_dedup(filepath, filename, filesize, peer_ip, peer_port, file_id, flow)
+                    return self._send_single(filepath, filename, filesize, peer_ip, peer_port, key, file_id, flow,
+                                             checksum, legacy)
+                except (OSError, TransferInterrupted) as e:
+                    error = e
+                    # Annonce v2 restée sans réponse: nouvel essai en v1 (ancien destinataire possible)
+                    legacy = isinstance(e, NoReply) or isinstance(e.__cause__, NoReply)
+                    if attempt < retries:
+                        delay = RETRY_DELAY * (attempt + 1)
+                        print(f"\n[!] Transfert interrompu ({e}), reprise dans {delay}s ({attempt + 1}/{retries})")
+                        time.sleep(delay)
+                except Exception as e:
+                    error = e
+                    break
+        
+        print(f"\n[X] Erreur envoi: {error}")
+        return self._record(TransferResult(name=filename, peer=peer_ip, direction='send', size=filesize,
+                                           priority=flow.priority))
+    
+    @contextmanager
+    def _session(self, peer_ip: str, peer_port: int):
+        """
+        Connexion vers un PC, réutilisée d'un envoi précédent si possible
         
+        La connexion retourne au pool si le transfert se termine sans
+        erreur, elle est fermée sinon. Une erreur sur une session réutilisée
+        (fermée entre-temps par le destinataire) est signalée comme une
+        interruption pour que l'envoi soit repris sur une nouvelle connexion.
+        """
+        sock, reused = self.sessions.acquire(peer_ip, peer_port)
+        done = False
         try:
-            # Connexion au destinataire
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((peer_ip, peer_port))
-            
+            yield sock
+            done = True
+        except Exception as e:
+            if reused and not isinstance(e, (ChecksumMismatch, TransferCancelled)):
+                self.sessions.discard(peer_ip, peer_port)
+                raise TransferInterrupted(f"session interrompue: {e}") from e
+            raise
+        finally:
+            self.sessions.release(peer_ip, peer_port, sock, done)
+    
+    def _send_single(self, filepath: str, filename: str, filesize: int, peer_ip: str, peer_port: int,
+                     key: str, file_id: int = None, flow: Flow = None, checksum: str = None,
+                     legacy: bool = False) -> TransferResult:
+        """
+        Envoyer (ou reprendre) un fichier sur une seule connexion
+        
+        Le protocole v2 est essayé d'abord; un PC qui répond en v1 ou refuse
+        la version reçoit l'en-tête texte v1 (retenu pour les envois suivants).
+        
+        Args:
+            legacy: Envoyer en v1 pour cette fois (l'essai précédent en v2 est resté sans réponse)
+        
+        Returns:
+            Résultat du transfert (enregistré dans l'historique)
+        """
+        if not legacy and (peer_ip, peer_port) not in self._legacy_peers:
+            try:
+                return self._send_framed(filepath, filename, filesize, peer_ip, peer_port, key, file_id, flow,
+                                         checksum)
+            except LegacyPeer:
+                self._legacy_peers.add((peer_ip, peer_port))
+                print(f"\n[!] {peer_ip} ne comprend pas le protocole v{PROTOCOL_VERSION}, envoi en v1")
+        
+        stage = self._compression_stage(peer_ip, filesize)
+        
+        # Connexion au destinataire (session réutilisée si possible)
+        with self._session(peer_ip, peer_port) as sock:
             # Envoyer métadonnées
-            metadata = f"{filename}|{filesize}".encode('utf-8')
-            sock.send(metadata)
+            sock.send(encode_transfer_header(filename, filesize, TRANSFER_FILE, resume=key, file_id=file_id,
+                                             compress=stage and CODEC, session=1))
             
-            # Attendre ACK
-            ack = sock.recv(BUFFER_SIZE)
-            if ack != b'OK':
+            # Attendre ACK et plages manquantes
+            status, _, ranges = sock.recv(BUFFER_SIZE).decode('utf-8').partition('|')
+            if status == 'BUSY':
+                raise TransferInterrupted("réception précédente encore en cours")
+            if status != 'OK':
                 raise Exception("ACK non reçu")
+            ranges = parse_ranges(ranges)
             
             # Envoyer le fichier avec barre de progression
-            sent = 0
             print(f"\nEnvoi: {filename} vers {peer_ip}:{peer_port}")
+            remaining = sum(length for _, length in ranges)
+            if remaining < filesize:
+                print(f"  Reprise: {format_size(filesize - remaining)} déjà reçus")
+            result = self._send_payload(sock, filepath, filename, filesize, peer_ip, ranges, stage, flow)
+            self._recv_done(sock)
+        
+        print(f"[OK] Fichier envoyé avec succès ({result.method})")
+        return self._record(result)
+    
+    def _send_framed(self, filepath: str, filename: str, filesize: int, peer_ip: str, peer_port: int,
+                     key: str, file_id: int = None, flow: Flow = None, checksum: str = None) -> TransferResult:
+        """
+        Envoyer (ou reprendre) un fichier en trames v2
+        
+        Le début du fichier (PIPELINE_WINDOW octets) part dans le même
+        envoi que l'annonce, sans attendre l'ACK: un petit fichier ne coûte
+        qu'un aller-retour. L'ACK indique les plages manquantes; celles
+        au-delà de la fenêtre sont envoyées ensuite.
+        
+        Returns:
+            Résultat du transfert (enregistré dans l'historique)
+        
+        Raises:
+            LegacyPeer: Réponse v1 ou version refusée par le destinataire
+            NoReply: Connexion fermée avant toute réponse
+        """
+        stage = self._compression_stage(peer_ip, filesize)
+        window = min(PIPELINE_WINDOW, filesize)
+        announce = TransferFrame(filename, filesize, file_id or 0, window,
+                                 CAP_SESSION | (CAP_COMPRESS if stage else 0), key, checksum or '')
+        
+        with self._session(peer_ip, peer_port) as sock:
+            result = TransferResult(name=filename, peer=peer_ip, direction='send', size=filesize,
+                                    priority=flow.priority if flow else '')
+            start = time.monotonic()
+            with open(filepath, 'rb', buffering=0) as f, self.tuner.probe(peer_ip, sock) as link:
+                with self.progress.track(filename, peer_ip, 'send', filesize) as pbar:
+                    try:
+                        with corked(sock):
+                            sock.sendall(announce.encode())
+                            if window:
+                                result.method = self._send_data_frame(sock, f, 0, window, pbar, stage, flow, link)
+                        head = sock.recv(len(P2P_MAGIC), socket.MSG_PEEK | socket.MSG_WAITALL)
+                    except ConnectionError as e:
+                        # Le destinataire a pu répondre (refus de version, réponse v1) avant de fermer
+                        head = self._peek_reply(sock)
+                        if not head:
+                            raise NoReply(str(e)) from e
+                    if not head:
+                        raise NoReply("connexion fermée sans réponse")
+                    if head != P2P_MAGIC:
+                        raise LegacyPeer(f"réponse v1: {head!r}")
+                    try:
+                        frame_type, _, payload = self._recv_frame(sock)
+                    except VersionMismatch as e:
+                        raise LegacyPeer(str(e)) from e
+                    
+                    if frame_type == P2P_ERROR:
+                        code, message = decode_error(payload)
+                        if code == ERROR_VERSION:
+                            raise LegacyPeer(message)
+                        raise TransferInterrupted(message)
+                    if frame_type != P2P_ACK:
+                        raise Exception("ACK non reçu")
+                    missing = decode_ack(payload)
+                    ranges = ranges_after(missing, window)
+                    remaining = sum(length for _, length in ranges)
+                    pbar.skip(filesize - window - remaining)
+                    
+                    print(f"\nEnvoi: {filename} vers {peer_ip}:{peer_port}")
+                    if sum(length for _, length in missing) < filesize:
+                        print(f"  Reprise: {format_size(filesize - sum(length for _, length in missing))} "
+                              f"déjà reçus")
+                    with corked(sock):
+                        for offset, length in ranges:
+                            result.method = self._send_data_frame(sock, f, offset, length, pbar, stage, flow,
+                                                                  link)
+            result.elapsed = time.monotonic() - start
+            result.transferred = window + remaining
+            self._recv_framed_done(sock)
+        
+        result.success = True
+        result.add_compression(stage)
+        print(f"[OK] Fichier envoyé avec succès ({result.method}, v{PROTOCOL_VERSION})")
+        return self._record(result)
+    
+    def _send_data_frame(self, sock: socket.socket, f, offset: int, count: int, pbar=None,
+                         stage: CompressionStage = None, flow: Flow = None, link: LinkProbe = None) -> str:
+        """
+        Envoyer une plage dans une trame de données v2 (voir _send_range)
+        
+        Returns:
+            Méthode utilisée
+        """
+        sock.sendall(encode_data_header(offset, count, P2P_COMPRESSED if stage is not None else 0))
+        return self._send_range(sock, f, offset, count, pbar, stage, flow, link)
+    
+    @staticmethod
+    def _peek_reply(sock: socket.socket) -> bytes:
+        """Début de la réponse déjà reçue sur une connexion fermée par le destinataire (vide si aucune)"""
+        try:
+            return sock.recv(len(P2P_MAGIC), socket.MSG_PEEK | socket.MSG_WAITALL)
+        except OSError:
+            return b''
+    
+    @staticmethod
+    def _recv_framed_done(sock: socket.socket):
+        """
+        Attendre la confirmation finale du destinataire (v2)
+        
+        Raises:
+            ChecksumMismatch: Le destinataire a reçu un fichier corrompu
+            TransferInterrupted: Pas de confirmation (reprise possible)
+        """
+        frame_type, _, payload = FileTransfer._recv_frame(sock)
+        if frame_type == P2P_DONE:
+            return
+        if frame_type == P2P_ERROR:
+            code, message = decode_error(payload)
+            if code == ERROR_CORRUPT:
+                raise ChecksumMismatch("checksum invalide chez le destinataire")
+            raise TransferInterrupted(message)
+        raise TransferInterrupted("réception non confirmée")
+    
+    def _send_dedup(self, filepath: str, filename: str, filesize: int, peer_ip: str, peer_port: int,
+                    file_id: int = None, flow: Flow = None) -> TransferResult:
+        """
+        Envoyer un fichier en annonçant ses blocs au fil de sa lecture
+        
+        Returns:
+            Résultat du transfert (enregistré dans l'historique)
+        """
+        stage = self._compression_stage(peer_ip, filesize)
+        
+        with self._session(peer_ip, peer_port) as sock:
+            sock.sendall(encode_transfer_header(filename, filesize, TRANSFER_FILE, chunks=CHUNKS_STREAM,
+                                                file_id=file_id, compress=stage and CODEC, session=1))
+            self._recv_ready(sock)
+            
+            print(f"\nEnvoi: {filename} vers {peer_ip}:{peer_port}")
+            result = TransferResult(name=filename, peer=peer_ip, direction='send', size=filesize,
+                                    priority=flow.priority if flow else '')
+            start = time.monotonic()
+            with open(filepath, 'rb', buffering=0) as f, self.tuner.probe(peer_ip, sock) as link:
+                with self.progress.track(filename, peer_ip, 'send', filesize) as pbar:
+                    result.transferred, method = self._send_chunk_stream(sock, f, pbar, stage, flow, link)
+            result.elapsed = time.monotonic() - start
+            result.method = f"dedup+{method}" if method else 'dedup'
+            result.success = True
+            result.add_compression(stage)
+            if result.transferred < filesize:
+                print(f"  Déduplication: {format_size(filesize - result.transferred)} déjà présents "
+                      f"chez le destinataire")
+            self._recv_done(sock)
+        
+        print(f"[OK] Fichier envoyé avec succès ({result.method})")
+        return self._record(result)
+    
+    def _send_chunk_stream(self, sock: socket.socket, f, pbar=None, stage: CompressionStage = None,
+                           flow: Flow = None, link: LinkProbe = None) -> Tuple[int, Optional[str]]:
+        """
+        Envoyer un fichier bloc par bloc, au fil de son découpage
+        
+        Chaque bloc est annoncé dès que sa frontière est trouvée. Les
+        réponses du destinataire ne sont lues qu'une fois DEDUP_WINDOW
+        octets de blocs en attente: annonces et réponses se croisent sans
+        un aller-retour par bloc, et le fichier n'est lu qu'une fois (les
+        blocs en attente restent en mémoire).
+        
+        Returns:
+            (octets de blocs envoyés, méthode utilisée ou None si aucun bloc envoyé)
+        """
+        pending = deque()
+        waiting = 0
+        sent = 0
+        method = None
+        
+        for _, data, digest in iter_chunk_data(f):
+            sock.sendall(CHUNK_ANNOUNCE + CHUNK_ENTRY.pack(digest, len(data)))
+            pending.append(data)
+            waiting += len(data)
+            while waiting > DEDUP_WINDOW:
+                data = pending.popleft()
+                waiting -= len(data)
+                if self._send_requested_chunk(sock, data, pbar, stage, flow, link):
+                    sent += len(data)
+                    method = CODEC if stage is not None and not stage.passthrough else 'copy'
+        
+        sock.sendall(CHUNK_END)
+        while pending:
+            data = pending.popleft()
+            if self._send_requested_chunk(sock, data, pbar, stage, flow, link):
+                sent += len(data)
+                method = CODEC if stage is not None and not stage.passthrough else 'copy'
+        return sent, method
+    
+    def _send_requested_chunk(self, sock: socket.socket, data: bytes, pbar=None, stage: CompressionStage = None,
+                              flow: Flow = None, link: LinkProbe = None) -> bool:
+        """
+        Lire la réponse du destinataire à l'annonce d'un bloc et l'envoyer s'il est demandé
+        
+        Returns:
+            True si le bloc a été envoyé
+        """
+        reply = self._recv_exact(sock, 1)
+        if reply not in (CHUNK_NEEDED, CHUNK_PRESENT):
+            raise Exception("Réponse inattendue du destinataire")
+        
+        if reply == CHUNK_NEEDED:
+            sock.sendall(CHUNK_DATA)
+            if stage is not None and not stage.passthrough and not stage.level:
+                sock.sendall(stage.end_frames())  # Compression abandonnée: la suite part brute
+            if stage is not None and not stage.passthrough:
+                frame = stage.encode(data)
+            else:
+                frame = data
+                if stage is not None:
+                    stage.passed(len(data))
+            sock.sendall(frame)
+            if flow is not None:
+                flow.throttle(len(frame))
+            if link is not None:
+                link.sent(len(frame))
+        
+        if pbar is not None:
+            pbar.update(len(data))
+        return reply == CHUNK_NEEDED
+    
+    @staticmethod
+    def _recv_done(sock: socket.socket):
+        """
+        Attendre la confirmation finale du destinataire
+        
+        Raises:
+            ChecksumMismatch: Le destinataire a reçu un fichier corrompu
+            TransferInterrupted: Pas de confirmation (reprise possible)
+        """
+        reply = sock.recv(BUFFER_SIZE)
+        if reply == CHECKSUM_MISMATCH:
+            raise ChecksumMismatch("checksum invalide chez le destinataire")
+        if reply != b'DONE':
+            raise TransferInterrupted("réception non confirmée")
+    
+    def _recv_ready(self, sock: socket.socket):
+        """
+        Attendre l'accord du destinataire avant d'envoyer les blocs
+        
+        Raises:
+            TransferInterrupted: Réception précédente encore en cours
+        """
+        status = self._recv_exact(sock, 2)
+        if status == b'BU':
+            raise TransferInterrupted("réception précédente encore en cours")
+        if status != b'OK':
+            raise Exception("ACK non reçu")
+    
+    def _send_multi(self, filepath: str, filename: str, filesize: int, peer_ip: str, peer_port: int,
+                    streams: int, key: str, file_id: int = None, flow: Flow = None) -> TransferResult:
+        """
+        Envoyer (ou reprendre) un fichier sur plusieurs connexions parallèles
+        
+        Le nombre de flux et les plages manquantes sont négociés sur une
+        connexion de contrôle, puis chaque plage part sur sa propre connexion.
+        
+        Returns:
+            Résultat du transfert (enregistré dans l'historique)
+        """
+        tid = uuid.uuid4().hex
+        with socket.create_connection((peer_ip, peer_port)) as control:
+            enable_keepalive(control)
+            control.sendall(encode_transfer_header(filename, filesize, TRANSFER_MULTI,
+                                                   streams=streams, tid=tid, resume=key, file_id=file_id))
+            reply = control.recv(BUFFER_SIZE).decode('utf-8').split('|')
+            if reply[0] == 'BUSY':
+                raise TransferInterrupted("réception précédente encore en cours")
+            if reply[0] != 'OK':
+                raise Exception("ACK non reçu")
+            streams = int(reply[1])
+            missing = parse_ranges(reply[2])
+            remaining = sum(length for _, length in missing)
+            pieces = split_ranges(filesize, streams, missing)
+            
+            print(f"\nEnvoi: {filename} vers {peer_ip}:{peer_port} ({streams} flux)")
+            if remaining < filesize:
+                print(f"  Reprise: {format_size(filesize - remaining)} déjà reçus")
+            result = TransferResult(name=filename, peer=peer_ip, direction='send',
+                                    size=filesize, streams=streams, priority=flow.priority if flow else '')
+            methods = []
+            errors = []
+            start = time.monotonic()
+            
+            with self.progress.track(filename, peer_ip, 'send', filesize, filesize - remaining) as progress:
+                
+                def send_pieces():
+                    while pieces and not errors:
+                        try:
+                            offset, length = pieces.pop(0)
+                        except IndexError:
+                            return
+                        try:
+                            with socket.create_connection((peer_ip, peer_port)) as sock:
+                                enable_keepalive(sock)
+                                sock.sendall(encode_transfer_header(filename, filesize, TRANSFER_RANGE,
+                                                                    tid=tid, offset=offset, length=length))
+                                if sock.recv(BUFFER_SIZE) != b'OK':
+                                    raise TransferInterrupted("plage refusée")
+                                with open(filepath, 'rb', buffering=0) as f, \
+                                        self.tuner.probe(peer_ip, sock) as link, corked(sock):
+                                    methods.append(self._send_range(sock, f, offset, length, progress,
+                                                                    flow=flow, link=link))
+                        except Exception as e:
+                            errors.append(e)
+                
+                threads = [threading.Thread(target=send_pieces, daemon=True) for _ in range(streams)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            
+            status = control.recv(BUFFER_SIZE)
+            result.elapsed = time.monotonic() - start
+            result.method = methods[0] if methods else ''
+            if errors:
+                raise errors[0]
+            if status == CHECKSUM_MISMATCH:
+                raise ChecksumMismatch("checksum invalide chez le destinataire")
+            if status != b'DONE':
+                raise TransferInterrupted("réception incomplète")
+        
+        result.transferred = remaining
+        result.success = True
+        print(f"[OK] Fichier envoyé avec succès ({result.method}, {streams} flux)")
+        return self._record(result)
+    
+    def send_file_relay(self, filepath: str, recipients: List[Dict], degree: int = RELAY_DEGREE,
+                        on_complete=None, file_id: int = None, priority: str = None,
+                        cancel: threading.Event = None) -> Dict[str, TransferResult]:
+        """
+        Diffuser un fichier en faisant relayer les destinataires
+        
+        L'expéditeur n'envoie qu'à `degree` voisins directs; chacun écrit les
+        blocs reçus et les transmet aussitôt à son propre sous-arbre
+        (degree=1: chaîne). Le temps de diffusion ne dépend plus du débit
+        montant de l'expéditeur.
+        
+        Args:
+            filepath: Chemin du fichier à envoyer
+            recipients: Destinataires ({'name', 'ip_address', 'port'})
+            degree: Nombre de voisins directs de chaque nœud
+            on_complete: Fonction appelée pour chaque destinataire (recipient, result)
+            priority: Classe de priorité (défaut: d'après la taille)
+            cancel: Événement levé pour annuler la diffusion
+        
+        Returns:
+            Résultat par nom de destinataire
+        """
+        filename = os.path.basename(filepath)
+        filesize = os.path.getsize(filepath)
+        priority = priority or classify(filesize)
+        children = self._open_relay_children(filename, filesize, recipients, degree, file_id)
+        
+        print(f"\nEnvoi relayé: {filename} vers {len(recipients)} PC "
+              f"({len(children)} voisins directs, degré {degree})")
+        sent = 0
+        start = time.monotonic()
+        
+        # Plusieurs voisins directs: seule la limite globale s'applique
+        with open(filepath, 'rb', buffering=0) as f, self.shaper.flow(None, priority, cancel) as flow:
+            buffer = self._get_buffer()
+            with self.progress.track(filename, f"{len(recipients)} PC", 'send', filesize) as pbar:
+                while sent < filesize and any(child.alive for child in children):
+                    n = f.readinto(buffer[:min(len(buffer), filesize - sent)])
+                    if not n:
+                        break
+                    self._forward(children, buffer[:n])
+                    sent += n
+                    pbar.update(n)
+                    try:
+                        flow.throttle(n * sum(1 for child in children if child.alive))
+                    except TransferCancelled:
+                        print("\n[!] Diffusion relayée annulée")
+                        break
+        
+        if sent < filesize:
+            self._close_relay_children(children)
+        statuses = self._collect_relay_status(children)
+        elapsed = time.monotonic() - start
+        
+        results = {}
+        for recipient in recipients:
+            success = statuses.get(recipient['name'], False)
+            result = self._record(TransferResult(
+                name=filename, peer=recipient['ip_address'], direction='send', size=filesize,
+                transferred=filesize if success else 0, method='relay', elapsed=elapsed, success=success,
+                priority=priority))
+            results[recipient['name']] = result
+            if on_complete:
+                on_complete(recipient, result)
+        
+        ok = sum(1 for result in results.values() if result)
+        print(f"[OK] Diffusion relayée terminée: {ok}/{len(recipients)} PC")
+        return results
+    
+    def send_file_fanout(self, filepath: str, recipients: List[Dict], max_parallel: int = FANOUT_PARALLEL,
+                         on_complete=None, file_id: int = None, priority: str = None,
+                         cancel: threading.Event = None) -> Dict[str, TransferResult]:
+        """
+        Envoyer un fichier à plusieurs PC en même temps
+        
+        Les `max_parallel` premiers destinataires partagent une seule lecture
+        du fichier (FanOutReader); les suivants démarrent dès qu'un envoi se
+        termine, depuis le cache disque. Un destinataire en échec est repris
+        avec send_file (reprise automatique).
+        
+        Args:
+            filepath: Chemin du fichier à envoyer
+            recipients: Destinataires ({'name', 'ip_address', 'port'})
+            max_parallel: Nombre d'envois simultanés
+            on_complete: Fonction appelée à chaque fin d'envoi (recipient, result)
+            file_id: ID du fichier sur le serveur (chaque destinataire vérifie son checksum)
+            priority: Classe de priorité (défaut: d'après la taille)
+            cancel: Événement levé pour annuler les envois
+        
+        Returns:
+            Résultat par nom de destinataire
+        """
+        filename = os.path.basename(filepath)
+        filesize = os.path.getsize(filepath)
+        key = resume_key(filepath)
+        priority = priority or classify(filesize)
+        
+        pending = list(recipients)
+        cohort = pending[:max(1, max_parallel)]
+        del pending[:len(cohort)]
+        reader = FanOutReader(filepath, filesize, expected=len(cohort))
+        reader.start()
+        
+        results = {}
+        lock = threading.Lock()
+        print(f"\nEnvoi: {filename} vers {len(recipients)} PC ({len(cohort)} en parallèle)")
+        
+        with self.progress.track(filename, f"{len(recipients)} PC", 'send', filesize * len(recipients)) as progress:
             
-            with open(filepath, 'rb') as f:
-                with tqdm(total=filesize, unit='B', unit_scale=True, unit_divisor=1024,
-                         desc=filename[:30], ncols=80) as pbar:
+            def finish(recipient: Dict, result: TransferResult):
+                with lock:
+                    results[recipient['name']] = result
+                if on_complete:
+                    on_complete(recipient, result)
+            
+            def worker(first: Dict):
+                finish(first, self._send_fanout_member(reader, filepath, filename, filesize,
+                                                      first, key, progress, file_id, priority, cancel))
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        recipient = pending.pop(0)
+                    result = self.send_file(filepath, recipient['ip_address'], recipient['port'], file_id=file_id,
+                                            priority=priority, cancel=cancel)
+                    progress.update(filesize)
+                    finish(recipient, result)
+            
+            threads = [threading.Thread(target=worker, args=(r,), daemon=True) for r in cohort]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        print(f"[OK] Diffusion terminée: {reader.blocks_read} blocs lus pour {len(recipients)} PC")
+        return results
+    
+    def _send_fanout_member(self, reader: FanOutReader, filepath: str, filename: str, filesize: int,
+                            recipient: Dict, key: str, progress: Progress,
+                            file_id: int = None, priority: str = PRIORITY_NORMAL,
+                            cancel: threading.Event = None) -> TransferResult:
+        """
+        Envoyer le fichier à un destinataire du groupe partageant la lecture
+        
+        Returns:
+            Résultat du transfert (enregistré dans l'historique)
+        """
+        peer_ip = recipient['ip_address']
+        peer_port = recipient['port']
+        result = TransferResult(name=filename, peer=peer_ip, direction='send', size=filesize, priority=priority)
+        subscriber = None
+        declined = False
+        sent = 0
+        start = time.monotonic()
+        
+        try:
+            with socket.create_connection((peer_ip, peer_port)) as sock, \
+                    self.shaper.flow(peer_ip, priority, cancel) as flow, \
+                    self.tuner.probe(peer_ip, sock) as link:
+                enable_keepalive(sock)
+                sock.send(encode_transfer_header(filename, filesize, TRANSFER_FILE, resume=key, file_id=file_id))
+                
+                status, _, ranges = sock.recv(BUFFER_SIZE).decode('utf-8').partition('|')
+                if status == 'BUSY':
+                    raise TransferInterrupted("réception précédente encore en cours")
+                if status != 'OK':
+                    raise Exception("ACK non reçu")
+                ranges = parse_ranges(ranges)
+                
+                # Une reprise partielle ne peut pas suivre la lecture partagée
+                if ranges == [(0, filesize)]:
+                    subscriber = reader.attach(recipient['name'])
+                else:
+                    reader.decline()
+                    declined = True
+                    ranges_sent = sum(length for _, length in ranges)
+                    progress.update(filesize - ranges_sent)
+                    with open(filepath, 'rb', buffering=0) as f:
+                        for offset, length in ranges:
+                            result.method = self._send_range(sock, f, offset, length, progress, flow=flow,
+                                                             link=link)
+                    sent = ranges_sent
+                
+                if subscriber:
+                    result.method = 'fanout'
                     while sent < filesize:
-                        chunk = f.read(CHUNK_SIZE)
-                        if not chunk:
+                        block = reader.next_block(subscriber)
+                        if block is None:
                             break
-                        sock.sendall(chunk)
-                        sent += len(chunk)
-                        pbar.update(len(chunk))
-            
-            print(f"[OK] Fichier envoyé avec succès")
-            sock.close()
-            return True
+                        sock.sendall(block[1])
+                        sent += len(block[1])
+                        progress.update(len(block[1]))
+                        flow.throttle(len(block[1]))
+                        link.sent(len(block[1]))
+                    reader.close(subscriber)
+                    
+                    # Décroché (trop lent): la suite est lue depuis le disque
+                    if sent < filesize:
+                        with open(filepath, 'rb', buffering=0) as f:
+                            result.method = 'fanout+' + self._send_range(sock, f, sent, filesize - sent, progress,
+                                                                         flow=flow, link=link)
+                        sent = filesize
+                
+                self._recv_done(sock)
             
+            result.elapsed = time.monotonic() - start
+            result.transferred = sent
+            result.success = True
+            return self._record(result)
+        
         except Exception as e:
-            print(f"\n[X] Erreur envoi: {e}")
-            return False
+            if subscriber:
+                reader.close(subscriber)
+            elif not declined:
+                reader.decline()
+            progress.update(filesize - sent)
+            if isinstance(e, (ChecksumMismatch, TransferCancelled)):
+                print(f"\n[X] Envoi vers {recipient['name']}: {e}")
+                result.transferred = sent
+                return self._record(result)
+            print(f"\n[!] Envoi vers {recipient['name']} interrompu ({e}), reprise individuelle")
+            return self.send_file(filepath, peer_ip, peer_port, file_id=file_id, priority=priority, cancel=cancel)
+    
+    def _send_payload(self, sock: socket.socket, path: str, name: str, size: int, peer: str,
+                      ranges: List[Tuple[int, int]] = None, stage: CompressionStage = None,
+                      flow: Flow = None) -> TransferResult:
+        """
+        Envoyer le contenu d'un fichier sur une socket déjà négociée
+        
+        Args:
+            sock: Socket connectée au destinataire
+            path: Fichier à envoyer
+            name: Nom affiché
+            size: Taille du fichier
+            peer: Adresse du destinataire (pour les statistiques)
+            ranges: Plages (offset, longueur) à envoyer (tout le fichier par défaut)
+            stage: Étage de compression annoncé dans l'en-tête
+            flow: Envoi déclaré au TrafficShaper (limites de débit)
+            
+        Returns:
+            Résultat du transfert
+        """
+        if ranges is None:
+            ranges = [(0, size)]
+        remaining = sum(length for _, length in ranges)
+        
+        result = TransferResult(name=name, peer=peer, direction='send', size=size,
+                                priority=flow.priority if flow else '')
+        start = time.monotonic()
+        with open(path, 'rb', buffering=0) as f, self.tuner.probe(peer, sock) as link, corked(sock):
+            with self.progress.track(name, peer, 'send', size, size - remaining) as pbar:
+                for offset, length in ranges:
+                    result.method = self._send_range(sock, f, offset, length, pbar, stage, flow, link)
+        result.elapsed = time.monotonic() - start
+        result.transferred = remaining
+        result.success = True
+        return result.add_compression(stage)
+    
+    def _link_rate(self, peer: str) -> Optional[float]:
+        """
+        Débit réseau du dernier envoi réussi vers un PC
+        
+        Args:
+            peer: Adresse du destinataire
+        
+        Returns:
+            Octets/seconde sur le réseau, ou None si aucun envoi mesurable
+        """
+        with self._history_lock:
+            for result in reversed(self.history):
+                if result.peer == peer and result.direction == 'send' and result.success and result.link_rate:
+                    return result.link_rate
+        return None
+    
+    def _compression_stage(self, peer: str, size: int) -> Optional[CompressionStage]:
+        """
+        Étage de compression d'un envoi (None si la compression ne paierait pas)
+        
+        Le niveau est choisi d'après le débit déjà mesuré vers ce PC et la
+        charge du processeur: sur un lien rapide, les octets partent bruts
+        par sendfile.
+        
+        Args:
+            peer: Adresse du destinataire
+            size: Octets à envoyer
+        """
+        if not self.compress or size < COMPRESS_MIN_SIZE:
+            return None
+        level = choose_level(self._link_rate(peer))
+        return CompressionStage(level) if level else None
     
-    def send_folder(self, folder_path: str, peer_ip: str, peer_port: int) -> bool:
+    def send_folder(self, folder_path: str, peer_ip: str, peer_port: int,
+                    total_size: int = 0, priority: str = None, cancel: threading.Event = None) -> TransferResult:
         """
-        Envoyer un dossier complet à un PC (compression automatique)
+        Envoyer un dossier complet à un PC
+        
+        Les entrées sont produites au fil du parcours du dossier et envoyées
+        directement (sans archive temporaire). Avec la déduplication, les
+        blocs de chaque fichier sont annoncés au fil de sa lecture et seuls
+        ceux que le destinataire ne possède pas sont envoyés.
         
         Args:
             folder_path: Chemin du dossier à envoyer
             peer_ip: IP du destinataire
             peer_port: Port du destinataire
+            total_size: Taille totale des fichiers (pour la progression, optionnel)
+            priority: Classe de priorité (défaut: d'après la taille totale, normal si inconnue)
+            cancel: Événement levé pour annuler l'envoi
             
         Returns:
-            True si succès, False sinon
+            Résultat du transfert (vrai si succès)
         """
         if not os.path.exists(folder_path) or not os.path.isdir(folder_path):
             print(f"[X] Dossier non trouvé: {folder_path}")
             return False
         
-        folder_name = os.path.basename(folder_path)
+        folder_name = os.path.basename(os.path.normpath(folder_path))
+        priority = priority or (classify(total_size) if total_size else PRIORITY_NORMAL)
+        result = TransferResult(name=folder_name, peer=peer_ip, direction='send', size=total_size,
+                                priority=priority)
+        
+        stage = self._compression_stage(peer_ip, total_size or COMPRESS_MIN_SIZE)
+        compress = stage and CODEC
         
         try:
-            # Créer un fichier zip temporaire
-            with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp_file:
-                zip_path = tmp_file.name
-            
-            print(f"\nCompression du dossier '{folder_name}'...")
-            
-            # Compresser le dossier
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(folder_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, os.path.dirname(folder_path))
-                        zipf.write(file_path, arcname)
-            
-            zip_size = os.path.getsize(zip_path)
-            print(f"[OK] Compression terminée: {format_size(zip_size)}")
-            
-            # Envoyer le zip
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect((peer_ip, peer_port))
-                
-                # Envoyer métadonnées (inclure flag 'folder')
-                metadata = f"{folder_name}.zip|{zip_size}|folder".encode('utf-8')
-                sock.send(metadata)
+            with self._session(peer_ip, peer_port) as sock, self.shaper.flow(peer_ip, priority, cancel) as flow:
+                sock.send(encode_transfer_header(folder_name, total_size, TRANSFER_TREE, compress=compress,
+                                                 session=1))
                 
                 # Attendre ACK
                 ack = sock.recv(BUFFER_SIZE)
                 if ack != b'OK':
                     raise Exception("ACK non reçu")
                 
-                # Envoyer le fichier zip avec barre de progression
-                sent = 0
+                # Envoyer les entrées au fil du parcours (les annonces de blocs
+                # attendent une réponse: pas de regroupement des écritures)
                 print(f"\nEnvoi dossier: {folder_name} vers {peer_ip}:{peer_port}")
+                start = time.monotonic()
                 
-                with open(zip_path, 'rb') as f:
-                    with tqdm(total=zip_size, unit='B', unit_scale=True, unit_divisor=1024,
-                             desc=folder_name[:30], ncols=80) as pbar:
-                        while sent < zip_size:
-                            chunk = f.read(CHUNK_SIZE)
-                            if not chunk:
-                                break
-                            sock.sendall(chunk)
-                            sent += len(chunk)
-                            pbar.update(len(chunk))
-                
-                print(f"[OK] Dossier envoyé avec succès")
-                sock.close()
-                return True
+                with self.progress.track(folder_name, peer_ip, 'send', total_size) as pbar, \
+                        self.tuner.probe(peer_ip, sock) as link, (nullcontext() if self.dedup else corked(sock)):
+                    for entry_type, rel_path, path, size in walk_tree(folder_path):
+                        if entry_type == ENTRY_FILE and self.dedup and size >= DEDUP_MIN_SIZE:
+                            sock.sendall(encode_tree_entry(ENTRY_CHUNKS, rel_path, size))
+                            with open(path, 'rb', buffering=0) as f:
+                                sent, method = self._send_chunk_stream(sock, f, pbar, stage, flow, link)
+                            result.method = method or result.method
+                            result.transferred += sent
+                            continue
+                        
+                        sock.sendall(encode_tree_entry(entry_type, rel_path, size))
+                        if entry_type == ENTRY_FILE:
+                            with open(path, 'rb', buffering=0) as f:
+                                result.method = self._send_range(sock, f, 0, size, pbar, stage, flow, link)
+                            result.transferred += size
+                    sock.sendall(encode_tree_entry(ENTRY_END))
                 
-            finally:
-                # Supprimer le fichier zip temporaire
-                if os.path.exists(zip_path):
-                    os.remove(zip_path)
+                if sock.recv(BUFFER_SIZE) != b'DONE':
+                    raise TransferInterrupted("réception non confirmée")
+                result.elapsed = time.monotonic() - start
+                result.add_compression(stage)
+            
+            if self.dedup:
+                result.method = f"dedup+{result.method}" if result.method else 'dedup'
+            result.success = True
+            print(f"[OK] Dossier envoyé avec succès ({result.method or 'vide'})")
             
         except Exception as e:
             print(f"\n[X] Erreur envoi dossier: {e}")
-            return False
+        
+        return self._record(result)
     
     def list_received_files(self) -> list:
         """
@@ -296,6 +2856,10 @@ class FileTransfer:
         try:
             items = []
             for item_name in os.listdir(self.storage_dir):
+                # Ignorer les réceptions en cours et le magasin de blocs
+                if item_name.endswith((PART_SUFFIX, JOURNAL_SUFFIX)) or item_name.startswith('.'):
+                    continue
+                
                 item_path = os.path.join(self.storage_dir, item_name)
                 
                 if os.path.isfile(item_path):
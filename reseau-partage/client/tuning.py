@@ -0,0 +1,296 @@
+"""
+Réglage des connexions par PC
+
+Pendant les premières secondes d'un envoi, le débit et le temps
+d'aller-retour (RTT, lu dans TCP_INFO) sont mesurés. On en déduit la
+taille des blocs envoyés (environ CHUNK_TIME de débit: petits blocs sur
+un lien lent pour que limites et annulations réagissent vite, gros blocs
+sur un lien rapide pour moins d'appels système) et le tampon d'envoi
+(deux fois le produit débit x RTT). Les réglages sont gardés par PC:
+l'envoi suivant démarre directement avec eux.
+
+Le tampon d'envoi n'est jamais réduit: le fixer désactive l'ajustement
+automatique du noyau, on ne le fait donc que pour dépasser sa valeur
+actuelle, dans la limite autorisée par le système.
+"""
+
+import os
+import socket
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.protocol import CHUNK_SIZE
+
+
+# Base des réglages, dans le dossier de stockage du client
+LINKS_FILE = '.links.db'
+
+# Durée de la mesure au début d'un envoi (secondes)
+PROBE_SECONDS = 2.0
+
+# Octets min pour mesurer un envoi plus court que PROBE_SECONDS
+PROBE_MIN_BYTES = 4 * 1024 * 1024
+
+# Durée d'envoi visée pour un bloc (secondes) et bornes de la taille des blocs
+CHUNK_TIME = 0.05
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Tampon d'envoi max demandé (octets)
+MAX_SEND_BUFFER = 16 * 1024 * 1024
+
+# Réglages plus anciens ignorés (secondes)
+LINK_MAX_AGE = 7 * 24 * 3600
+
+# Position de tcpi_rtt (microsecondes) dans struct tcp_info (Linux)
+TCP_INFO_RTT_OFFSET = 68
+TCP_INFO_SIZE = 104
+
+
+@dataclass
+class LinkParams:
+    """Réglages retenus pour un PC"""
+    chunk_size: int = CHUNK_SIZE
+    send_buffer: int = 0  # 0: valeur du noyau
+    rtt: float = 0.0  # Secondes (0: inconnu)
+    rate: float = 0.0  # Octets/s mesurés
+    updated: float = 0.0
+
+
+def tcp_rtt(sock: socket.socket) -> Optional[float]:
+    """
+    RTT lissé d'une connexion TCP
+    
+    Returns:
+        Secondes, ou None si le système ne le fournit pas
+    """
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SIZE)
+    except OSError:
+        return None
+    if len(info) < TCP_INFO_RTT_OFFSET + 4:
+        return None
+    rtt = struct.unpack_from('I', info, TCP_INFO_RTT_OFFSET)[0]
+    return rtt / 1e6 if rtt else None
+
+
+def _system_buffer_limit() -> Optional[int]:
+    """Tampon max accepté par le noyau pour SO_SNDBUF (None: inconnu)"""
+    try:
+        with open('/proc/sys/net/core/wmem_max') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def raise_send_buffer(sock: socket.socket, size: int) -> int:
+    """
+    Agrandir le tampon d'envoi d'une socket (jamais le réduire)
+    
+    Args:
+        sock: Socket connectée
+        size: Taille souhaitée en octets
+    
+    Returns:
+        Taille du tampon après l'appel
+    """
+    try:
+        current = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        limit = _system_buffer_limit()
+        if limit is not None:
+            size = min(size, limit)
+        if size > current:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+            current = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        return current
+    except OSError:
+        return 0
+
+
+def set_nodelay(sock: socket.socket):
+    """Envoyer les petits messages (en-têtes, réponses) sans attendre (pas d'algorithme de Nagle)"""
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass
+
+
+@contextmanager
+def corked(sock: socket.socket):
+    """
+    Regrouper les écritures en segments pleins (TCP_CORK, Linux)
+    
+    À utiliser autour d'un envoi de données: les en-têtes d'entrée et
+    fins de blocs partent avec les données suivantes, le reste est
+    envoyé à la sortie du bloc `with`.
+    """
+    cork = getattr(socket, 'TCP_CORK', None)
+    if cork is not None:
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, cork, 1)
+        except OSError:
+            cork = None
+    try:
+        yield sock
+    finally:
+        if cork is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, cork, 0)
+            except OSError:
+                pass
+
+
+class LinkProbe:
+    """Mesure d'un envoi sur une connexion (gestionnaire de contexte)"""
+    
+    def __init__(self, tuner: 'LinkTuner', peer: str, sock: socket.socket, params: LinkParams):
+        """
+        Args:
+            tuner: Réglages par PC
+            peer: Adresse du destinataire
+            sock: Connexion mesurée
+            params: Réglages de départ
+        """
+        self.tuner = tuner
+        self.peer = peer
+        self.sock = sock
+        self.chunk_size = params.chunk_size
+        self.bytes = 0
+        self.start = time.monotonic()
+        self.measured = False
+    
+    def __enter__(self) -> 'LinkProbe':
+        return self
+    
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None and not self.measured and self.bytes >= PROBE_MIN_BYTES:
+            self._measure()
+    
+    def sent(self, n: int):
+        """Compter `n` octets envoyés (appelée après chaque bloc)"""
+        self.bytes += n
+        if not self.measured and time.monotonic() - self.start >= PROBE_SECONDS:
+            self._measure()
+    
+    def _measure(self):
+        """Calculer les réglages, les appliquer à la connexion et les retenir"""
+        self.measured = True
+        elapsed = time.monotonic() - self.start
+        if elapsed <= 0 or not self.bytes:
+            return
+        params = self.tuner.update(self.peer, self.bytes / elapsed, tcp_rtt(self.sock))
+        self.chunk_size = params.chunk_size
+        if params.send_buffer:
+            raise_send_buffer(self.sock, params.send_buffer)
+
+
+class LinkTuner:
+    """Réglages des connexions mesurés et retenus par PC"""
+    
+    def __init__(self, db_path: str):
+        """
+        Ouvrir (ou créer) la base des réglages
+        
+        Args:
+            db_path: Chemin du fichier SQLite
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.links: Dict[str, LinkParams] = {}
+        self.init_database()
+    
+    def get_connection(self):
+        """Obtenir une connexion à la base"""
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def init_database(self):
+        """Créer la table si elle n'existe pas et charger les réglages récents"""
+        try:
+            conn = self.get_connection()
+            try:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS links (
+                        peer TEXT PRIMARY KEY,
+                        chunk_size INTEGER NOT NULL,
+                        send_buffer INTEGER NOT NULL,
+                        rtt REAL NOT NULL,
+                        rate REAL NOT NULL,
+                        updated REAL NOT NULL
+                    )
+                """)
+                conn.commit()
+                rows = conn.execute("SELECT * FROM links WHERE updated > ?",
+                                    (time.time() - LINK_MAX_AGE,)).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"[!] Réglages des connexions indisponibles: {e}")
+            return
+        self.links = {row[0]: LinkParams(*row[1:]) for row in rows}
+    
+    def get(self, peer: str) -> LinkParams:
+        """Réglages retenus pour un PC (valeurs par défaut s'il n'a jamais été mesuré)"""
+        with self.lock:
+            return self.links.get(peer) or LinkParams()
+    
+    def probe(self, peer: str, sock: socket.socket) -> LinkProbe:
+        """
+        Préparer une connexion vers un PC et mesurer l'envoi (à utiliser avec `with`)
+        
+        Les réglages retenus sont appliqués aussitôt à la connexion.
+        
+        Args:
+            peer: Adresse du destinataire
+            sock: Connexion établie
+        """
+        params = self.get(peer)
+        set_nodelay(sock)
+        if params.send_buffer:
+            raise_send_buffer(sock, params.send_buffer)
+        return LinkProbe(self, peer, sock, params)
+    
+    def update(self, peer: str, rate: float, rtt: Optional[float]) -> LinkParams:
+        """
+        Calculer et retenir les réglages d'après une mesure
+        
+        Args:
+            peer: Adresse du destinataire
+            rate: Débit mesuré en octets/s
+            rtt: Temps d'aller-retour en secondes (None: inconnu)
+        
+        Returns:
+            Nouveaux réglages
+        """
+        chunk_size = MIN_CHUNK_SIZE
+        while chunk_size * 2 <= min(rate * CHUNK_TIME, MAX_CHUNK_SIZE):
+            chunk_size *= 2
+        
+        with self.lock:
+            previous = self.links.get(peer) or LinkParams()
+            send_buffer = previous.send_buffer
+            if rtt:
+                send_buffer = max(send_buffer, min(int(2 * rate * rtt), MAX_SEND_BUFFER))
+            params = LinkParams(chunk_size, send_buffer, rtt or previous.rtt, rate, time.time())
+            self.links[peer] = params
+            try:
+                conn = self.get_connection()
+                try:
+                    conn.execute("INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?)",
+                                 (peer, params.chunk_size, params.send_buffer, params.rtt, params.rate,
+                                  params.updated))
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"[!] Réglages de {peer} non enregistrés: {e}")
+        return params
@@ -2,8 +2,15 @@
 Interface utilisateur en ligne de commande
 """
 
-from typing import List
+from typing import List, Optional
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from client.fanout import FANOUT_PARALLEL
+from client.shaping import PRIORITIES
+from shared.utils import parse_size
 
 
 class CLI:
@@ -28,10 +35,23 @@ class CLI:
         """Afficher l'aide"""
         print("\nCOMMANDES DISPONIBLES:\n")
         print("  list                    - Voir les PC connectés")
-        print("  send <chemin> <dest>    - Envoyer un fichier ou dossier")
+        print("  send <chemin> <dest>    - Envoyer un fichier ou dossier (en arrière-plan)")
         print("                            dest = PC1, PC2, ... ou * (tous)")
+        print("     options: -s N / --streams N  - N connexions parallèles par fichier")
+        print("              -p N / --parallel N - N destinataires servis en même temps")
+        print("              -r N / --relay N    - Diffusion relayée (N voisins par PC, 1 = chaîne)")
+        print("              -P C / --priority C - Priorité: interactive, normal ou bulk")
+        print("                                    (défaut: d'après la taille)")
+        print("  jobs                    - Voir la file des envois")
+        print("  cancel <id>             - Annuler un envoi de la file")
+        print("  retry <id>              - Relancer un envoi en échec ou annulé")
         print("  received                - Voir les fichiers/dossiers reçus")
         print("  status                  - Statut du serveur")
+        print("  stats                   - Statistiques des derniers transferts")
+        print("  progress                - Progression des transferts en cours")
+        print("  latency                 - Latence des appels au serveur")
+        print("  limit [PC] <débit|off>  - Limiter le débit montant (tous les envois ou vers un PC)")
+        print("  qos                     - Limites et débit mesuré par priorité")
         print("  help                    - Afficher cette aide")
         print("  quit                    - Quitter\n")
         print("EXEMPLES:\n")
@@ -39,6 +59,12 @@ class CLI:
         print("  send /home/user/photos PC3   -> Envoyer dossier à PC3")
         print("  send image.png PC2 PC3       -> Envoyer à PC2 et PC3")
         print("  send projet/ *               -> Envoyer dossier à tous")
+        print("  send image.iso PC2 -s 4      -> Envoyer sur 4 connexions parallèles")
+        print("  send image.iso * -r 2        -> Diffuser à tous en arbre relayé")
+        print("  send sauvegarde/ PC2 -P bulk -> Envoyer en priorité basse")
+        print("  cancel 3                     -> Annuler l'envoi n°3")
+        print("  limit 5M                     -> Envois limités à 5 MB/s au total")
+        print("  limit PC2 500K               -> Envois vers PC2 limités à 500 KB/s")
         print()
     
     def show_peers(self, peers: List[dict]):
@@ -104,6 +130,150 @@ class CLI:
         print(f"  PC en ligne: {status.get('peers_online', 0)}")
         print()
     
+    def show_transfer_stats(self, stats: List[dict]):
+        """
+        Afficher les statistiques des transferts
+        
+        Args:
+            stats: Liste des transferts (voir FileTransfer.get_stats)
+        """
+        if not stats:
+            print("\nAucun transfert effectué")
+            return
+        
+        from shared.utils import format_size
+        
+        print(f"\nDERNIERS TRANSFERTS ({len(stats)}):\n")
+        print(f"{'Sens':<8} {'Nom':<25} {'PC':<16} {'Taille':<11} {'Débit':<13} {'Méthode':<10} "
+              f"{'Compression':<13} {'Statut':<6}")
+        print("-" * 107)
+        
+        for stat in stats:
+            direction = "Envoi" if stat['direction'] == 'send' else "Récep."
+            speed = f"{format_size(stat['throughput'])}/s"
+            status = "OK" if stat['success'] else "Échec"
+            method = stat['method'] or '-'
+            if stat['streams'] > 1:
+                method += f" x{stat['streams']}"
+            # Taille sur le réseau et temps CPU de (dé)compression
+            compression = f"{stat['ratio']:.0%} {stat['cpu_time']:.1f}s" if stat['compression'] else '-'
+            print(f"{direction:<8} {stat['name'][:24]:<25} {stat['peer']:<16} "
+                  f"{format_size(stat['transferred']):<11} {speed:<13} {method:<10} {compression:<13} {status:<6}")
+        
+        print()
+    
+    def show_progress(self, transfers: List[dict]):
+        """
+        Afficher la progression des transferts en cours
+        
+        Args:
+            transfers: Mesures par transfert (voir FileTransfer.get_progress)
+        """
+        if not transfers:
+            print("\nAucun transfert en cours")
+            return
+        
+        from shared.utils import format_size
+        
+        print(f"\nTRANSFERTS EN COURS ({len(transfers)}):\n")
+        print(f"{'Sens':<8} {'Nom':<25} {'PC':<16} {'Avancement':<12} {'Débit':<13} {'Moyen':<13} {'Bloqué':<7}")
+        print("-" * 98)
+        
+        for stat in transfers:
+            direction = "Envoi" if stat['direction'] == 'send' else "Récep."
+            done = f"{stat['percent']:.0f}%" if stat['percent'] is not None else format_size(stat['bytes'])
+            print(f"{direction:<8} {stat['name'][:24]:<25} {stat['peer'][:15]:<16} {done:<12} "
+                  f"{format_size(stat['rate']) + '/s':<13} {format_size(stat['average']) + '/s':<13} "
+                  f"{stat['stalled']:.1f}s")
+        
+        print()
+    
+    def show_latency(self, endpoints: List[dict]):
+        """
+        Afficher la latence des appels au serveur
+        
+        Args:
+            endpoints: Mesures par endpoint (voir NetworkClient.get_latency_stats)
+        """
+        if not endpoints:
+            print("\nAucun appel au serveur")
+            return
+        
+        print(f"\nAPPELS AU SERVEUR ({len(endpoints)} endpoints):\n")
+        print(f"{'Endpoint':<28} {'Appels':>7} {'Erreurs':>8} {'Reprises':>9} {'Moyen':>9} {'Médian':>9} "
+              f"{'95%':>9} {'Max':>9}")
+        print("-" * 95)
+        
+        for stat in endpoints:
+            print(f"{stat['endpoint'][:27]:<28} {stat['calls']:>7} {stat['errors']:>8} {stat['retries']:>9} "
+                  f"{stat['avg_ms']:>7.1f}ms {stat['p50_ms']:>7.1f}ms {stat['p95_ms']:>7.1f}ms "
+                  f"{stat['max_ms']:>7.1f}ms")
+        
+        print()
+    
+    def show_jobs(self, jobs: list):
+        """
+        Afficher la file des envois
+        
+        Args:
+            jobs: Jobs (voir JobQueue.list_jobs)
+        """
+        if not jobs:
+            print("\nAucun envoi en file")
+            return
+        
+        labels = {'queued': 'En attente', 'running': 'En cours', 'done': 'Terminé',
+                  'failed': 'Échec', 'cancelled': 'Annulé'}
+        
+        print(f"\nENVOIS ({len(jobs)}):\n")
+        print(f"{'ID':<5} {'Statut':<11} {'Nom':<25} {'Destinataires':<20} {'Résultat':<30}")
+        print("-" * 95)
+        
+        for job in jobs:
+            name = os.path.basename(os.path.normpath(job.path))
+            recipients = ', '.join(job.recipients)
+            if job.error:
+                outcome = job.error
+            elif job.results:
+                ok = sum(1 for success in job.results.values() if success)
+                outcome = f"{ok}/{len(job.results)} réussis"
+            else:
+                outcome = '-'
+            print(f"{job.id:<5} {labels.get(job.status, job.status):<11} {name[:24]:<25} "
+                  f"{recipients[:19]:<20} {outcome[:30]:<30}")
+        
+        print()
+    
+    def show_qos(self, limits: dict, stats: dict, names: dict = None):
+        """
+        Afficher les limites de débit et les mesures par priorité
+        
+        Args:
+            limits: Limites (voir TrafficShaper.limits)
+            stats: Mesures par classe (voir TrafficShaper.stats)
+            names: Nom des PC par adresse IP
+        """
+        from shared.utils import format_size
+        
+        def rate(value: float) -> str:
+            return f"{format_size(value)}/s" if value else "illimité"
+        
+        names = names or {}
+        print("\nLIMITES DE DEBIT:\n")
+        print(f"  Global: {rate(limits['global'])}")
+        for ip, value in limits['peers'].items():
+            print(f"  {names.get(ip, ip)}: {rate(value)}")
+        
+        print(f"\n{'Priorité':<13} {'En cours':<10} {'Envoyé':<11} {'Débit':<13} {'Attente':<9}")
+        print("-" * 58)
+        for priority, stat in stats.items():
+            # Débit mesuré pendant que la classe avait des envois en cours
+            speed = f"{format_size(stat['throughput'])}/s" if stat['bytes'] else '-'
+            print(f"{priority:<13} {stat['active']:<10} {format_size(stat['bytes']):<11} {speed:<13} "
+                  f"{stat['waited']:.1f}s")
+        
+        print()
+    
     def prompt(self) -> str:
         """
         Afficher le prompt et lire la commande
@@ -124,30 +294,97 @@ class CLI:
             command: Commande complète
             
         Returns:
-            (filepath, recipients) ou (None, None) si erreur
+            (filepath, recipients, options) ou (None, None, None) si erreur
         """
         parts = command.split()
         
-        if len(parts) < 3:
-            print("[X] Usage: send <fichier/dossier> <destinataire(s)>")
+        # Extraire les options (-s N / --streams N / --streams=N, idem pour --parallel, --relay et --priority)
+        flags = {'-s': 'streams', '--streams': 'streams', '-p': 'parallel', '--parallel': 'parallel',
+                 '-r': 'relay', '--relay': 'relay', '-P': 'priority', '--priority': 'priority'}
+        options = {'streams': 1, 'parallel': FANOUT_PARALLEL, 'relay': 0, 'priority': None}
+        args = []
+        i = 0
+        while i < len(parts):
+            flag, has_value, value = parts[i].partition('=')
+            if flag in flags:
+                if not has_value:
+                    i += 1
+                    value = parts[i] if i < len(parts) else ''
+                if flags[flag] == 'priority':
+                    if value not in PRIORITIES:
+                        print(f"[X] {flag} attend une priorité: {', '.join(PRIORITIES)}")
+                        return None, None, None
+                    options['priority'] = value
+                elif not value.isdigit() or int(value) < 1:
+                    print(f"[X] {flag} attend un entier >= 1")
+                    return None, None, None
+                else:
+                    options[flags[flag]] = int(value)
+            else:
+                args.append(parts[i])
+            i += 1
+        
+        if len(args) < 3:
+            print("[X] Usage: send <fichier/dossier> <destinataire(s)> [-s N] [-p N] [-r N] [-P priorité]")
             print("   Exemples:")
             print("     send file.txt PC2")
             print("     send /home/user/photos PC3")
             print("     send file.txt PC2 PC3")
             print("     send projet/ *")
-            return None, None
+            print("     send image.iso PC2 -s 4")
+            return None, None, None
         
-        filepath = parts[1]
+        filepath = args[1]
         
         # Vérifier que le fichier/dossier existe
         if not os.path.exists(filepath):
             print(f"[X] Chemin non trouvé: {filepath}")
-            return None, None
+            return None, None, None
         
         # Récupérer les destinataires
-        recipients = parts[2:]
+        recipients = args[2:]
+        
+        return filepath, recipients, options
+    
+    def parse_job_id(self, command: str) -> Optional[int]:
+        """
+        Lire le numéro de job d'une commande cancel ou retry
+        
+        Args:
+            command: Commande complète (cancel <id>)
+        
+        Returns:
+            Numéro du job ou None si erreur
+        """
+        parts = command.split()
+        if len(parts) != 2 or not parts[1].lstrip('#').isdigit():
+            print(f"[X] Usage: {parts[0]} <id>   (voir 'jobs')")
+            return None
+        return int(parts[1].lstrip('#'))
+    
+    def parse_limit_command(self, command: str) -> tuple:
+        """
+        Parser une commande limit
+        
+        Args:
+            command: Commande complète (limit [PC] <débit|off>)
+        
+        Returns:
+            (nom du PC ou None pour la limite globale, débit en octets/s, 0 si off)
+            ou (None, None) si erreur
+        """
+        parts = command.split()
+        if len(parts) not in (2, 3):
+            print("[X] Usage: limit [PC] <débit|off>   (ex: limit 5M, limit PC2 500K, limit off)")
+            return None, None
         
-        return filepath, recipients
+        peer = parts[1] if len(parts) == 3 else None
+        value = parts[-1]
+        rate = 0 if value.lower() in ('off', '0') else parse_size(value)
+        if rate is None:
+            print(f"[X] Débit invalide: {value} (ex: 500K, 5M, 1G)")
+            return None, None
+        return peer, rate
     
     def confirm(self, message: str) -> bool:
         """
@@ -0,0 +1,218 @@
+"""
+Écriture des fichiers reçus
+
+Les octets lus sur le réseau sont confiés à un thread d'écriture par
+une file bornée (write-behind): un disque lent ne bloque la lecture que
+lorsque tous les buffers de la file sont pleins. Pour les gros fichiers,
+les pages écrites peuvent être retirées du cache (posix_fadvise) afin
+qu'une réception volumineuse ne chasse pas les fichiers utilisés par
+ailleurs.
+"""
+
+import errno
+import os
+import queue
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from shared.protocol import CHUNK_SIZE
+
+
+# Buffers de CHUNK_SIZE en attente d'écriture par réception (0: écriture directe)
+WRITE_BEHIND_BUFFERS = 8
+
+# Plage min pour passer par le thread d'écriture (les petits fichiers sont écrits directement)
+WRITE_BEHIND_MIN_SIZE = 4 * CHUNK_SIZE
+
+# Politique de synchronisation disque
+FSYNC_NONE = 'none'  # Jamais (une coupure de courant peut fausser une reprise)
+FSYNC_CHECKPOINT = 'checkpoint'  # Avant chaque enregistrement du journal de reprise
+FSYNC_FULL = 'full'  # Aussi avant de renommer le fichier terminé
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_CHECKPOINT, FSYNC_FULL)
+
+# Politique de cache des fichiers reçus
+CACHE_KEEP = 'keep'
+CACHE_DROP = 'drop'
+CACHE_AUTO = 'auto'  # Retirer du cache les fichiers d'au moins DROP_CACHE_MIN_SIZE
+CACHE_POLICIES = (CACHE_KEEP, CACHE_DROP, CACHE_AUTO)
+DROP_CACHE_MIN_SIZE = 64 * 1024 * 1024
+
+# Octets écrits entre deux conseils au noyau
+CACHE_WINDOW = 8 * CHUNK_SIZE
+
+# Systèmes de fichiers sans réservation d'espace
+FALLOCATE_ERRNOS = {errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP}
+
+
+def write_at(f, data, offset: int):
+    """Écrire des données à une position donnée du fichier"""
+    view = memoryview(data)
+    if hasattr(os, 'pwrite'):
+        fd = f.fileno()
+        while view:
+            n = os.pwrite(fd, view, offset)
+            view = view[n:]
+            offset += n
+    else:
+        f.seek(offset)
+        while view:
+            n = f.write(view)
+            view = view[n:]
+
+
+def reserve_space(f, size: int):
+    """
+    Réserver l'espace disque d'un fichier (posix_fallocate, sinon fichier creux)
+    
+    Raises:
+        OSError: Espace disque insuffisant
+    """
+    if os.fstat(f.fileno()).st_size >= size:
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except AttributeError:
+        f.truncate(size)
+    except OSError as e:
+        if e.errno not in FALLOCATE_ERRNOS:
+            raise
+        f.truncate(size)
+
+
+def drop_cache(f, offset: int, length: int):
+    """Conseiller au noyau de retirer une plage du cache (lance l'écriture des pages modifiées)"""
+    if length > 0 and hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(f.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+class DiskWriter:
+    """
+    Écritures d'une plage reçue (gestionnaire de contexte)
+    
+    Avec des buffers, un thread écrit pendant que l'appelant lit la suite:
+    buffer() fournit un buffer libre (attend si tous sont en file) et
+    write() le met en file. Sans buffer, write() écrit directement. À la
+    sortie du bloc `with`, toutes les écritures sont terminées.
+    """
+    
+    def __init__(self, f, buffers: int = WRITE_BEHIND_BUFFERS, drop: bool = False,
+                 scratch: memoryview = None):
+        """
+        Args:
+            f: Fichier de destination (non bufferisé)
+            buffers: Buffers en attente d'écriture (0: écriture directe)
+            drop: Retirer du cache les pages écrites
+            scratch: Buffer de lecture en écriture directe (alloué sinon)
+        """
+        self.f = f
+        self.drop = drop
+        self.error: Exception = None
+        self._scratch = scratch
+        self._start = None  # Plage écrite [start, end) et début de la partie encore en cache
+        self._end = 0
+        self._cached = 0
+        self.thread = None
+        if buffers:
+            self.free = queue.Queue()
+            for _ in range(buffers):
+                self.free.put(None)  # Buffers alloués au premier usage
+            self.pending = queue.Queue()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+    
+    def __enter__(self) -> 'DiskWriter':
+        return self
+    
+    def __exit__(self, exc_type, *exc):
+        self.close()
+        if exc_type is None and self.error is not None:
+            raise self.error
+    
+    def buffer(self) -> memoryview:
+        """
+        Buffer de CHUNK_SIZE octets à remplir puis passer à write()
+        
+        Raises:
+            OSError: Une écriture précédente a échoué
+        """
+        if self.thread is None:
+            if self._scratch is None:
+                self._scratch = memoryview(bytearray(CHUNK_SIZE))
+            return self._scratch
+        buffer = self.free.get()
+        self._check()
+        return buffer if buffer is not None else memoryview(bytearray(CHUNK_SIZE))
+    
+    def release(self, buffer: memoryview):
+        """Rendre un buffer obtenu par buffer() sans l'écrire"""
+        if self.thread is not None:
+            self.free.put(buffer)
+    
+    def write(self, data, offset: int, buffer: memoryview = None):
+        """
+        Écrire `data` à `offset` (en file si un thread d'écriture est actif)
+        
+        Args:
+            data: Octets à écrire (une vue de `buffer` ou des octets indépendants)
+            offset: Position dans le fichier
+            buffer: Buffer obtenu par buffer() à rendre après l'écriture
+        
+        Raises:
+            OSError: Une écriture précédente a échoué
+        """
+        if self.thread is None:
+            self._write(data, offset)
+            return
+        if buffer is None:
+            buffer = self.free.get()  # Les octets indépendants occupent aussi une place
+        self._check()
+        self.pending.put((data, offset, buffer))
+    
+    def close(self):
+        """Attendre la fin des écritures et arrêter le thread"""
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.drop and self._start is not None:
+            drop_cache(self.f, self._start, self._end - self._start)
+    
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+    
+    def _run(self):
+        """Écrire les octets en file (thread séparé)"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            data, offset, buffer = item
+            if self.error is None:
+                try:
+                    self._write(data, offset)
+                except OSError as e:
+                    self.error = e  # Signalée à l'appelant; la file continue d'être vidée
+            self.free.put(buffer)
+    
+    def _write(self, data, offset: int):
+        write_at(self.f, data, offset)
+        if not self.drop:
+            return
+        end = offset + len(data)
+        if self._start is None or offset != self._end:
+            # Nouvelle plage: libérer ce qui reste de la précédente
+            if self._start is not None:
+                drop_cache(self.f, self._cached, self._end - self._cached)
+            self._start = self._cached = offset
+        self._end = end
+        
+        # Le premier conseil lance l'écriture des pages, le suivant les retire du cache
+        if end - self._cached >= 2 * CACHE_WINDOW:
+            drop_cache(self.f, self._cached, end - self._cached)
+            self._cached = end - CACHE_WINDOW
@@ -15,6 +15,9 @@ DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'network.db')
 # Timeouts
 PEER_TIMEOUT = 60  # Secondes avant de considérer un peer hors ligne
 CLEANUP_INTERVAL = 30  # Intervalle de nettoyage (secondes)
+PEER_EVENTS_TIMEOUT = 25  # Attente max d'une demande de changements (secondes)
+PEER_EVENTS_KEPT = 1000  # Changements de présence gardés en mémoire
+BATCH_MAX_OPERATIONS = 500  # Opérations max par appel à /api/batch
 
 # Transfert
 MAX_FILE_SIZE = 1024 * 1024 * 1024  # 1 GB max
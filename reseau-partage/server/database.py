@@ -4,11 +4,16 @@ Gère l'annuaire des PC et les permissions
 """
 
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Optional
 import os
 
 
+# Noms max par requête IN (...) (limite de variables des anciennes versions de SQLite: 999)
+SQL_MAX_VARIABLES = 500
+
+
 class Database:
     """Gestionnaire de base de données"""
     
@@ -28,6 +33,33 @@ class Database:
         conn.row_factory = sqlite3.Row  # Résultats comme dictionnaires
         return conn
     
+    @contextmanager
+    def transaction(self, conn: sqlite3.Connection = None, write: bool = False):
+        """
+        Connexion pour une suite d'opérations atomique
+        
+        Validée à la sortie du bloc `with`, annulée si une exception en sort.
+        
+        Args:
+            conn: Connexion d'une transaction en cours (réutilisée telle quelle)
+            write: La transaction écrit: verrou pris dès le début, pour qu'une
+                lecture suivie d'une écriture n'échoue pas face à un autre écrivain
+        """
+        if conn is not None:
+            yield conn
+            return
+        
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
     def init_database(self):
         """Créer les tables si elles n'existent pas"""
         conn = self.get_connection()
@@ -81,10 +113,16 @@ class Database:
                 to_peer TEXT NOT NULL,
                 status TEXT NOT NULL,
                 transferred_at TEXT NOT NULL,
+                bytes_sent INTEGER,
                 FOREIGN KEY (file_id) REFERENCES files(id)
             )
         """)
         
+        # Bases créées avant le suivi des octets envoyés
+        columns = [row['name'] for row in cursor.execute("PRAGMA table_info(transfers)")]
+        if 'bytes_sent' not in columns:
+            cursor.execute("ALTER TABLE transfers ADD COLUMN bytes_sent INTEGER")
+        
         conn.commit()
         conn.close()
         print(f"[OK] Base de donnees initialisee : {self.db_path}")
@@ -193,39 +231,67 @@ class Database:
         
         return peers
     
-    def get_peer(self, name: str) -> Optional[Dict]:
+    def get_peer(self, name: str, conn: sqlite3.Connection = None) -> Optional[Dict]:
         """
         Obtenir un PC par son nom
         
         Args:
             name: Nom du PC
+            conn: Connexion d'une transaction en cours (voir transaction)
             
         Returns:
             Infos du PC ou None
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.transaction(conn) as conn:
+            row = conn.execute("""
+                SELECT name, ip_address, port, status, last_seen
+                FROM peers
+                WHERE name = ?
+            """, (name,)).fetchone()
         
-        cursor.execute("""
-            SELECT name, ip_address, port, status, last_seen
-            FROM peers
-            WHERE name = ?
-        """, (name,))
+        return dict(row) if row else None
+    
+    def missing_peers(self, names: List[str], conn: sqlite3.Connection = None) -> List[str]:
+        """
+        PC inconnus parmi une liste de noms
         
-        row = cursor.fetchone()
-        conn.close()
+        Une seule requête IN (...) par tranche de SQL_MAX_VARIABLES noms.
         
-        return dict(row) if row else None
+        Args:
+            names: Noms des PC
+            conn: Connexion d'une transaction en cours (voir transaction)
+        
+        Returns:
+            Noms non enregistrés, dans l'ordre de `names` (sans doublon)
+        """
+        names = list(dict.fromkeys(names))
+        known = set()
+        
+        with self.transaction(conn) as conn:
+            for start in range(0, len(names), SQL_MAX_VARIABLES):
+                chunk = names[start:start + SQL_MAX_VARIABLES]
+                rows = conn.execute(f"""
+                    SELECT name
+                    FROM peers
+                    WHERE name IN ({', '.join('?' * len(chunk))})
+                """, chunk)
+                known.update(row['name'] for row in rows)
+        
+        return [name for name in names if name not in known]
     
     # ========================================
     # GESTION DES FICHIERS
     # ========================================
     
     def register_file(self, filename: str, filesize: int, checksum: str,
-                     owner: str, permission_type: str, recipients: List[str] = None) -> int:
+                     owner: str, permission_type: str, recipients: List[str] = None,
+                     transfers: List[Dict] = None, conn: sqlite3.Connection = None) -> int:
         """
         Enregistrer un fichier partagé
         
+        Le fichier, ses permissions et ses premiers transferts sont écrits
+        dans une seule transaction (tout ou rien).
+        
         Args:
             filename: Nom du fichier
             filesize: Taille en octets
@@ -233,93 +299,110 @@ class Database:
             owner: Propriétaire
             permission_type: Type de permission (private, shared, public)
             recipients: Liste des destinataires (pour private/shared)
+            transfers: Transferts déjà faits par le propriétaire, {'to_peer', 'status', 'bytes_sent'}
+            conn: Connexion d'une transaction en cours (voir transaction)
             
         Returns:
             ID du fichier créé
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
         now = datetime.utcnow().isoformat()
         
-        # Insérer le fichier
-        cursor.execute("""
-            INSERT INTO files (filename, filesize, checksum, owner, permission_type, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (filename, filesize, checksum, owner, permission_type, now))
-        
-        file_id = cursor.lastrowid
-        
-        # Ajouter les permissions
-        if permission_type == 'public':
-            # Tout le monde peut accéder
-            pass  # On vérifie juste le type plus tard
-        elif recipients:
-            # Ajouter chaque destinataire
-            for recipient in recipients:
-                cursor.execute("""
+        with self.transaction(conn, write=True) as conn:
+            # Insérer le fichier
+            cursor = conn.execute("""
+                INSERT INTO files (filename, filesize, checksum, owner, permission_type, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (filename, filesize, checksum, owner, permission_type, now))
+            
+            file_id = cursor.lastrowid
+            
+            # Ajouter les permissions
+            if permission_type == 'public':
+                # Tout le monde peut accéder
+                pass  # On vérifie juste le type plus tard
+            elif recipients:
+                # Une ligne par destinataire, en une seule instruction
+                conn.executemany("""
                     INSERT INTO permissions (file_id, peer_name, granted_at)
                     VALUES (?, ?, ?)
-                """, (file_id, recipient, now))
-        
-        conn.commit()
-        conn.close()
+                """, [(file_id, recipient, now) for recipient in dict.fromkeys(recipients)])
+            
+            if transfers:
+                conn.executemany("""
+                    INSERT INTO transfers (file_id, from_peer, to_peer, status, transferred_at, bytes_sent)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(file_id, owner, transfer['to_peer'], transfer.get('status', 'success'), now,
+                       transfer.get('bytes_sent')) for transfer in transfers])
         
         print(f"✓ Fichier enregistré : {filename} (ID: {file_id})")
         return file_id
     
-    def check_permission(self, file_id: int, peer_name: str) -> bool:
+    def get_file(self, file_id: int) -> Optional[Dict]:
         """
-        Vérifier si un PC a accès à un fichier
+        Obtenir un fichier par son ID
         
         Args:
             file_id: ID du fichier
-            peer_name: Nom du PC
-            
+        
         Returns:
-            True si accès autorisé, False sinon
+            Infos du fichier ou None
         """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Récupérer le fichier
         cursor.execute("""
-            SELECT permission_type, owner
+            SELECT id, filename, filesize, checksum, owner, permission_type, created_at
             FROM files
             WHERE id = ?
         """, (file_id,))
         
         row = cursor.fetchone()
+        conn.close()
         
-        if not row:
-            conn.close()
-            return False
-        
-        permission_type = row['permission_type']
-        owner = row['owner']
-        
-        # Le propriétaire a toujours accès
-        if peer_name == owner:
-            conn.close()
-            return True
-        
-        # Public = tout le monde
-        if permission_type == 'public':
-            conn.close()
-            return True
-        
-        # Private/Shared = vérifier la table permissions
-        cursor.execute("""
-            SELECT COUNT(*) as count
-            FROM permissions
-            WHERE file_id = ? AND peer_name = ?
-        """, (file_id, peer_name))
+        return dict(row) if row else None
+    
+    def check_permission(self, file_id: int, peer_name: str, conn: sqlite3.Connection = None) -> bool:
+        """
+        Vérifier si un PC a accès à un fichier
         
-        count = cursor.fetchone()['count']
-        conn.close()
+        Args:
+            file_id: ID du fichier
+            peer_name: Nom du PC
+            conn: Connexion d'une transaction en cours (voir transaction)
+            
+        Returns:
+            True si accès autorisé, False sinon
+        """
+        with self.transaction(conn) as conn:
+            # Récupérer le fichier
+            row = conn.execute("""
+                SELECT permission_type, owner
+                FROM files
+                WHERE id = ?
+            """, (file_id,)).fetchone()
+            
+            if not row:
+                return False
+            
+            # Le propriétaire a toujours accès
+            if peer_name == row['owner']:
+                return True
+            
+            # Public = tout le monde
+            if row['permission_type'] == 'public':
+                return True
+            
+            # Private/Shared = vérifier la table permissions
+            count = conn.execute("""
+                SELECT COUNT(*) as count
+                FROM permissions
+                WHERE file_id = ? AND peer_name = ?
+            """, (file_id, peer_name)).fetchone()['count']
         
         return count > 0
     
-    def log_transfer(self, file_id: int, from_peer: str, to_peer: str, status: str):
+    def log_transfer(self, file_id: int, from_peer: str, to_peer: str, status: str,
+                     bytes_sent: Optional[int] = None, conn: sqlite3.Connection = None):
         """
         Enregistrer un transfert
         
@@ -328,18 +411,16 @@ class Database:
             from_peer: Expéditeur
             to_peer: Destinataire
             status: Statut (success, failed)
+            bytes_sent: Octets réellement envoyés (None si inconnu)
+            conn: Connexion d'une transaction en cours (voir transaction)
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
         now = datetime.utcnow().isoformat()
         
-        cursor.execute("""
-            INSERT INTO transfers (file_id, from_peer, to_peer, status, transferred_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (file_id, from_peer, to_peer, status, now))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction(conn, write=True) as conn:
+            conn.execute("""
+                INSERT INTO transfers (file_id, from_peer, to_peer, status, transferred_at, bytes_sent)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (file_id, from_peer, to_peer, status, now, bytes_sent))
     
     def get_sent_files(self, peer_name: str) -> List[Dict]:
         """
@@ -359,7 +440,8 @@ class Database:
                 f.id, f.filename, f.filesize, f.checksum, 
                 f.created_at,
                 GROUP_CONCAT(t.to_peer) as recipients,
-                COUNT(DISTINCT t.to_peer) as recipient_count
+                COUNT(DISTINCT t.to_peer) as recipient_count,
+                COALESCE(SUM(f.filesize - t.bytes_sent), 0) as bytes_saved
             FROM files f
             LEFT JOIN transfers t ON f.id = t.file_id AND t.status = 'success'
             WHERE f.owner = ?
@@ -390,7 +472,8 @@ class Database:
                 f.id, f.filename, f.filesize, f.checksum,
                 f.owner as sender,
                 t.transferred_at,
-                t.status
+                t.status,
+                t.bytes_sent
             FROM files f
             JOIN transfers t ON f.id = t.file_id
             WHERE t.to_peer = ? AND t.status = 'success'
@@ -0,0 +1,72 @@
+"""
+Changements de présence des PC
+
+Chaque enregistrement ou déconnexion d'un PC reçoit un numéro de version
+croissant. Les clients gardent l'annuaire en cache et demandent les
+changements depuis la dernière version reçue: la requête reste en
+attente jusqu'au prochain changement (long polling), ce qui leur pousse
+les mises à jour sans qu'ils relisent toute la liste.
+"""
+
+import threading
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+from server.config import PEER_EVENTS_KEPT
+
+
+# Types de changement
+PEER_ONLINE = 'online'
+PEER_OFFLINE = 'offline'
+
+
+class PeerEvents:
+    """Journal en mémoire des changements de présence"""
+    
+    def __init__(self, kept: int = PEER_EVENTS_KEPT):
+        """
+        Args:
+            kept: Changements gardés (un client plus en retard recharge tout l'annuaire)
+        """
+        self.epoch = uuid.uuid4().hex  # Change à chaque démarrage du serveur
+        self.version = 0
+        self.events = deque(maxlen=kept)
+        self.condition = threading.Condition()
+    
+    def publish(self, event: str, peer: Dict):
+        """
+        Enregistrer un changement et réveiller les clients en attente
+        
+        Args:
+            event: PEER_ONLINE ou PEER_OFFLINE
+            peer: Infos du PC (voir Database.get_peer)
+        """
+        with self.condition:
+            self.version += 1
+            self.events.append({'version': self.version, 'event': event, 'peer': peer})
+            self.condition.notify_all()
+    
+    def since(self, version: Optional[int], epoch: Optional[str], timeout: float) -> Optional[List[Dict]]:
+        """
+        Changements postérieurs à une version
+        
+        Attend jusqu'à `timeout` secondes s'il n'y en a pas encore.
+        
+        Args:
+            version: Dernière version reçue par le client (None: aucune)
+            epoch: Démarrage du serveur auquel se rapporte `version`
+            timeout: Attente max en secondes
+        
+        Returns:
+            Changements (éventuellement aucun), ou None si le client doit
+            recharger tout l'annuaire (premier appel, serveur redémarré,
+            changements plus gardés)
+        """
+        with self.condition:
+            if version is None or epoch != self.epoch or version > self.version:
+                return None
+            self.condition.wait_for(lambda: self.version > version, timeout)
+            if self.events and self.events[0]['version'] > version + 1:
+                return None
+            return [event for event in self.events if event['version'] > version]
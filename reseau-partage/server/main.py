@@ -9,14 +9,17 @@ from werkzeug.utils import secure_filename
 import sys
 import os
 import shutil
+from typing import Dict, Tuple
 
 # Ajouter le dossier parent au path pour importer shared
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from server.database import Database
+from server.events import PEER_OFFLINE, PEER_ONLINE, PeerEvents
 from server.config import *
 from shared.protocol import MessageType, PermissionType
-from shared.utils import get_timestamp, calculate_checksum
+from shared.utils import get_timestamp
+from shared.hashing import file_checksum
 
 # Initialiser Flask
 web_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'web')
@@ -34,6 +37,9 @@ os.makedirs(WEB_UPLOAD_DIR, exist_ok=True)
 # Initialiser la base de données
 db = Database(DATABASE_PATH)
 
+# Changements de présence poussés aux clients
+peer_events = PeerEvents()
+
 
 # ========================================
 # ROUTES - GESTION DES PEERS
@@ -52,6 +58,7 @@ def register_peer():
         return jsonify({'error': 'Nom et IP requis'}), 400
     
     success = db.register_peer(name, ip, port)
+    peer_events.publish(PEER_ONLINE, db.get_peer(name))
     
     return jsonify({
         'status': 'registered',
@@ -73,6 +80,9 @@ def unregister_peer():
         return jsonify({'error': 'Nom requis'}), 400
     
     db.unregister_peer(name)
+    peer = db.get_peer(name)
+    if peer:
+        peer_events.publish(PEER_OFFLINE, peer)
     
     return jsonify({'status': 'unregistered'}), 200
 
@@ -99,15 +109,56 @@ def list_online_peers():
     }), 200
 
 
+@app.route('/api/peers/events', methods=['GET'])
+def peer_changes():
+    """
+    Changements de présence depuis une version (long polling)
+    
+    Paramètres:
+        since: Dernière version reçue (absent: premier appel)
+        epoch: Démarrage du serveur de cette version
+        timeout: Attente max en secondes s'il n'y a pas encore de changement
+    
+    Réponse: {'epoch', 'version', 'changes'} ou, si le client doit tout
+    recharger, {'epoch', 'version', 'reset': true, 'peers'}
+    """
+    since = request.args.get('since', type=int)
+    epoch = request.args.get('epoch')
+    timeout = min(max(request.args.get('timeout', PEER_EVENTS_TIMEOUT, type=float), 0), PEER_EVENTS_TIMEOUT)
+    
+    changes = peer_events.since(since, epoch, timeout)
+    if changes is None:
+        # Version lue avant la liste: un changement concurrent sera aussi renvoyé au prochain appel
+        version = peer_events.version
+        return jsonify({
+            'epoch': peer_events.epoch,
+            'version': version,
+            'reset': True,
+            'peers': db.get_online_peers()
+        }), 200
+    
+    return jsonify({
+        'epoch': peer_events.epoch,
+        'version': changes[-1]['version'] if changes else since,
+        'changes': changes
+    }), 200
+
+
 @app.route('/api/peer/<name>', methods=['GET'])
 def get_peer(name):
     """Obtenir les infos d'un PC"""
-    peer = db.get_peer(name)
+    body, status = peer_lookup({'name': name})
+    return jsonify(body), status
+
+
+def peer_lookup(data: Dict, conn=None) -> Tuple[Dict, int]:
+    """Infos d'un PC (corps et statut de /api/peer/<name>)"""
+    peer = db.get_peer(data.get('name'), conn=conn)
     
     if not peer:
-        return jsonify({'error': 'PC non trouvé'}), 404
+        return {'error': 'PC non trouvé'}, 404
     
-    return jsonify(peer), 200
+    return peer, 200
 
 
 # ========================================
@@ -129,8 +180,12 @@ def register_file():
             "recipients": ["PC2", "PC3"]  // optionnel
         }
     """
-    data = request.json
-    
+    body, status = file_registration(request.json)
+    return jsonify(body), status
+
+
+def file_registration(data: Dict, conn=None) -> Tuple[Dict, int]:
+    """Enregistrer un fichier partagé (corps et statut de /api/file/register)"""
     filename = data.get('filename')
     filesize = data.get('filesize')
     checksum = data.get('checksum')
@@ -140,35 +195,45 @@ def register_file():
     
     # Validation
     if not all([filename, filesize, checksum, owner]):
-        return jsonify({'error': 'Données incomplètes'}), 400
-    
-    # Vérifier que le propriétaire existe
-    if not db.get_peer(owner):
-        return jsonify({'error': f'PC {owner} non enregistré'}), 404
-    
-    # Vérifier que les destinataires existent
-    if permission != 'public':
-        for recipient in recipients:
-            if not db.get_peer(recipient):
-                return jsonify({'error': f'PC {recipient} non trouvé'}), 404
-    
-    # Enregistrer le fichier
-    file_id = db.register_file(
-        filename=filename,
-        filesize=filesize,
-        checksum=checksum,
-        owner=owner,
-        permission_type=permission,
-        recipients=recipients
-    )
-    
-    return jsonify({
+        return {'error': 'Données incomplètes'}, 400
+    
+    with db.transaction(conn, write=True) as conn:
+        # Vérifier en une requête que le propriétaire et les destinataires existent
+        missing = db.missing_peers([owner] + (recipients if permission != 'public' else []), conn=conn)
+        if owner in missing:
+            return {'error': f'PC {owner} non enregistré'}, 404
+        if missing:
+            return {'error': f'PC {missing[0]} non trouvé'}, 404
+        
+        # Enregistrer le fichier (même transaction: un destinataire ne peut pas disparaître entre-temps)
+        file_id = db.register_file(
+            filename=filename,
+            filesize=filesize,
+            checksum=checksum,
+            owner=owner,
+            permission_type=permission,
+            recipients=recipients,
+            conn=conn
+        )
+    
+    return {
         'status': 'registered',
         'file_id': file_id,
         'filename': filename,
         'permission': permission,
         'recipients': recipients if permission != 'public' else 'all'
-    }), 200
+    }, 200
+
+
+@app.route('/api/file/<int:file_id>', methods=['GET'])
+def get_file(file_id):
+    """Obtenir les infos d'un fichier (checksum vérifié par les destinataires)"""
+    file_info = db.get_file(file_id)
+    
+    if not file_info:
+        return jsonify({'error': 'Fichier non trouvé'}), 404
+    
+    return jsonify(file_info), 200
 
 
 @app.route('/api/file/<int:file_id>/check', methods=['POST'])
@@ -181,19 +246,25 @@ def check_permission(file_id):
             "peer_name": "PC2"
         }
     """
-    data = request.json
+    body, status = permission_check(dict(request.json, file_id=file_id))
+    return jsonify(body), status
+
+
+def permission_check(data: Dict, conn=None) -> Tuple[Dict, int]:
+    """Vérifier l'accès d'un PC à un fichier (corps et statut de /api/file/<id>/check)"""
+    file_id = data.get('file_id')
     peer_name = data.get('peer_name')
     
     if not peer_name:
-        return jsonify({'error': 'peer_name requis'}), 400
+        return {'error': 'peer_name requis'}, 400
     
-    allowed = db.check_permission(file_id, peer_name)
+    allowed = db.check_permission(file_id, peer_name, conn=conn)
     
-    return jsonify({
+    return {
         'allowed': allowed,
         'file_id': file_id,
         'peer_name': peer_name
-    }), 200
+    }, 200
 
 
 @app.route('/api/transfer/log', methods=['POST'])
@@ -206,22 +277,80 @@ def log_transfer():
             "file_id": 1,
             "from_peer": "PC1",
             "to_peer": "PC2",
-            "status": "success"  // success, failed
+            "status": "success",  // success, failed
+            "bytes_sent": 1024    // optionnel: octets réellement envoyés
         }
     """
-    data = request.json
-    
+    body, status = transfer_log(request.json)
+    return jsonify(body), status
+
+
+def transfer_log(data: Dict, conn=None) -> Tuple[Dict, int]:
+    """Enregistrer un transfert (corps et statut de /api/transfer/log)"""
     file_id = data.get('file_id')
     from_peer = data.get('from_peer')
     to_peer = data.get('to_peer')
     status = data.get('status', 'success')
+    bytes_sent = data.get('bytes_sent')
     
     if not all([file_id, from_peer, to_peer]):
-        return jsonify({'error': 'Données incomplètes'}), 400
+        return {'error': 'Données incomplètes'}, 400
     
-    db.log_transfer(file_id, from_peer, to_peer, status)
+    db.log_transfer(file_id, from_peer, to_peer, status, bytes_sent, conn=conn)
     
-    return jsonify({'status': 'logged'}), 200
+    return {'status': 'logged'}, 200
+
+
+# Opérations groupables dans /api/batch
+BATCH_OPERATIONS = {
+    'peer': peer_lookup,
+    'register_file': file_registration,
+    'log_transfer': transfer_log,
+    'check_permission': permission_check,
+}
+
+# Opérations qui écrivent dans la base
+BATCH_WRITES = {'register_file', 'log_transfer'}
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """
+    Exécuter plusieurs opérations en un appel (une seule transaction)
+    
+    Body:
+        {
+            "operations": [
+                {"op": "peer", "name": "PC2"},
+                {"op": "register_file", "filename": "...", ...},  // comme /api/file/register
+                {"op": "log_transfer", "file_id": 1, ...},        // comme /api/transfer/log
+                {"op": "check_permission", "file_id": 1, "peer_name": "PC2"}
+            ]
+        }
+    
+    Réponse: {'results': [{'status': 200, 'body': {...}}, ...]} dans l'ordre
+    des opérations; une opération refusée (400, 404) n'annule pas les autres.
+    """
+    data = request.json or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list):
+        return jsonify({'error': 'operations requis'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'{BATCH_MAX_OPERATIONS} opérations max par appel'}), 400
+    
+    write = any(isinstance(operation, dict) and operation.get('op') in BATCH_WRITES for operation in operations)
+    results = []
+    with db.transaction(write=write) as conn:
+        for operation in operations:
+            handler = BATCH_OPERATIONS.get(operation.get('op')) if isinstance(operation, dict) else None
+            if handler is None:
+                body, status = {'error': 'Opération inconnue'}, 400
+            else:
+                body, status = handler(operation, conn=conn)
+            results.append({'status': status, 'body': body})
+    
+    return jsonify({'results': results}), 200
 
 
 @app.route('/api/files/sent/<peer_name>', methods=['GET'])
@@ -286,17 +415,7 @@ def upload_file():
     
     # Calculer le checksum et la taille
     filesize = os.path.getsize(filepath)
-    checksum = calculate_checksum(filepath)
-    
-    # Enregistrer dans la base de données
-    file_id = db.register_file(
-        filename=filename,
-        filesize=filesize,
-        checksum=checksum,
-        owner=owner,
-        permission_type=permission,
-        recipients=recipients
-    )
+    checksum = file_checksum(filepath)
     
     # Copier le fichier vers chaque destinataire
     for recipient in recipients:
@@ -306,9 +425,17 @@ def upload_file():
         
         # Copier le fichier
         shutil.copy2(filepath, recipient_filepath)
-        
-        # Logger le transfert
-        db.log_transfer(file_id, owner, recipient, 'success')
+    
+    # Enregistrer le fichier, ses permissions et les transferts en une transaction
+    file_id = db.register_file(
+        filename=filename,
+        filesize=filesize,
+        checksum=checksum,
+        owner=owner,
+        permission_type=permission,
+        recipients=recipients,
+        transfers=[{'to_peer': recipient, 'status': 'success'} for recipient in recipients]
+    )
     
     return jsonify({
         'status': 'success',
@@ -356,10 +483,13 @@ def index():
         <li><b>POST</b> /api/unregister - Déconnecter un PC</li>
         <li><b>GET</b> /api/peers - Liste tous les PC</li>
         <li><b>GET</b> /api/peers/online - PC en ligne</li>
+        <li><b>GET</b> /api/peers/events - Changements de présence (long polling)</li>
         <li><b>GET</b> /api/peer/&lt;name&gt; - Info d'un PC</li>
         <li><b>POST</b> /api/file/register - Enregistrer un fichier</li>
         <li><b>POST</b> /api/file/&lt;id&gt;/check - Vérifier permission</li>
+        <li><b>GET</b> /api/file/&lt;id&gt; - Infos d'un fichier (checksum)</li>
         <li><b>POST</b> /api/transfer/log - Logger un transfert</li>
+        <li><b>POST</b> /api/batch - Plusieurs opérations en un appel</li>
         <li><b>GET</b> /api/status - Statut du serveur</li>
     </ul>
     """, 200
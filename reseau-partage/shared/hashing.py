@@ -0,0 +1,294 @@
+"""
+Moteur de hachage des fichiers
+
+Checksums plats (MD5 des anciens clients) ou arbres de Merkle: le fichier
+est découpé en blocs hachés en parallèle (hashlib libère le GIL), puis les
+empreintes des blocs sont combinées deux à deux jusqu'à la racine.
+
+Format des checksums échangés:
+    <hex>                   MD5 du fichier entier (anciens clients)
+    merkle-<algo>:<hex>     Racine de l'arbre de Merkle (algo: blake2b, sha256)
+"""
+
+import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Algorithmes disponibles
+HASH_ALGORITHMS = ('blake2b', 'sha256', 'md5')
+DEFAULT_ALGORITHM = 'blake2b'
+
+# Taille des blocs (feuilles) de l'arbre de Merkle
+MERKLE_CHUNK_SIZE = 4 * 1024 * 1024
+MERKLE_PREFIX = 'merkle-'
+
+# Préfixes séparant les feuilles des nœuds internes
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+# Taille des lectures pour un hachage séquentiel
+HASH_READ_SIZE = 1024 * 1024
+
+# Threads de hachage des blocs
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def new_hash(algorithm: str):
+    """
+    Créer un objet de hachage
+    
+    Args:
+        algorithm: blake2b, sha256 ou md5
+    
+    Returns:
+        Objet hashlib
+    """
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Algorithme de hachage inconnu: {algorithm}")
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=32)
+    return hashlib.new(algorithm)
+
+
+def hash_file(filepath: str, algorithm: str = 'md5') -> str:
+    """
+    Hacher un fichier entier (lectures de HASH_READ_SIZE)
+    
+    Args:
+        filepath: Chemin du fichier
+        algorithm: Algorithme de hachage
+    
+    Returns:
+        Empreinte en hexadécimal
+    """
+    digest = new_hash(algorithm)
+    buffer = bytearray(HASH_READ_SIZE)
+    view = memoryview(buffer)
+    
+    with open(filepath, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    
+    return digest.hexdigest()
+
+
+def leaf_hash(data, algorithm: str = DEFAULT_ALGORITHM) -> bytes:
+    """Empreinte d'un bloc (feuille de l'arbre)"""
+    digest = new_hash(algorithm)
+    digest.update(LEAF_PREFIX)
+    digest.update(data)
+    return digest.digest()
+
+
+def chunk_count(size: int, chunk_size: int = MERKLE_CHUNK_SIZE) -> int:
+    """Nombre de feuilles d'un fichier (au moins une, même vide)"""
+    return max(1, -(-size // chunk_size))
+
+
+def chunk_hashes(filepath: str, algorithm: str = DEFAULT_ALGORITHM, chunk_size: int = MERKLE_CHUNK_SIZE,
+                 indexes: Iterable[int] = None, workers: int = HASH_WORKERS) -> Dict[int, bytes]:
+    """
+    Hacher les blocs d'un fichier en parallèle
+    
+    Le fichier est projeté en mémoire (mmap): chaque thread hache sa
+    tranche sans copie.
+    
+    Args:
+        filepath: Chemin du fichier
+        algorithm: Algorithme de hachage
+        chunk_size: Taille des blocs
+        indexes: Blocs à hacher (tous par défaut)
+        workers: Nombre de threads
+    
+    Returns:
+        {indice du bloc: empreinte}
+    """
+    size = os.path.getsize(filepath)
+    if indexes is None:
+        indexes = range(chunk_count(size, chunk_size))
+    indexes = list(indexes)
+    if not indexes:
+        return {}
+    if size == 0:
+        return {0: leaf_hash(b'', algorithm)}
+    
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        def work(index: int) -> Tuple[int, bytes]:
+            with memoryview(mapped) as whole, whole[index * chunk_size:(index + 1) * chunk_size] as view:
+                return index, leaf_hash(view, algorithm)
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return dict(pool.map(work, indexes))
+
+
+def merkle_root(leaves: List[bytes], algorithm: str = DEFAULT_ALGORITHM) -> bytes:
+    """
+    Combiner les feuilles jusqu'à la racine
+    
+    Un nœud sans voisin remonte tel quel au niveau supérieur.
+    
+    Args:
+        leaves: Empreintes des blocs, dans l'ordre du fichier
+        algorithm: Algorithme de hachage
+    
+    Returns:
+        Empreinte de la racine
+    """
+    level = list(leaves) or [leaf_hash(b'', algorithm)]
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level) - 1, 2):
+            digest = new_hash(algorithm)
+            digest.update(NODE_PREFIX)
+            digest.update(level[i])
+            digest.update(level[i + 1])
+            parents.append(digest.digest())
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
+
+
+def file_merkle(filepath: str, algorithm: str = DEFAULT_ALGORITHM) -> Tuple[str, List[bytes]]:
+    """
+    Calculer l'arbre de Merkle d'un fichier
+    
+    Args:
+        filepath: Chemin du fichier
+        algorithm: Algorithme de hachage
+    
+    Returns:
+        (checksum de la racine, empreintes des blocs)
+    """
+    hashes = chunk_hashes(filepath, algorithm)
+    leaves = [hashes[i] for i in range(len(hashes))]
+    return format_checksum(merkle_root(leaves, algorithm).hex(), algorithm, merkle=True), leaves
+
+
+def file_checksum(filepath: str, algorithm: str = DEFAULT_ALGORITHM) -> str:
+    """
+    Checksum d'un fichier à enregistrer sur le serveur
+    
+    Args:
+        filepath: Chemin du fichier
+        algorithm: blake2b ou sha256 (arbre de Merkle), md5 (checksum plat des anciens clients)
+    
+    Returns:
+        Checksum au format d'échange
+    """
+    if algorithm == 'md5':
+        return hash_file(filepath, 'md5')
+    return file_merkle(filepath, algorithm)[0]
+
+
+def format_checksum(value: str, algorithm: str, merkle: bool) -> str:
+    """Construire un checksum au format d'échange"""
+    if merkle:
+        return f"{MERKLE_PREFIX}{algorithm}:{value}"
+    return value
+
+
+def parse_checksum(checksum: str) -> Tuple[str, str, bool]:
+    """
+    Décoder un checksum au format d'échange
+    
+    Args:
+        checksum: Checksum enregistré
+    
+    Returns:
+        (algorithme, empreinte hexadécimale, arbre de Merkle)
+    """
+    scheme, sep, value = checksum.partition(':')
+    if not sep:
+        return 'md5', checksum, False
+    if not scheme.startswith(MERKLE_PREFIX):
+        raise ValueError(f"Format de checksum inconnu: {scheme}")
+    
+    algorithm = scheme[len(MERKLE_PREFIX):]
+    new_hash(algorithm)  # Valider l'algorithme
+    return algorithm, value, True
+
+
+class RangeLeafHasher:
+    """
+    Feuilles des blocs entièrement couverts par une plage reçue dans l'ordre
+    
+    Les octets d'un bloc à cheval sur le début de la plage sont ignorés
+    (son empreinte sera calculée à partir du disque).
+    """
+    
+    def __init__(self, leaves: Dict[int, bytes], offset: int = 0, size: Optional[int] = None,
+                 algorithm: str = DEFAULT_ALGORITHM, chunk_size: int = MERKLE_CHUNK_SIZE):
+        """
+        Initialiser le calcul
+        
+        Args:
+            leaves: Dictionnaire {indice: empreinte} à compléter
+            offset: Position dans le fichier du premier octet reçu
+            size: Taille du fichier (le dernier bloc peut être incomplet)
+            algorithm: Algorithme de hachage
+            chunk_size: Taille des blocs
+        """
+        self.leaves = leaves
+        self.position = offset
+        self.size = size
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self._hash = None
+    
+    def update(self, data):
+        """Ajouter les octets suivants de la plage"""
+        view = memoryview(data)
+        while view:
+            index, inner = divmod(self.position, self.chunk_size)
+            if inner == 0:
+                self._hash = new_hash(self.algorithm)
+                self._hash.update(LEAF_PREFIX)
+            
+            take = min(len(view), self.chunk_size - inner)
+            if self._hash is not None:
+                self._hash.update(view[:take])
+            self.position += take
+            view = view[take:]
+            
+            if self.position % self.chunk_size == 0 or self.position == self.size:
+                if self._hash is not None:
+                    self.leaves[index] = self._hash.digest()
+                self._hash = None
+
+
+class MerkleHasher(RangeLeafHasher):
+    """Arbre de Merkle d'un fichier reçu en entier et dans l'ordre (interface hashlib)"""
+    
+    def __init__(self, algorithm: str = DEFAULT_ALGORITHM, chunk_size: int = MERKLE_CHUNK_SIZE):
+        super().__init__({}, 0, None, algorithm, chunk_size)
+    
+    def digest(self) -> bytes:
+        """Racine de l'arbre des octets reçus jusqu'ici"""
+        leaves = dict(self.leaves)
+        if self._hash is not None:
+            leaves[self.position // self.chunk_size] = self._hash.copy().digest()
+        return merkle_root([leaves[i] for i in sorted(leaves)], self.algorithm)
+    
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+def checksum_hasher(checksum: str):
+    """
+    Objet de hachage au fil de l'eau correspondant à un checksum enregistré
+    
+    Args:
+        checksum: Checksum au format d'échange
+    
+    Returns:
+        Objet avec update() et hexdigest()
+    """
+    algorithm, _, merkle = parse_checksum(checksum)
+    return MerkleHasher(algorithm) if merkle else new_hash(algorithm)
@@ -4,9 +4,10 @@ Définit les messages échangés entre client et serveur
 """
 
 from enum import Enum
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 import json
+import struct
 
 
 class MessageType(Enum):
@@ -81,10 +82,11 @@ class FileTransferRequest:
     """Demande de transfert de fichier"""
     filename: str
     filesize: int
-    checksum: str
+    checksum: str  # Racine de Merkle (merkle-blake2b:...) ou MD5 des anciens clients
     from_peer: str
     to_peers: List[str]
     permission: str  # private, shared, public
+    chunk_hashes: Optional[List[str]] = None  # Feuilles de l'arbre, pour vérifier un bloc isolé
     
     def to_message(self) -> Message:
         return Message(
@@ -129,8 +131,256 @@ class Response:
         )
 
 
+def encode_transfer_header(filename: str, filesize: int, kind: str = 'file', **options) -> bytes:
+    """
+    Construire l'en-tête d'un transfert P2P
+    
+    Format: nom|taille|type|clé=valeur|... terminé par un saut de ligne
+    (compatible avec l'ancien format nom|taille[|folder])
+    
+    Args:
+        filename: Nom du fichier
+        filesize: Taille en octets
+        kind: Type de transfert (file, folder, multi, range, tree)
+        **options: Options propres au type de transfert (omises si None)
+        
+    Returns:
+        En-tête encodé en UTF-8
+    """
+    fields = [filename, str(filesize), kind]
+    fields.extend(f"{key}={value}" for key, value in options.items() if value is not None)
+    return ('|'.join(fields) + '\n').encode('utf-8')
+
+
+def parse_transfer_header(raw: bytes) -> Dict[str, Any]:
+    """
+    Décoder l'en-tête d'un transfert P2P
+    
+    Args:
+        raw: En-tête reçu
+        
+    Returns:
+        {'filename', 'filesize', 'kind', 'options'}
+    """
+    parts = raw.decode('utf-8').rstrip('\n').split('|')
+    options = {}
+    for field in parts[3:]:
+        key, _, value = field.partition('=')
+        options[key] = value
+    
+    return {
+        'filename': parts[0],
+        'filesize': int(parts[1]),
+        'kind': parts[2] if len(parts) > 2 and parts[2] else TRANSFER_FILE,
+        'options': options
+    }
+
+
+# Types de transfert P2P
+TRANSFER_FILE = 'file'      # Fichier sur une seule connexion
+TRANSFER_FOLDER = 'folder'  # Dossier compressé (zip, anciens clients)
+TRANSFER_TREE = 'tree'      # Dossier en flux d'entrées (voir TREE_ENTRY)
+
+# Taille max d'un en-tête de transfert (liste de relais comprise)
+MAX_HEADER_SIZE = 64 * 1024
+TRANSFER_MULTI = 'multi'    # Négociation d'un transfert multi-flux
+TRANSFER_RANGE = 'range'    # Une plage d'octets d'un transfert multi-flux
+
+# Entrée d'un flux de dossier: type, longueur du chemin, taille du contenu
+# suivie du chemin relatif (UTF-8, séparateur '/') puis du contenu
+TREE_ENTRY = struct.Struct('!cHQ')
+ENTRY_DIR = b'D'   # Dossier (éventuellement vide)
+ENTRY_FILE = b'F'  # Fichier, suivi de ses octets
+ENTRY_CHUNKS = b'C'  # Fichier, suivi du flux de ses blocs (déduplication)
+ENTRY_END = b'E'   # Fin du dossier
+
+
+def encode_tree_entry(entry_type: bytes, path: str = '', size: int = 0) -> bytes:
+    """
+    Construire l'en-tête d'une entrée de dossier
+    
+    Args:
+        entry_type: ENTRY_DIR, ENTRY_FILE, ENTRY_CHUNKS ou ENTRY_END
+        path: Chemin relatif à la racine du dossier
+        size: Taille du contenu (fichiers)
+    
+    Returns:
+        En-tête suivi du chemin encodé
+    """
+    raw_path = path.encode('utf-8')
+    return TREE_ENTRY.pack(entry_type, len(raw_path), size) + raw_path
+
+
+# ========================================
+# PROTOCOLE P2P v2 (trames binaires)
+# ========================================
+
+# Version annoncée dans chaque trame (1: en-têtes texte ci-dessus)
+PROTOCOL_VERSION = 2
+
+# Début de trame: l'octet 0xFF n'apparaît jamais dans un en-tête texte (UTF-8)
+P2P_MAGIC = b'\xffP'
+
+# Trame: magic, version, type, drapeaux, longueur du contenu qui suit
+P2P_FRAME = struct.Struct('!2sBBHQ')
+P2P_TRANSFER = 1  # Annonce d'un fichier (voir TransferFrame)
+P2P_DATA = 2      # Plage du fichier: offset (P2P_OFFSET) puis les octets
+P2P_ACK = 3       # Plages attendues par le destinataire (P2P_RANGE chacune)
+P2P_ERROR = 4     # Code (P2P_ERROR_CODE) puis message UTF-8
+P2P_DONE = 5      # Fichier reçu, vérifié et renommé
+
+# Drapeau d'une trame de données: octets en trames de compression (la longueur
+# annoncée compte alors les octets du fichier, pas ceux transmis)
+P2P_COMPRESSED = 1
+
+# Champs fixes de l'annonce: taille, file_id (0: aucun), octets envoyés sans
+# attendre l'ACK, capacités; suivis du nom, de la clé de reprise et du
+# checksum (chacun: longueur P2P_STRING puis UTF-8)
+P2P_TRANSFER_FIELDS = struct.Struct('!QQQI')
+P2P_STRING = struct.Struct('!H')
+P2P_OFFSET = struct.Struct('!Q')
+P2P_RANGE = struct.Struct('!QQ')
+P2P_ERROR_CODE = struct.Struct('!H')
+
+# Capacités annoncées par l'expéditeur
+CAP_SESSION = 1   # La connexion peut servir à un autre transfert
+CAP_COMPRESS = 2  # Données en trames zlib (voir client.compression)
+
+# Codes d'erreur
+ERROR_BUSY = 1     # Fichier déjà en cours de réception
+ERROR_CORRUPT = 2  # Checksum invalide
+ERROR_FAILED = 3   # Autre erreur
+ERROR_VERSION = 4  # Version du protocole non supportée
+
+
+class VersionMismatch(ValueError):
+    """Trame v2 d'une autre version du protocole"""
+
+
+def encode_frame(frame_type: int, payload: bytes = b'', flags: int = 0, length: int = None) -> bytes:
+    """
+    Construire une trame v2
+    
+    Args:
+        frame_type: P2P_TRANSFER, P2P_DATA, P2P_ACK, P2P_ERROR ou P2P_DONE
+        payload: Contenu de la trame
+        flags: Drapeaux (P2P_COMPRESSED)
+        length: Longueur annoncée si le contenu est envoyé à part (données)
+    
+    Returns:
+        En-tête de trame suivi du contenu
+    """
+    if length is None:
+        length = len(payload)
+    return P2P_FRAME.pack(P2P_MAGIC, PROTOCOL_VERSION, frame_type, flags, length) + payload
+
+
+def parse_frame_header(raw) -> Tuple[int, int, int]:
+    """
+    Décoder l'en-tête d'une trame v2
+    
+    Args:
+        raw: P2P_FRAME.size octets (bytes ou memoryview)
+    
+    Returns:
+        (type, drapeaux, longueur du contenu)
+    
+    Raises:
+        ValueError: Pas une trame v2
+        VersionMismatch: Trame d'une autre version du protocole
+    """
+    magic, version, frame_type, flags, length = P2P_FRAME.unpack_from(raw)
+    if magic != P2P_MAGIC:
+        raise ValueError("Trame invalide")
+    if version != PROTOCOL_VERSION:
+        raise VersionMismatch(f"Version du protocole non supportée: {version}")
+    return frame_type, flags, length
+
+
+def encode_data_header(offset: int, count: int, flags: int = 0) -> bytes:
+    """
+    En-tête d'une trame de données (les `count` octets suivent sans copie)
+    
+    Args:
+        offset: Position de la plage dans le fichier
+        count: Octets du fichier dans la trame
+        flags: P2P_COMPRESSED si les octets partent en trames de compression
+    """
+    return encode_frame(P2P_DATA, P2P_OFFSET.pack(offset), flags, P2P_OFFSET.size + count)
+
+
+def encode_ack(ranges: List[Tuple[int, int]]) -> bytes:
+    """Trame ACK listant les plages (offset, longueur) attendues"""
+    return encode_frame(P2P_ACK, b''.join(P2P_RANGE.pack(offset, length) for offset, length in ranges))
+
+
+def decode_ack(payload) -> List[Tuple[int, int]]:
+    """Plages (offset, longueur) d'une trame ACK"""
+    if len(payload) % P2P_RANGE.size:
+        raise ValueError("ACK tronqué")
+    return list(P2P_RANGE.iter_unpack(payload))
+
+
+def encode_error(code: int, message: str = '') -> bytes:
+    """Trame d'erreur (ERROR_BUSY, ERROR_CORRUPT, ERROR_FAILED)"""
+    return encode_frame(P2P_ERROR, P2P_ERROR_CODE.pack(code) + message.encode('utf-8'))
+
+
+def decode_error(payload) -> Tuple[int, str]:
+    """(code, message) d'une trame d'erreur"""
+    view = memoryview(payload)
+    code, = P2P_ERROR_CODE.unpack_from(view)
+    return code, str(view[P2P_ERROR_CODE.size:], 'utf-8', 'replace')
+
+
+@dataclass
+class TransferFrame:
+    """Annonce d'un fichier (trame P2P_TRANSFER)"""
+    filename: str
+    filesize: int
+    file_id: int = 0  # ID sur le serveur (0: aucun)
+    window: int = 0  # Octets envoyés aussitôt après l'annonce, sans attendre l'ACK
+    caps: int = 0  # CAP_SESSION, CAP_COMPRESS
+    resume: str = ''  # Clé de reprise (vide: pas de reprise)
+    checksum: str = ''  # Checksum du fichier (vide: vérifié d'après file_id)
+    
+    def encode(self) -> bytes:
+        """Trame complète"""
+        fields = [P2P_TRANSFER_FIELDS.pack(self.filesize, self.file_id or 0, self.window, self.caps)]
+        for text in (self.filename, self.resume, self.checksum):
+            raw = (text or '').encode('utf-8')
+            fields.append(P2P_STRING.pack(len(raw)) + raw)
+        return encode_frame(P2P_TRANSFER, b''.join(fields))
+    
+    @staticmethod
+    def decode(payload) -> 'TransferFrame':
+        """
+        Décoder le contenu d'une trame P2P_TRANSFER
+        
+        Raises:
+            ValueError: Annonce tronquée ou invalide
+        """
+        view = memoryview(payload)
+        filesize, file_id, window, caps = P2P_TRANSFER_FIELDS.unpack_from(view)
+        position = P2P_TRANSFER_FIELDS.size
+        texts = []
+        for _ in range(3):
+            length, = P2P_STRING.unpack_from(view, position)
+            position += P2P_STRING.size
+            if position + length > len(view):
+                raise ValueError("Annonce tronquée")
+            texts.append(str(view[position:position + length], 'utf-8'))
+            position += length
+        return TransferFrame(texts[0], filesize, file_id, window, caps, texts[1], texts[2])
+
+
 # Constantes de configuration
 DEFAULT_SERVER_PORT = 5000
 DEFAULT_CLIENT_PORT = 5001
 BUFFER_SIZE = 4096  # Taille du buffer pour transfert
 CHUNK_SIZE = 1024 * 1024  # 1 MB par chunk
+MAX_STREAMS = 8  # Connexions parallèles max pour un même fichier
+MIN_MULTI_STREAM_SIZE = 16 * CHUNK_SIZE  # En dessous, un seul flux suffit
+TRANSFER_RETRIES = 3  # Reprises automatiques après une coupure
+RETRY_DELAY = 2  # Secondes d'attente avant une reprise (croissant)
+RELAY_DEGREE = 2  # Voisins directs de chaque relais en mode diffusion relayée
@@ -2,29 +2,29 @@
 Utilitaires partagés
 """
 
-import hashlib
+import math
 import os
 from datetime import datetime
 from typing import Optional
 
+from shared.hashing import hash_file
 
-def calculate_checksum(filepath: str) -> str:
+
+def calculate_checksum(filepath: str, algorithm: str = 'md5') -> str:
     """
-    Calculer le checksum MD5 d'un fichier
+    Calculer le checksum plat d'un fichier
+    
+    Pour les checksums enregistrés sur le serveur, voir
+    shared.hashing.file_checksum (arbre de Merkle).
     
     Args:
         filepath: Chemin du fichier
+        algorithm: Algorithme (md5, sha256, blake2b)
         
     Returns:
-        Checksum MD5 en hexadécimal
+        Checksum en hexadécimal
     """
-    hash_md5 = hashlib.md5()
-    
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    
-    return hash_md5.hexdigest()
+    return hash_file(filepath, algorithm)
 
 
 def format_size(size_bytes: int) -> str:
@@ -44,6 +44,32 @@ def format_size(size_bytes: int) -> str:
     return f"{size_bytes:.1f} PB"
 
 
+def parse_size(text: str) -> Optional[int]:
+    """
+    Lire une taille saisie par l'utilisateur
+    
+    Args:
+        text: Nombre d'octets, éventuellement suivi d'une unité (ex: "500K", "1.5M", "2GB")
+    
+    Returns:
+        Taille en octets, ou None si la saisie est invalide
+    """
+    text = text.strip().upper().rstrip('B')
+    multiplier = 1
+    for i, unit in enumerate(['K', 'M', 'G', 'T'], start=1):
+        if text.endswith(unit):
+            text = text[:-1]
+            multiplier = 1024 ** i
+            break
+    try:
+        value = float(text) * multiplier
+    except ValueError:
+        return None
+    if not math.isfinite(value) or value < 0:
+        return None  # inf, nan, 1e400...
+    return int(value)
+
+
 def get_timestamp() -> str:
     """
     Obtenir le timestamp actuel au format ISO
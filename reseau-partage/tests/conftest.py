@@ -0,0 +1,35 @@
+"""
+Fixtures communes: serveur Flask sur une base temporaire
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server_module(tmp_path_factory):
+    """Module du serveur, importé sans toucher à server/network.db"""
+    import server.config
+    server.config.DATABASE_PATH = str(tmp_path_factory.mktemp('server') / 'network.db')
+    import server.main
+    return server.main
+
+
+@pytest.fixture
+def server(server_module, tmp_path, monkeypatch):
+    """Serveur avec une base et un journal de présence neufs"""
+    from server.database import Database
+    from server.events import PeerEvents
+    monkeypatch.setattr(server_module, 'db', Database(str(tmp_path / 'network.db')))
+    monkeypatch.setattr(server_module, 'peer_events', PeerEvents())
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    """Client de test Flask"""
+    return server.app.test_client()
@@ -0,0 +1,101 @@
+"""
+Tests de /api/batch et des transactions de la base
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def register(client, *names):
+    for name in names:
+        client.post('/api/register', json={'name': name, 'ip': '10.0.0.2', 'port': 5000})
+
+
+def count_rows(server, table: str) -> int:
+    conn = server.db.get_connection()
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def file_operation(**extra) -> dict:
+    operation = {'op': 'register_file', 'filename': 'a.txt', 'filesize': 10, 'checksum': 'abc',
+                 'owner': 'PC1', 'permission': 'private', 'recipients': ['PC2']}
+    operation.update(extra)
+    return operation
+
+
+def test_operations_share_one_transaction(client, server):
+    register(client, 'PC1', 'PC2')
+    response = client.post('/api/batch', json={'operations': [
+        {'op': 'peer', 'name': 'PC2'},
+        file_operation(),
+        {'op': 'check_permission', 'file_id': 1, 'peer_name': 'PC2'},
+        {'op': 'log_transfer', 'file_id': 1, 'from_peer': 'PC1', 'to_peer': 'PC2', 'bytes_sent': 10},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == [200, 200, 200, 200]
+    assert results[0]['body']['ip_address'] == '10.0.0.2'
+    assert results[2]['body']['allowed'] is True
+    assert count_rows(server, 'files') == 1
+    assert count_rows(server, 'transfers') == 1
+
+
+def test_refused_operation_keeps_the_others(client, server):
+    register(client, 'PC1', 'PC2')
+    results = client.post('/api/batch', json={'operations': [
+        file_operation(recipients=['PC9']),
+        {'op': 'inconnue'},
+        'pas un objet',
+        file_operation(),
+    ]}).get_json()['results']
+    assert [result['status'] for result in results] == [404, 400, 400, 200]
+    assert count_rows(server, 'files') == 1
+    assert count_rows(server, 'permissions') == 1
+
+
+def test_failure_rolls_back_the_batch(client, server, monkeypatch):
+    register(client, 'PC1', 'PC2')
+    
+    def broken(*args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+    
+    monkeypatch.setattr(server.db, 'log_transfer', broken)
+    monkeypatch.setitem(server.app.config, 'PROPAGATE_EXCEPTIONS', False)
+    response = client.post('/api/batch', json={'operations': [
+        file_operation(),
+        {'op': 'log_transfer', 'file_id': 1, 'from_peer': 'PC1', 'to_peer': 'PC2'},
+    ]})
+    assert response.status_code == 500
+    assert count_rows(server, 'files') == 0
+    assert count_rows(server, 'permissions') == 0
+
+
+def test_invalid_batches(client, server):
+    assert client.post('/api/batch', json={}).status_code == 400
+    too_many = [{'op': 'peer', 'name': 'PC2'}] * (server.BATCH_MAX_OPERATIONS + 1)
+    assert client.post('/api/batch', json={'operations': too_many}).status_code == 400
+
+
+def test_transaction_rollback(tmp_path):
+    from server.database import Database
+    db = Database(str(tmp_path / 'network.db'))
+    db.register_peer('PC1', '10.0.0.1', 5000)
+    
+    with pytest.raises(RuntimeError):
+        with db.transaction(write=True) as conn:
+            file_id = db.register_file('a.txt', 10, 'abc', 'PC1', 'public', conn=conn)
+            db.log_transfer(file_id, 'PC1', 'PC2', 'success', conn=conn)
+            raise RuntimeError("échec")
+    assert db.get_file(file_id) is None
+    
+    with db.transaction(write=True) as conn:
+        file_id = db.register_file('a.txt', 10, 'abc', 'PC1', 'public', conn=conn)
+    assert db.get_file(file_id)['filename'] == 'a.txt'
@@ -0,0 +1,86 @@
+"""
+Tests du découpage défini par le contenu et du magasin de blocs
+"""
+
+import hashlib
+import io
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.chunks import CDC_MAX_SIZE, CDC_MIN_SIZE, ChunkStore, iter_chunk_data, iter_chunks
+
+
+def make_text(size: int, seed: int = 1) -> bytes:
+    """Texte pseudo-aléatoire, une fin de ligne tous les 50 octets en moyenne"""
+    table = bytes(32 + byte % 95 if byte % 50 else ord('\n') for byte in range(256))
+    return random.Random(seed).randbytes(size).translate(table)
+
+
+def chunks_of(data: bytes):
+    return list(iter_chunk_data(io.BytesIO(data)))
+
+
+def test_chunk_sizes_within_bounds():
+    chunks = chunks_of(make_text(6 * CDC_MAX_SIZE))
+    assert len(chunks) > 1
+    for _, data, _ in chunks[:-1]:
+        assert CDC_MIN_SIZE <= len(data) <= CDC_MAX_SIZE
+    assert 0 < len(chunks[-1][1]) <= CDC_MAX_SIZE
+
+
+def test_round_trip_offsets_and_digests():
+    original = make_text(5 * CDC_MAX_SIZE + 12345)
+    chunks = chunks_of(original)
+    
+    offset = 0
+    for chunk_offset, data, digest in chunks:
+        assert chunk_offset == offset
+        assert digest == hashlib.sha256(data).digest()
+        offset += len(data)
+    assert b''.join(data for _, data, _ in chunks) == original
+
+
+def test_binary_without_anchor_cuts_at_max_size():
+    original = bytes(3 * CDC_MAX_SIZE + 10)
+    chunks = chunks_of(original)
+    assert [len(data) for _, data, _ in chunks] == [CDC_MAX_SIZE] * 3 + [10]
+
+
+def test_small_and_empty_input():
+    assert chunks_of(b'') == []
+    chunks = chunks_of(b'abc')
+    assert [(offset, data) for offset, data, _ in chunks] == [(0, b'abc')]
+
+
+def test_insertion_keeps_following_chunks():
+    original = make_text(8 * CDC_MAX_SIZE)
+    edited = b'inserted line\n' + original
+    
+    before = {digest for _, _, digest in chunks_of(original)}
+    after = [digest for _, _, digest in chunks_of(edited)]
+    shared = sum(1 for digest in after if digest in before)
+    assert shared >= len(after) - 2
+
+
+def test_iter_chunks_matches_stream(tmp_path):
+    data = make_text(3 * CDC_MAX_SIZE, seed=7)
+    path = tmp_path / 'file.txt'
+    path.write_bytes(data)
+    
+    expected = [(offset, len(chunk), digest) for offset, chunk, digest in chunks_of(data)]
+    assert list(iter_chunks(str(path))) == expected
+
+
+def test_store_rejects_corrupt_chunk(tmp_path):
+    store = ChunkStore(str(tmp_path / 'store'))
+    data = b'payload' * 1000
+    digest = hashlib.sha256(data).digest()
+    
+    assert not store.put(digest, data + b'x')
+    assert not store.has(digest)
+    assert store.put(digest, data)
+    assert store.get(digest) == data
+    assert store.get(hashlib.sha256(b'other').digest()) is None
@@ -0,0 +1,93 @@
+"""
+Tests de la réception des blocs dédupliqués
+"""
+
+import hashlib
+import io
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.chunks import CHUNK_ANNOUNCE, CHUNK_DATA, CHUNK_END, CHUNK_ENTRY, STORE_DIR, ChunkStore
+from client.transfer import FileTransfer
+
+
+def digest(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+def announce(data: bytes) -> bytes:
+    return CHUNK_ANNOUNCE + CHUNK_ENTRY.pack(digest(data), len(data))
+
+
+def receive(transfer: FileTransfer, messages: bytes, size: int):
+    """Faire recevoir une suite de messages; renvoie (contenu écrit, réponses)"""
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        sender.sendall(messages)
+        out = io.BytesIO()
+        transfer._recv_chunk_stream(receiver, out, size)
+        sender.settimeout(1)
+        replies = sender.recv(1024)
+    return out.getvalue(), replies
+
+
+@pytest.fixture
+def transfer(tmp_path):
+    return FileTransfer(str(tmp_path / 'PC2'), 0)
+
+
+def test_store_prunes_least_recently_used(tmp_path):
+    chunks = [bytes([i]) * 1000 for i in range(3)]
+    store = ChunkStore(str(tmp_path / 'store'), limit=2500)
+    for i, data in enumerate(chunks[:2]):
+        store.put(digest(data), data)
+        os.utime(store.path(digest(data)), (i, i))
+    
+    assert store.get(digest(chunks[0])) == chunks[0]  # Utilisé: devient le plus récent
+    store.put(digest(chunks[2]), chunks[2])
+    assert store.has(digest(chunks[0]))
+    assert not store.has(digest(chunks[1]))
+    assert store.has(digest(chunks[2]))
+
+
+def test_present_chunk_survives_pruning(transfer, tmp_path):
+    old = b'o' * 1000
+    new = b'n' * 1000
+    transfer.chunk_store = ChunkStore(os.path.join(transfer.storage_dir, STORE_DIR), limit=1500)
+    transfer.chunk_store.put(digest(old), old)
+    os.utime(transfer.chunk_store.path(digest(old)), (0, 0))
+    
+    # Le bloc demandé arrive avant que le bloc déjà présent soit écrit: son ajout vide le magasin
+    messages = announce(new) + announce(old) + CHUNK_DATA + new + CHUNK_END
+    data, replies = receive(transfer, messages, 2000)
+    assert replies == b'10'
+    assert data == new + old
+
+
+def test_repeated_chunk_is_requested_once(transfer):
+    first = b'a' * 700
+    second = b'b' * 300
+    messages = announce(first) + announce(second) + announce(first) + CHUNK_DATA + first + CHUNK_DATA + second
+    data, replies = receive(transfer, messages + CHUNK_END, 1700)
+    assert replies == b'110'
+    assert data == first + second + first
+    assert transfer.chunk_store.has(digest(second))
+
+
+def test_inconsistent_sizes_are_rejected(transfer):
+    chunk = b'c' * 100
+    with pytest.raises(Exception, match="incohérents"):
+        receive(transfer, announce(chunk) + CHUNK_DATA + chunk + CHUNK_END, 50)
+    with pytest.raises(Exception, match="incohérents"):
+        receive(transfer, announce(chunk) + CHUNK_DATA + chunk + CHUNK_END, 200)
+
+
+def test_corrupt_chunk_is_rejected(transfer):
+    chunk = b'c' * 100
+    with pytest.raises(Exception, match="corrompu"):
+        receive(transfer, announce(chunk) + CHUNK_DATA + b'x' * 100 + CHUNK_END, 100)
@@ -0,0 +1,103 @@
+"""
+Tests des changements de présence (long polling)
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.network import NetworkClient
+from server.events import PEER_OFFLINE, PEER_ONLINE, PeerEvents
+
+
+def peer(name: str) -> dict:
+    return {'name': name, 'ip_address': '10.0.0.2', 'port': 5000}
+
+
+def test_first_call_and_other_epoch_reset():
+    events = PeerEvents()
+    assert events.since(None, events.epoch, 0) is None
+    assert events.since(0, 'autre', 0) is None
+    assert events.since(5, events.epoch, 0) is None  # Version d'avant un redémarrage
+    assert events.since(0, events.epoch, 0) == []
+
+
+def test_changes_since_version():
+    events = PeerEvents()
+    events.publish(PEER_ONLINE, peer('PC2'))
+    events.publish(PEER_ONLINE, peer('PC3'))
+    events.publish(PEER_OFFLINE, peer('PC2'))
+    
+    changes = events.since(1, events.epoch, 0)
+    assert [(change['version'], change['event'], change['peer']['name']) for change in changes] == [
+        (2, PEER_ONLINE, 'PC3'), (3, PEER_OFFLINE, 'PC2')]
+    assert events.since(3, events.epoch, 0) == []
+
+
+def test_lagging_client_resets():
+    events = PeerEvents(kept=2)
+    for name in ('PC2', 'PC3', 'PC4'):
+        events.publish(PEER_ONLINE, peer(name))
+    assert events.since(0, events.epoch, 0) is None
+    assert [change['version'] for change in events.since(1, events.epoch, 0)] == [2, 3]
+
+
+def test_wait_wakes_on_publish():
+    events = PeerEvents()
+    timer = threading.Timer(0.05, events.publish, (PEER_ONLINE, peer('PC2')))
+    timer.start()
+    start = time.monotonic()
+    changes = events.since(0, events.epoch, 5)
+    assert time.monotonic() - start < 2
+    assert [change['peer']['name'] for change in changes] == ['PC2']
+
+
+def test_endpoint_reset_then_changes(client, server):
+    client.post('/api/register', json={'name': 'PC2', 'ip': '10.0.0.2', 'port': 5000})
+    
+    reset = client.get('/api/peers/events').get_json()
+    assert reset['reset'] is True
+    assert [p['name'] for p in reset['peers']] == ['PC2']
+    
+    client.post('/api/register', json={'name': 'PC3', 'ip': '10.0.0.3', 'port': 5000})
+    data = client.get('/api/peers/events', query_string={
+        'since': reset['version'], 'epoch': reset['epoch'], 'timeout': 0}).get_json()
+    assert 'reset' not in data
+    assert data['version'] == reset['version'] + 1
+    assert [change['peer']['name'] for change in data['changes']] == ['PC3']
+    
+    idle = client.get('/api/peers/events', query_string={
+        'since': data['version'], 'epoch': data['epoch'], 'timeout': 0}).get_json()
+    assert idle == {'epoch': data['epoch'], 'version': data['version'], 'changes': []}
+    
+    restarted = client.get('/api/peers/events', query_string={
+        'since': data['version'], 'epoch': 'ancien', 'timeout': 0}).get_json()
+    assert restarted['reset'] is True
+
+
+def test_parse_events():
+    epoch, version, peers, changes = NetworkClient._parse_events(
+        {'epoch': 'e', 'version': 4, 'reset': True, 'peers': [peer('PC2')]})
+    assert (epoch, version, peers, changes) == ('e', 4, [peer('PC2')], [])
+    
+    _, _, peers, changes = NetworkClient._parse_events(
+        {'epoch': 'e', 'version': 5, 'changes': [{'version': 5, 'event': PEER_OFFLINE, 'peer': peer('PC2')}]})
+    assert peers is None
+    assert changes == [(PEER_OFFLINE, peer('PC2'))]
+
+
+@pytest.mark.parametrize('data', [
+    None,
+    [],
+    {'epoch': 'e', 'version': 1},
+    {'epoch': 'e', 'version': 1, 'reset': True, 'peers': [{'name': 'PC2'}]},
+    {'epoch': 'e', 'version': 1, 'changes': [{'event': PEER_ONLINE, 'peer': None}]},
+])
+def test_parse_events_rejects_malformed(data):
+    with pytest.raises((ValueError, KeyError, TypeError)):
+        NetworkClient._parse_events(data)
@@ -0,0 +1,81 @@
+"""
+Tests de l'arbre de Merkle et des checksums
+"""
+
+import hashlib
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.hashing import (MERKLE_CHUNK_SIZE, NODE_PREFIX, MerkleHasher, RangeLeafHasher, checksum_hasher,
+                            chunk_count, chunk_hashes, file_checksum, file_merkle, leaf_hash, merkle_root,
+                            parse_checksum)
+
+
+def node(left: bytes, right: bytes, algorithm: str = 'sha256') -> bytes:
+    return hashlib.new(algorithm, NODE_PREFIX + left + right).digest()
+
+
+def test_leaf_hash_is_prefixed():
+    assert leaf_hash(b'abc', 'sha256') == hashlib.sha256(b'\x00abc').digest()
+
+
+def test_root_of_one_leaf_is_the_leaf():
+    leaf = leaf_hash(b'a', 'sha256')
+    assert merkle_root([leaf], 'sha256') == leaf
+
+
+def test_odd_node_is_promoted():
+    a, b, c = (leaf_hash(data, 'sha256') for data in (b'a', b'b', b'c'))
+    assert merkle_root([a, b], 'sha256') == node(a, b)
+    assert merkle_root([a, b, c], 'sha256') == node(node(a, b), c)
+
+
+def test_empty_input():
+    assert merkle_root([], 'sha256') == leaf_hash(b'', 'sha256')
+    assert chunk_count(0) == 1
+
+
+def test_streaming_matches_file(tmp_path):
+    data = os.urandom(2 * MERKLE_CHUNK_SIZE + 1000)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    
+    checksum, leaves = file_merkle(str(path), 'sha256')
+    assert len(leaves) == 3
+    assert leaves[2] == leaf_hash(data[2 * MERKLE_CHUNK_SIZE:], 'sha256')
+    
+    hasher = MerkleHasher('sha256')
+    for i in range(0, len(data), 1000003):
+        hasher.update(data[i:i + 1000003])
+    assert checksum == f"merkle-sha256:{hasher.hexdigest()}"
+    assert parse_checksum(checksum) == ('sha256', hasher.hexdigest(), True)
+
+
+def test_range_hasher_skips_partial_first_chunk():
+    data = os.urandom(4000)
+    leaves = {}
+    hasher = RangeLeafHasher(leaves, offset=500, size=len(data), algorithm='sha256', chunk_size=1000)
+    hasher.update(data[500:])
+    assert sorted(leaves) == [1, 2, 3]
+    assert leaves[1] == leaf_hash(data[1000:2000], 'sha256')
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty'
+    path.write_bytes(b'')
+    assert chunk_hashes(str(path), 'sha256') == {0: leaf_hash(b'', 'sha256')}
+    assert file_checksum(str(path), 'sha256') == f"merkle-sha256:{leaf_hash(b'', 'sha256').hex()}"
+    assert MerkleHasher('sha256').hexdigest() == leaf_hash(b'', 'sha256').hex()
+
+
+def test_md5_checksum_is_flat(tmp_path):
+    path = tmp_path / 'file.txt'
+    path.write_bytes(b'hello')
+    checksum = file_checksum(str(path), 'md5')
+    assert checksum == hashlib.md5(b'hello').hexdigest()
+    assert parse_checksum(checksum) == ('md5', checksum, False)
+    hasher = checksum_hasher(checksum)
+    hasher.update(b'hello')
+    assert hasher.hexdigest() == checksum
@@ -0,0 +1,137 @@
+"""
+Tests de la file d'attente persistante des envois
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.jobs import JOB_CANCELLED, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobQueue
+
+
+def wait_status(queue: JobQueue, job_id: int, status: str, timeout: float = 5) -> str:
+    """Attendre qu'un job atteigne un état (renvoie le dernier état lu)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        current = queue.get(job_id).status
+        if current == status or time.monotonic() > deadline:
+            return current
+        time.sleep(0.01)
+
+
+def all_ok(job, cancel):
+    return {name: True for name in job.recipients}
+
+
+def test_interrupted_job_is_requeued_on_restart(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    started = threading.Event()
+    release = threading.Event()
+    
+    def blocking(job, cancel):
+        started.set()
+        release.wait(5)
+        return {name: False for name in job.recipients}
+    
+    queue = JobQueue(db_path, blocking, workers=1)
+    queue.start()
+    job = queue.submit('/data/file.bin', ['PC2'], {})
+    assert started.wait(5)
+    assert queue.get(job.id).status == JOB_RUNNING
+    
+    # Arrêt du client pendant l'envoi (qui échoue): le job garde l'état running
+    queue.stop()
+    release.set()
+    queue.threads[0].join(5)
+    assert queue.get(job.id).status == JOB_RUNNING
+    
+    restarted = JobQueue(db_path, all_ok, workers=1)
+    assert restarted.get(job.id).status == JOB_QUEUED
+    restarted.start()
+    try:
+        assert wait_status(restarted, job.id, JOB_DONE) == JOB_DONE
+        assert restarted.get(job.id).results == {'PC2': True}
+    finally:
+        restarted.stop()
+
+
+def test_jobs_run_in_order(tmp_path):
+    order = []
+    
+    def record(job, cancel):
+        order.append(job.path)
+        return {name: True for name in job.recipients}
+    
+    queue = JobQueue(str(tmp_path / 'jobs.db'), record, workers=1)
+    jobs = [queue.submit(f'/data/{i}', ['PC2'], {}) for i in range(3)]
+    queue.start()
+    try:
+        assert wait_status(queue, jobs[-1].id, JOB_DONE) == JOB_DONE
+    finally:
+        queue.stop()
+    assert order == ['/data/0', '/data/1', '/data/2']
+
+
+def test_partial_failure_and_retry(tmp_path):
+    calls = []
+    
+    def flaky(job, cancel):
+        calls.append(list(job.recipients))
+        if len(calls) == 1:
+            return {'PC2': True, 'PC3': False}
+        return {name: True for name in job.recipients}
+    
+    queue = JobQueue(str(tmp_path / 'jobs.db'), flaky, workers=1)
+    queue.start()
+    try:
+        job = queue.submit('/data/file.bin', ['PC2', 'PC3'], {})
+        assert wait_status(queue, job.id, JOB_FAILED) == JOB_FAILED
+        assert queue.get(job.id).error == '1/2 réussis'
+        
+        assert queue.retry(job.id).recipients == ['PC3']
+        assert wait_status(queue, job.id, JOB_DONE) == JOB_DONE
+        assert queue.retry(job.id) is None
+    finally:
+        queue.stop()
+    assert calls == [['PC2', 'PC3'], ['PC3']]
+
+
+def test_cancel(tmp_path):
+    started = threading.Event()
+    
+    def until_cancelled(job, cancel):
+        started.set()
+        cancel.wait(5)
+        return {}
+    
+    queue = JobQueue(str(tmp_path / 'jobs.db'), until_cancelled, workers=1)
+    waiting = queue.submit('/data/b', ['PC2'], {})
+    assert queue.cancel(waiting.id) == JOB_CANCELLED
+    assert queue.cancel(waiting.id) is None
+    
+    queue.start()
+    try:
+        running = queue.submit('/data/a', ['PC2'], {})
+        assert started.wait(5)
+        assert queue.cancel(running.id) == JOB_RUNNING
+        assert wait_status(queue, running.id, JOB_CANCELLED) == JOB_CANCELLED
+    finally:
+        queue.stop()
+    assert queue.stats() == {JOB_CANCELLED: 2}
+
+
+def test_runner_exception_fails_job(tmp_path):
+    def broken(job, cancel):
+        raise OSError("disque plein")
+    
+    queue = JobQueue(str(tmp_path / 'jobs.db'), broken, workers=1)
+    queue.start()
+    try:
+        job = queue.submit('/data/file.bin', ['PC2'], {})
+        assert wait_status(queue, job.id, JOB_FAILED) == JOB_FAILED
+        assert queue.get(job.id).error == "disque plein"
+    finally:
+        queue.stop()
@@ -0,0 +1,90 @@
+"""
+Tests du journal de reprise des transferts
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.journal import PART_SUFFIX, TransferJournal, format_ranges, parse_ranges
+
+
+def make_part(tmp_path) -> str:
+    part_path = str(tmp_path / ('file.bin' + PART_SUFFIX))
+    with open(part_path, 'wb') as f:
+        f.truncate(1000)
+    return part_path
+
+
+def test_add_merges_ranges():
+    journal = TransferJournal('unused', 'key', 1000)
+    journal.add(100, 200)
+    journal.add(300, 400)
+    journal.add(200, 300)
+    journal.add(50, 50)
+    assert journal.ranges == [(100, 400)]
+    assert journal.completed() == 300
+
+
+def test_missing_ranges():
+    journal = TransferJournal('unused', 'key', 1000)
+    assert journal.missing() == [(0, 1000)]
+    journal.add(0, 100)
+    journal.add(500, 600)
+    assert journal.missing() == [(100, 400), (600, 400)]
+    journal.add(100, 1000)
+    assert journal.missing() == []
+
+
+def test_resume_after_save(tmp_path):
+    part_path = make_part(tmp_path)
+    journal = TransferJournal(part_path, 'v1', 1000)
+    journal.add(0, 250)
+    journal.add(700, 800)
+    journal.save()
+    
+    resumed = TransferJournal.open(part_path, 'v1', 1000)
+    assert resumed.ranges == [(0, 250), (700, 800)]
+    assert resumed.missing() == [(250, 450), (800, 200)]
+
+
+def test_other_version_is_ignored(tmp_path):
+    part_path = make_part(tmp_path)
+    journal = TransferJournal(part_path, 'v1', 1000)
+    journal.add(0, 500)
+    journal.save()
+    
+    assert TransferJournal.open(part_path, 'v2', 1000).ranges == []
+    assert TransferJournal.open(part_path, 'v1', 2000).ranges == []
+
+
+def test_missing_part_file_is_ignored(tmp_path):
+    part_path = make_part(tmp_path)
+    journal = TransferJournal(part_path, 'v1', 1000)
+    journal.add(0, 500)
+    journal.save()
+    os.remove(part_path)
+    
+    assert TransferJournal.open(part_path, 'v1', 1000).missing() == [(0, 1000)]
+
+
+def test_corrupt_journal_is_ignored(tmp_path):
+    part_path = make_part(tmp_path)
+    with open(part_path + '.journal', 'w') as f:
+        f.write('{not json')
+    assert TransferJournal.open(part_path, 'v1', 1000).ranges == []
+
+
+def test_remove(tmp_path):
+    part_path = make_part(tmp_path)
+    journal = TransferJournal(part_path, 'v1', 1000)
+    journal.save()
+    journal.remove()
+    assert not os.path.exists(journal.path)
+
+
+def test_ranges_round_trip():
+    ranges = [(0, 10), (4096, 1 << 33)]
+    assert parse_ranges(format_ranges(ranges)) == ranges
+    assert parse_ranges('') == []
@@ -0,0 +1,233 @@
+"""
+Tests du protocole P2P v2 (trames binaires) et du repli en v1
+"""
+
+import hashlib
+import os
+import socket
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import transfer as transfer_module
+from client.journal import PART_SUFFIX
+from client.transfer import ChecksumMismatch, FileTransfer, LegacyPeer, NoReply, TransferInterrupted
+from shared.protocol import (BUFFER_SIZE, ERROR_BUSY, ERROR_CORRUPT, ERROR_VERSION, P2P_ACK, P2P_DATA, P2P_DONE,
+                             P2P_ERROR, P2P_FRAME, P2P_MAGIC, P2P_OFFSET, P2P_TRANSFER, PROTOCOL_VERSION,
+                             TransferFrame, VersionMismatch, decode_ack, decode_error, encode_ack,
+                             encode_data_header, encode_error, encode_frame, parse_frame_header)
+
+PEER = ('127.0.0.1', 5001)
+
+
+# ========================================
+# TRAMES
+# ========================================
+
+def test_frame_round_trip():
+    frame = encode_frame(P2P_DONE, b'abc', flags=1)
+    assert frame[:2] == P2P_MAGIC
+    assert parse_frame_header(frame[:P2P_FRAME.size]) == (P2P_DONE, 1, 3)
+    assert frame[P2P_FRAME.size:] == b'abc'
+
+
+def test_frame_header_rejects_other_data():
+    with pytest.raises(ValueError):
+        parse_frame_header(b'fichier.txt|12|file|')
+    other_version = P2P_FRAME.pack(P2P_MAGIC, PROTOCOL_VERSION + 1, P2P_DONE, 0, 0)
+    with pytest.raises(VersionMismatch):
+        parse_frame_header(other_version)
+
+
+def test_data_header_announces_payload_length():
+    header = encode_data_header(4096, 1000)
+    assert parse_frame_header(header) == (P2P_DATA, 0, P2P_OFFSET.size + 1000)
+    assert P2P_OFFSET.unpack_from(header, P2P_FRAME.size) == (4096,)
+
+
+def test_ack_round_trip():
+    ranges = [(0, 10), (1 << 40, 5)]
+    frame = encode_ack(ranges)
+    assert parse_frame_header(frame)[0] == P2P_ACK
+    assert decode_ack(frame[P2P_FRAME.size:]) == ranges
+    with pytest.raises(ValueError):
+        decode_ack(frame[P2P_FRAME.size:-1])
+
+
+def test_error_round_trip():
+    frame = encode_error(ERROR_BUSY, "déjà en cours")
+    assert parse_frame_header(frame) == (P2P_ERROR, 0, len(frame) - P2P_FRAME.size)
+    assert decode_error(frame[P2P_FRAME.size:]) == (ERROR_BUSY, "déjà en cours")
+
+
+def test_transfer_frame_round_trip():
+    announce = TransferFrame('résumé.pdf', 123456, 7, 65536, 3, 'clé', 'merkle-sha256:ab')
+    frame = announce.encode()
+    frame_type, _, length = parse_frame_header(frame)
+    assert (frame_type, length) == (P2P_TRANSFER, len(frame) - P2P_FRAME.size)
+    assert TransferFrame.decode(frame[P2P_FRAME.size:]) == announce
+    with pytest.raises(ValueError):
+        TransferFrame.decode(frame[P2P_FRAME.size:-1])
+
+
+# ========================================
+# ÉCHANGES ENTRE EXPÉDITEUR ET DESTINATAIRE
+# ========================================
+
+class FakePeers:
+    """Connexions de l'expéditeur remplacées par des socketpair, servies par des fonctions"""
+    
+    def __init__(self, handlers):
+        self.handlers = list(handlers)
+        self.errors = []
+    
+    @contextmanager
+    def session(self, peer_ip: str, peer_port: int):
+        local, remote = socket.socketpair()
+        thread = threading.Thread(target=self._serve, args=(self.handlers.pop(0), remote))
+        thread.start()
+        try:
+            with local:
+                yield local
+        finally:
+            thread.join(5)
+    
+    def _serve(self, handler, sock):
+        with sock:
+            try:
+                handler(sock)
+            except Exception as e:
+                self.errors.append(e)
+
+
+def v1_only(sock):
+    """Ancien destinataire: l'en-tête binaire n'est pas du texte, connexion fermée sans réponse"""
+    sock.recv(BUFFER_SIZE).decode('utf-8')
+
+
+def refuse_version(sock):
+    """Destinataire d'une autre version: trame ERROR_VERSION"""
+    FileTransfer._recv_exact(sock, P2P_FRAME.size)
+    sock.sendall(encode_error(ERROR_VERSION, "version 3 attendue"))
+
+
+def reply_v1(sock):
+    """Destinataire qui répond par une réponse texte v1"""
+    FileTransfer._recv_exact(sock, P2P_FRAME.size)
+    sock.sendall(b'OK|0:10')
+
+
+@pytest.fixture
+def peers(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer_module, 'RETRY_DELAY', 0)
+    sender = FileTransfer(str(tmp_path / 'PC1'), 0)
+    receiver = FileTransfer(str(tmp_path / 'PC2'), 0)
+    source = tmp_path / 'rapport.txt'
+    source.write_bytes(b'ligne de rapport\n' * 5000)
+    
+    def connect(*handlers) -> FakePeers:
+        fake = FakePeers(handlers)
+        monkeypatch.setattr(sender, '_session', fake.session)
+        return fake
+    
+    def receive(sock):
+        receiver._handle_connection(sock, PEER)
+    
+    return sender, receiver, str(source), connect, receive
+
+
+def send_framed(sender, source, checksum=None):
+    return sender._send_framed(source, os.path.basename(source), os.path.getsize(source), *PEER,
+                               key='', checksum=checksum)
+
+
+def test_v2_transfer(peers):
+    sender, receiver, source, connect, receive = peers
+    fake = connect(receive)
+    result = sender.send_file(source, *PEER, retries=0)
+    assert result.success
+    assert fake.errors == []
+    with open(source, 'rb') as f, open(os.path.join(receiver.storage_dir, 'rapport.txt'), 'rb') as g:
+        assert f.read() == g.read()
+    assert PEER not in sender._legacy_peers
+
+
+def test_silent_v1_receiver_raises_no_reply(peers):
+    sender, _, source, connect, _ = peers
+    connect(v1_only)
+    with pytest.raises(NoReply):
+        send_framed(sender, source)
+
+
+def test_v1_reply_and_version_error_raise_legacy(peers):
+    sender, _, source, connect, _ = peers
+    connect(reply_v1, refuse_version)
+    with pytest.raises(LegacyPeer):
+        send_framed(sender, source)
+    with pytest.raises(LegacyPeer):
+        send_framed(sender, source)
+
+
+def test_no_reply_retries_once_in_v1(peers):
+    sender, receiver, source, connect, receive = peers
+    fake = connect(v1_only, receive)
+    result = sender.send_file(source, *PEER, retries=1)
+    assert result.success
+    assert fake.handlers == []
+    assert os.path.exists(os.path.join(receiver.storage_dir, 'rapport.txt'))
+    # Une coupure ne prouve pas que le PC est en v1: le prochain envoi réessaie v2
+    assert PEER not in sender._legacy_peers
+
+
+def test_version_error_falls_back_to_v1(peers):
+    sender, receiver, source, connect, receive = peers
+    connect(refuse_version, receive)
+    result = sender.send_file(source, *PEER, retries=0)
+    assert result.success
+    assert PEER in sender._legacy_peers
+    assert os.path.exists(os.path.join(receiver.storage_dir, 'rapport.txt'))
+
+
+def test_receiver_rejects_other_version(peers):
+    _, receiver, _, _, _ = peers
+    local, remote = socket.socketpair()
+    with local, remote:
+        local.sendall(P2P_FRAME.pack(P2P_MAGIC, PROTOCOL_VERSION + 1, P2P_TRANSFER, 0, 0))
+        with pytest.raises(VersionMismatch):
+            receiver._handle_framed(remote, PEER)
+        frame_type, _, payload = FileTransfer._recv_frame(local)
+    assert frame_type == P2P_ERROR
+    assert decode_error(payload)[0] == ERROR_VERSION
+
+
+def test_busy_receiver(peers):
+    sender, receiver, source, connect, receive = peers
+    receiver._claim_part(os.path.join(receiver.storage_dir, 'rapport.txt' + PART_SUFFIX))
+    fake = connect(receive)
+    with pytest.raises(TransferInterrupted) as error:
+        send_framed(sender, source)
+    assert not isinstance(error.value, NoReply)
+    assert fake.errors == []
+    assert PEER not in sender._legacy_peers
+
+
+def test_corrupt_reply(peers):
+    sender, receiver, source, connect, receive = peers
+    connect(receive)
+    with pytest.raises(ChecksumMismatch):
+        send_framed(sender, source, checksum=hashlib.md5(b'autre contenu').hexdigest())
+    assert not os.path.exists(os.path.join(receiver.storage_dir, 'rapport.txt'))
+
+
+def test_done_frame_confirms(peers):
+    local, remote = socket.socketpair()
+    with local, remote:
+        remote.sendall(encode_frame(P2P_DONE))
+        FileTransfer._recv_framed_done(local)
+        remote.sendall(encode_error(ERROR_CORRUPT, "checksum invalide"))
+        with pytest.raises(ChecksumMismatch):
+            FileTransfer._recv_framed_done(local)
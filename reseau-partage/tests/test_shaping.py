@@ -0,0 +1,133 @@
+"""
+Tests des seaux à jetons et de l'ordonnanceur des envois
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client import shaping
+from client.shaping import PRIORITY_BULK, PRIORITY_INTERACTIVE, TokenBucket, TrafficShaper, TransferCancelled
+
+
+class FakeClock:
+    """Horloge monotone avancée à la main"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(shaping.time, 'monotonic', clock)
+    return clock
+
+
+def test_reservations_queue_up(clock):
+    bucket = TokenBucket(1_000_000)
+    assert bucket.reserve(1000) == pytest.approx(0.001)
+    assert bucket.reserve(1000) == pytest.approx(0.002)
+    clock.advance(0.002)
+    assert bucket.reserve(1000) == pytest.approx(0.001)
+
+
+def test_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket(1_000_000)
+    clock.advance(100)
+    assert bucket.reserve(int(bucket.burst)) == 0.0
+    assert bucket.reserve(1_000_000) == pytest.approx(1.0)
+
+
+def test_sustained_rate(clock):
+    rate = 2_000_000
+    bucket = TokenBucket(rate)
+    start = clock.now
+    sent = 0
+    for _ in range(200):
+        delay = bucket.reserve(64 * 1024)
+        clock.advance(delay)
+        sent += 64 * 1024
+    assert sent / (clock.now - start) == pytest.approx(rate, rel=0.01)
+
+
+def test_unlimited_rate(clock):
+    bucket = TokenBucket(0)
+    assert bucket.reserve(10 ** 9) == 0.0
+
+
+def test_set_rate_keeps_debt(clock):
+    bucket = TokenBucket(1_000_000)
+    assert bucket.reserve(1_000_000) == pytest.approx(1.0)
+    bucket.set_rate(500_000)
+    assert bucket.reserve(0) == pytest.approx(2.0)
+
+
+def test_peer_limit_applies_with_global(clock):
+    shaper = TrafficShaper(1_000_000)
+    shaper.set_limit(100_000, peer='10.0.0.2')
+    assert shaper._reserve('10.0.0.2', 10_000) == pytest.approx(0.1)
+    assert shaper._reserve('10.0.0.3', 10_000) == pytest.approx(0.02)
+    assert shaper.limits() == {'global': 1_000_000, 'peers': {'10.0.0.2': 100_000}}
+    
+    shaper.set_limit(0, peer='10.0.0.2')
+    assert shaper.limits()['peers'] == {}
+
+
+def test_flow_accounting(clock):
+    shaper = TrafficShaper()
+    with shaper.flow('10.0.0.2', PRIORITY_INTERACTIVE) as flow:
+        assert shaper.stats()[PRIORITY_INTERACTIVE]['active'] == 1
+        flow.throttle(4096)
+    stats = shaper.stats()
+    assert stats[PRIORITY_INTERACTIVE]['active'] == 0
+    assert stats[PRIORITY_INTERACTIVE]['bytes'] == 4096
+    assert stats[PRIORITY_BULK]['bytes'] == 0
+    
+    with pytest.raises(ValueError):
+        shaper.flow(None, 'urgent')
+
+
+def test_cancel_interrupts_preemption():
+    shaper = TrafficShaper()
+    cancel = threading.Event()
+    with shaper.flow('10.0.0.2', PRIORITY_INTERACTIVE), shaper.flow('10.0.0.3', PRIORITY_BULK, cancel) as bulk:
+        threading.Timer(0.05, cancel.set).start()
+        start = time.monotonic()
+        with pytest.raises(TransferCancelled):
+            bulk.throttle(4096)
+        assert time.monotonic() - start < 1
+
+
+def test_cancel_interrupts_rate_wait():
+    shaper = TrafficShaper(1000)
+    cancel = threading.Event()
+    with shaper.flow('10.0.0.2', PRIORITY_BULK, cancel) as flow:
+        threading.Timer(0.05, cancel.set).start()
+        start = time.monotonic()
+        with pytest.raises(TransferCancelled):
+            flow.throttle(100_000)  # 100 s au débit limite
+        assert time.monotonic() - start < 1
+
+
+def test_bulk_resumes_after_interactive():
+    shaper = TrafficShaper()
+    interactive = shaper.flow('10.0.0.2', PRIORITY_INTERACTIVE)
+    interactive.__enter__()
+    threading.Timer(0.05, interactive.__exit__, (None, None, None)).start()
+    with shaper.flow('10.0.0.3', PRIORITY_BULK) as bulk:
+        bulk.throttle(4096)
+    stats = shaper.stats()[PRIORITY_BULK]
+    assert stats['bytes'] == 4096
+    assert 0 < stats['waited'] < 1
@@ -0,0 +1,29 @@
+"""
+Tests des utilitaires partagés
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.utils import parse_size
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1024', 1024),
+    ('500K', 500 * 1024),
+    ('1.5M', 1536 * 1024),
+    ('2GB', 2 * 1024 ** 3),
+    (' 5m ', 5 * 1024 ** 2),
+    ('0', 0),
+])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+@pytest.mark.parametrize('text', ['', 'abc', '-5M', 'inf', 'nan', '-inf', '1e400', '1e308T', 'infinityK'])
+def test_parse_size_rejects_invalid(text):
+    assert parse_size(text) is None
@@ -205,6 +205,7 @@ async function loadFiles() {
                         <div class="file-meta">
                             ${formatSize(file.filesize)} • ${label}
                             ${file.recipient_count ? ` (${file.recipient_count} PC)` : ''}
+                            ${file.bytes_saved > 0 ? ` • ${formatSize(file.bytes_saved)} économisés` : ''}
                         </div>
                     </div>
                     <span class="badge ${badgeClass}">${isReceived ? 'Reçu' : 'Envoyé'}</span>